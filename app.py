@@ -9,6 +9,11 @@ from production import produccion_app
 from mrp import mrp_app
 from ventas import ventas_app
 from escalera import escalera_app
+from perfilador import instrumentar_streamlit, iniciar_rerun, finalizar_rerun, panel_perfilador
+from telemetria import registrar_rerun, telemetria_app, bytes_datasets
+from consultas import consultas_app
+from metricas import iniciar_servidor_metricas, observar_rerun
+from vigilante import iniciar_vigilante, cargar_datasets_publicados
 
 PASSWORD = ")ufIuabDoyH"
 
@@ -43,18 +48,39 @@ if check_password():
 
     #st.title("⚙️ Lamtec Tool")
     st.sidebar.title("Aplicaciones Disponibles")
-    menu = ["Producción", "MRP", "Management", "Escaleras"]
+    menu = ["Producción", "MRP", "Management", "Escaleras", "Consultas SQL", "Telemetría"]
     option = st.sidebar.selectbox("Menú:", menu)
-    # Pantalla de Inicio
-    if option == "Producción":
-        st.title("🎯 Eficiencia y Cumplimiento al Plan de Producción")
-        produccion_app()
-    elif option == "MRP":
-        mrp_app()
-    elif option == "Management":
-        ventas_app()
-    elif option == "Escaleras":
-        escalera_app()
+
+    # ⏱️ Tiempos por sección del rerun (panel de administrador en el sidebar)
+    # y endpoint de métricas para Prometheus (una sola vez por proceso)
+    instrumentar_streamlit()
+    iniciar_servidor_metricas()
+    iniciar_rerun(option)
+    try:
+        # 📥 Exportes del ERP que el vigilante de carpeta ya dejó procesados
+        iniciar_vigilante()
+        cargar_datasets_publicados()
+
+        # Pantalla de Inicio
+        if option == "Producción":
+            st.title("🎯 Eficiencia y Cumplimiento al Plan de Producción")
+            produccion_app()
+        elif option == "MRP":
+            mrp_app()
+        elif option == "Management":
+            ventas_app()
+        elif option == "Escaleras":
+            escalera_app()
+        elif option == "Consultas SQL":
+            consultas_app()
+        elif option == "Telemetría":
+            telemetria_app()
+    finally:
+        perfil = finalizar_rerun()
+        registrar_rerun(perfil)
+        observar_rerun(perfil, bytes_datasets())
+
+    panel_perfilador()
 
 #Pie de página
     st.markdown("""
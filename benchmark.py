@@ -0,0 +1,459 @@
+# benchmark.py
+"""
+Benchmark de cargadores y páginas del dashboard.
+
+Genera reportes sintéticos con el mismo formato que los exportes del ERP
+(Production Timecard, Scheduled Jobs, Downtime por W/C, MRP, Orders, Sales,
+escalera, escalera de ventas y forecast de compras) y mide por página las
+etapas de lectura, agregación y construcción de figuras.
+
+Uso:
+    python benchmark.py --filas 10000
+    python benchmark.py --filas 10000 100000 --salida resultados.json
+    python benchmark.py --filas 10000 --guardar-base base_benchmark.json
+    python benchmark.py --filas 10000 --base base_benchmark.json --tolerancia 0.25
+
+Las funciones con @st.cache_data se llaman sin caché (__wrapped__) para medir
+el costo real de cada etapa.
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import xlsxwriter
+
+import utils
+from utils import _sin_cache
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+warnings.simplefilter("ignore", pd.errors.SettingWithCopyWarning)
+
+
+# 🧪 GENERADORES DE REPORTES SINTÉTICOS
+
+def _libro_xlsx(df, filas_previas=0, encabezado=True, pie=None):
+    """
+    Escribe un DataFrame a xlsx (bytes) fila por fila.
+    - filas_previas: renglones de título antes del encabezado (como los exportes del ERP)
+    - pie: texto de una fila final opcional
+    """
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "nan_inf_to_errors": True})
+    hoja = workbook.add_worksheet()
+    formato_fecha = workbook.add_format({"num_format": "dd/mm/yyyy"})
+
+    fila = 0
+    for i in range(filas_previas):
+        hoja.write_row(fila, 0, [f"Reporte sintético - línea {i + 1}"])
+        fila += 1
+
+    if encabezado:
+        hoja.write_row(fila, 0, [str(c) if not isinstance(c, pd.Timestamp) else c for c in df.columns], formato_fecha)
+        fila += 1
+
+    es_fecha = [pd.api.types.is_datetime64_any_dtype(df[c]) for c in df.columns]
+    valores = df.astype(object).where(df.notna(), None)
+    for registro in valores.itertuples(index=False, name=None):
+        for columna, valor in enumerate(registro):
+            if valor is None:
+                continue
+            if es_fecha[columna]:
+                hoja.write_datetime(fila, columna, valor, formato_fecha)
+            else:
+                hoja.write(fila, columna, valor.item() if isinstance(valor, np.generic) else valor)
+        fila += 1
+
+    if pie is not None:
+        hoja.write_row(fila, 0, [pie])
+
+    workbook.close()
+    return output.getvalue()
+
+
+def _fechas(rng, n, inicio="2025-01-01", dias=365):
+    return pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, dias, n), unit="D")
+
+
+def generar_timecard(n, rng):
+    """Production Timecard: 4 renglones de título antes del encabezado."""
+    wcs = [f"PRESS{i:02d}" for i in range(40)] + [f"WELD{i:02d}" for i in range(20)]
+    wc = rng.choice(wcs, n)
+    df = pd.DataFrame({col: None for col in utils.required_columns}, index=range(n))
+    df["W/C Type"] = np.where(np.char.startswith(wc.astype(str), "PRESS"), "PRESS", "WELD")
+    df["W/C"] = wc
+    df["Shift"] = rng.choice(["1", "2", "3"], n)
+    df["Completed On"] = _fechas(rng, n)
+    df["Timesheet #"] = rng.integers(100000, 100000 + max(n // 3, 1), n)
+    df["Job #"] = rng.integers(5000, 9000, n)
+    df["Employee"] = rng.choice([f"EMP{i:03d}" for i in range(150)], n)
+    df["Item/OP #"] = rng.choice([f"G{i:05d}-10" for i in range(800)], n)
+    df["Std Cost"] = rng.random(n) * 20
+    df["Expected Run Rate /hr"] = rng.integers(100, 900, n)
+    df["Actual Run Rate /hr"] = rng.integers(80, 900, n)
+    df["Quantity"] = rng.integers(0, 5000, n)
+    df["Held"] = rng.integers(0, 20, n)
+    df["Scrap"] = rng.integers(0, 50, n)
+    df["Scrap Cost"] = rng.random(n) * 100
+    df["Hours"] = rng.random(n) * 8
+    df["Efficiency"] = rng.random(n) * 120
+    df["OEE"] = rng.random(n) * 100
+    df["Production Downtime Hours"] = rng.random(n) * 2
+    df["Non-production Downtime Hours"] = rng.random(n)
+    df["Production Downtime Reasons"] = rng.choice(catalogo_ids(), n)
+    df["Downtime Notes"] = "-"
+    return _libro_xlsx(df, filas_previas=4)
+
+
+def generar_programacion(n, rng):
+    """Scheduled Jobs: 5 renglones de título antes del encabezado."""
+    df = pd.DataFrame({col: None for col in utils.required_columns_plan}, index=range(n))
+    df["Production Facility"] = "LMT"
+    df["W/C"] = rng.choice([f"PRESS{i:02d}" for i in range(40)], n)
+    df["W/C Type"] = "PRESS"
+    df["Job #"] = np.arange(n) + 10000
+    df["Item"] = rng.choice([f"G{i:05d}" for i in range(800)], n)
+    for col in utils.date_columns_plan:
+        df[col] = _fechas(rng, n)
+    for col in ["Lead Time (Days)", "Produced", "To Make", "Remaining", "Can Make", "Run Rate",
+                "Setup Hrs.", "Run Hrs.", "Total Hrs.", "Changeovers"]:
+        df[col] = rng.integers(0, 1000, n)
+    df["Status"] = rng.choice(["Released", "Started", "Planned"], n)
+    df["Setup Status"] = rng.choice(["Pending", "Done"], n)
+    return _libro_xlsx(df, filas_previas=5)
+
+
+def catalogo_ids():
+    return utils.catalogo_downtime["Reason ID"].tolist()
+
+
+def generar_downtime(n, rng):
+    """Downtime por W/C agrupado por razón: título, encabezado, grupos con totales y pie."""
+    filas = []
+    razones = catalogo_ids()
+    wcs = [f"PRESS{i:02d}" for i in range(40)]
+    while len(filas) < n:
+        razon = razones[len(filas) % len(razones)]
+        filas.append((f"{razon} - {razon}", None))
+        for wc in rng.choice(wcs, 8, replace=False):
+            filas.append((f"{wc} - {wc}", float(rng.random() * 10)))
+        filas.append((f"Total {razon}", None))
+    df = pd.DataFrame(filas[:n], columns=["WorkCenter", "TotalHours"])
+    return _libro_xlsx(df, filas_previas=1, pie="Total General")
+
+
+def generar_mrp(n, rng):
+    """MRP: renglón de Item seguido de sus Purchase Orders."""
+    filas = []
+    i = 0
+    while len(filas) < n:
+        vendor = f"VEND{i % 60}"
+        con_req = rng.random() > 0.2
+        filas.append([f"IT{i:06d}", None, None, vendor, rng.choice(["RAW", "PURCH", "SUB"]), None,
+                      100.0, None, None, 10.0 if con_req else 0.0, None, 500.0])
+        for linea in range(int(rng.integers(0, 6)) if con_req else 0):
+            filas.append([None, "Purchase Order", pd.Timestamp("2025-06-01") + pd.Timedelta(days=int(rng.integers(0, 180))),
+                          pd.Timestamp("2025-05-01"), int(rng.integers(1, 500)),
+                          f"Vendor {vendor}, P/O # {1000 + i % 900}, Line {linea}",
+                          None, None, None, None, None, None])
+        i += 1
+    df = pd.DataFrame(filas[:n], columns=[f"c{k}" for k in range(12)])
+    df["c2"] = pd.to_datetime(df["c2"])
+    df["c3"] = df["c3"].astype(object)
+    return _libro_xlsx(df)
+
+
+def _lineas_ventas(n, rng, columnas, columna_fecha):
+    df = pd.DataFrame({col: None for col in columnas}, index=range(n))
+    df["Customer"] = rng.choice([f"CUST{i:02d}" for i in range(25)], n)
+    df["Ship To"] = rng.choice([f"ST{i:02d}" for i in range(40)], n)
+    df["Item"] = rng.choice([f"G{i:05d}" for i in range(800)], n)
+    df[columna_fecha] = _fechas(rng, n)
+    df["Quantity"] = rng.integers(1, 2000, n)
+    df["Unit Price"] = rng.random(n) * 30
+    df["Amount"] = df["Quantity"] * df["Unit Price"]
+    return df
+
+
+def generar_orders(n, rng):
+    """Orders (incluye Platform): 4 renglones de título."""
+    columnas = list(dict.fromkeys(utils.columnas_orders + utils.columnas_ordenes_plataforma))
+    df = _lineas_ventas(n, rng, columnas, "Ship On")
+    df["Wanted On"] = df["Ship On"] - pd.to_timedelta(rng.integers(0, 5, n), unit="D")
+    df["Platform"] = rng.choice(["GM", "FORD", "STELLANTIS", "NISSAN"], n)
+    df["Firm/Planned"] = rng.choice(["Firm", "Planned"], n)
+    return _libro_xlsx(df, filas_previas=4)
+
+
+def generar_sales(n, rng):
+    """Sales: 8 renglones de título."""
+    return _libro_xlsx(_lineas_ventas(n, rng, utils.columnas_sales, "Invoice Date"), filas_previas=8)
+
+
+def generar_escalera(n, rng, semana=0, n_fechas=26):
+    """Escalera: columna A = Item, columnas B+ = fechas (un archivo por release)."""
+    n_items = max(n // n_fechas, 1)
+    fechas = pd.date_range("2025-07-07", periods=n_fechas, freq="W-MON") + pd.Timedelta(weeks=semana)
+    valores = rng.integers(0, 5000, (n_items, n_fechas)).astype(float)
+    df = pd.DataFrame(valores, columns=list(fechas))
+    df.insert(0, "Item", [f"G{i:05d}" for i in range(n_items)])
+    return _libro_xlsx(df)
+
+
+def generar_escalera_ventas(n, rng):
+    """Escalera de ventas: columnas fijas + bloque de cantidades + bloque de montos (12 meses)."""
+    n_items = max(n // 12, 1)
+    meses = list(pd.date_range("2025-01-01", periods=12, freq="MS"))
+    cantidades = rng.integers(0, 3000, (n_items, 12))
+    precios = rng.random(n_items) * 30
+    df = pd.DataFrame(np.hstack([cantidades, cantidades * precios[:, None]]), columns=meses + meses)
+    df.insert(0, "Item", [f"G{i:05d}" for i in range(n_items)])
+    df.insert(1, "LMX", [f"LMX{i:05d}" for i in range(n_items)])
+    df.insert(2, "Cliente", rng.choice([f"CUST{i:02d}" for i in range(25)], n_items))
+    df.insert(3, "Unit Price", precios)
+    return _libro_xlsx(df)
+
+
+def generar_forecast(n, rng):
+    """Forecast de compras."""
+    df = pd.DataFrame({
+        "Item": rng.choice([f"IT{i:05d}" for i in range(2000)], n),
+        "Type": rng.choice(["RAW", "PURCH", "SUB"], n),
+        "Wanted On": _fechas(rng, n, dias=540),
+        "Quantity": rng.integers(1, 1000, n),
+        "Datos": "Forecast",
+        "Vendor": rng.choice([f"VEND{i:02d}" for i in range(60)], n),
+        "PO": rng.choice([f"PO{i:05d}" for i in range(3000)], n),
+        "Unit Price (MXN)": rng.random(n) * 100,
+    })
+    df["Total"] = df["Quantity"] * df["Unit Price (MXN)"]
+    return _libro_xlsx(df)
+
+
+# ⏱️ MEDICIÓN POR ETAPA
+
+@contextmanager
+def _etapa(tiempos, nombre):
+    inicio = time.perf_counter()
+    yield
+    tiempos[nombre] = time.perf_counter() - inicio
+
+
+def _figura(fig):
+    """Construcción de la figura incluyendo su serialización (lo que hace st.plotly_chart)."""
+    return fig.to_json()
+
+
+def caso_produccion(archivos, tiempos):
+    cargar = _sin_cache(utils.cargar_datos_columnas_requeridas)
+    with _etapa(tiempos, "produccion.lectura_timecard"):
+        df, _ = cargar(BytesIO(archivos["timecard"]), utils.required_columns, skiprows=4)
+    with _etapa(tiempos, "produccion.lectura_programacion"):
+        cargar(BytesIO(archivos["programacion"]), utils.required_columns_plan, skiprows=5)
+    with _etapa(tiempos, "produccion.lectura_downtime"):
+        df_downtime = _sin_cache(utils.cargar_downtime)(BytesIO(archivos["downtime"]))
+    with _etapa(tiempos, "produccion.extraer_downtime"):
+        utils.extraer_downtime(df_downtime)
+    with _etapa(tiempos, "produccion.agregacion"):
+        df_unico = df.drop_duplicates(subset=["Timesheet #"])
+        resumen_wc = df.groupby("W/C")[["Efficiency", "OEE"]].mean().reset_index()
+        df_unico.groupby("W/C")[["Quantity", "Scrap"]].sum()
+    with _etapa(tiempos, "produccion.figuras"):
+        _figura(px.bar(resumen_wc.nsmallest(5, "Efficiency"), x="W/C", y="Efficiency"))
+
+
+def caso_mrp(archivos, tiempos):
+    with _etapa(tiempos, "mrp.lectura"):
+        df_po_1, df_sin_req_1 = utils.leer_mrp_excel(BytesIO(archivos["mrp"]))
+    df_po_2 = df_po_1.sample(frac=0.95, random_state=1)
+    with _etapa(tiempos, "mrp.diff"):
+        diff = utils.comparar_snapshots_mrp(df_po_1, df_po_2)
+    with _etapa(tiempos, "mrp.facetas"):
+        indice = _sin_cache(utils.indice_facetas)(None, ("Type", "Vendor Limpio", "PO_Numero", "Item"),
+                                                 diff.index.to_frame(index=False))
+        utils.opciones_faceta(indice, "Vendor Limpio", utils.filas_facetas(indice, {"Type": ["RAW"]}))
+    with _etapa(tiempos, "mrp.figuras"):
+        resumen = df_sin_req_1.groupby("Vendor")["Item"].nunique().reset_index()
+        _figura(px.bar(resumen, x="Vendor", y="Item"))
+
+
+def caso_ventas(archivos, tiempos):
+    cargar = _sin_cache(utils.cargar_datos_columnas_requeridas)
+    with _etapa(tiempos, "ventas.lectura"):
+        df_orders, _ = cargar(BytesIO(archivos["orders"]), ["Ship On", "Customer", "Item", "Amount"], skiprows=4)
+        df_sales, _ = cargar(BytesIO(archivos["sales"]), ["Invoice Date", "Customer", "Item", "Amount"], skiprows=8)
+        df_orders = utils.convertir_columnas_fecha(df_orders, ["Ship On"])
+        df_sales = utils.convertir_columnas_fecha(df_sales, ["Invoice Date"])
+    with _etapa(tiempos, "ventas.cubo"):
+        cubo = _sin_cache(utils.construir_cubo_ventas)(df_orders, df_sales)
+    with _etapa(tiempos, "ventas.consulta"):
+        resumen = utils.consultar_cubo_ventas(cubo, ["Mes", "Customer"], hasta_ultima_venta=True)
+    with _etapa(tiempos, "ventas.figuras"):
+        _figura(px.bar(resumen, x="Mes", y=["Pronosticado", "Vendido"], color="Customer"))
+
+
+def caso_plataforma(archivos, tiempos):
+    with _etapa(tiempos, "plataforma.lectura"):
+        df, _ = _sin_cache(utils.cargar_datos_columnas_requeridas)(
+            BytesIO(archivos["orders"]), utils.columnas_ordenes_plataforma, skiprows=4
+        )
+        df = utils.convertir_columnas_numericas(df, ["Quantity", "Amount"])
+        df = utils.convertir_columnas_fecha(df, ["Wanted On"])
+    with _etapa(tiempos, "plataforma.agregados"):
+        agregados = _sin_cache(utils.agregados_plataforma)(None, df)
+    with _etapa(tiempos, "plataforma.figuras"):
+        resumen = agregados.groupby("Platform", observed=True)[["Piezas", "Monto"]].sum().reset_index()
+        _figura(px.pie(resumen, values="Piezas", names="Platform"))
+
+
+def caso_escalera(archivos, tiempos):
+    leer = _sin_cache(utils.leer_archivo_escalera)
+    with _etapa(tiempos, "escalera.lectura"):
+        leidos = [leer(None, BytesIO(contenido)) for contenido in archivos["escalera"]]
+    with _etapa(tiempos, "escalera.cubo"):
+        cubo = utils.agregar_snapshots_escalera(
+            None, [(f"Archivo_{i + 1}", str(i), *leido) for i, leido in enumerate(leidos)]
+        )
+        utils.tabla_escalera(cubo)
+    with _etapa(tiempos, "escalera.volatilidad"):
+        _sin_cache(utils._volatilidad_escalera_en_cache)(None, 14, cubo)
+    with _etapa(tiempos, "escalera.lectura_ventas"):
+        utils.procesar_montos_escalera(pd.read_excel(BytesIO(archivos["escalera_ventas"])))
+
+
+def caso_forecast(archivos, tiempos):
+    with _etapa(tiempos, "forecast.lectura"):
+        df, _ = _sin_cache(utils.cargar_datos_columnas_requeridas)(
+            BytesIO(archivos["forecast"]),
+            ["Item", "Type", "Wanted On", "Quantity", "Datos", "Vendor", "PO", "Unit Price (MXN)", "Total"]
+        )
+        df = utils.convertir_columnas_fecha(df, ["Wanted On"])
+        df = utils.convertir_columnas_numericas(df, ["Quantity", "Unit Price (MXN)", "Total"])
+    with _etapa(tiempos, "forecast.filtros"):
+        indice = _sin_cache(utils.indice_facetas)(None, ("Type", "Vendor", "PO"), df)
+        filas = utils.filas_facetas(indice, {"Type": ["RAW", "SUB"]})
+        utils.opciones_faceta(indice, "PO", filas)
+        df_filtrado = df.iloc[filas]
+    with _etapa(tiempos, "forecast.mensual"):
+        mensual = _sin_cache(utils.forecast_mensual_por_tipo)(None, df_filtrado)
+        mensual.unstack("MesAño", fill_value=0)
+    with _etapa(tiempos, "forecast.figuras"):
+        _figura(px.line(mensual.reset_index(), x="MesAño", y="Quantity", color="Type", markers=True))
+
+
+CASOS = [caso_produccion, caso_mrp, caso_ventas, caso_plataforma, caso_escalera, caso_forecast]
+
+
+def generar_archivos(n, semilla=0):
+    """Todos los reportes sintéticos de un tamaño (bytes de xlsx)."""
+    rng = np.random.default_rng(semilla)
+    return {
+        "timecard": generar_timecard(n, rng),
+        "programacion": generar_programacion(max(n // 10, 1), rng),
+        "downtime": generar_downtime(max(n // 10, 1), rng),
+        "mrp": generar_mrp(n, rng),
+        "orders": generar_orders(n, rng),
+        "sales": generar_sales(n, rng),
+        "escalera": [generar_escalera(n, rng, semana=s) for s in range(4)],
+        "escalera_ventas": generar_escalera_ventas(n, rng),
+        "forecast": generar_forecast(n, rng),
+    }
+
+
+def ejecutar(filas, repeticiones=3):
+    """
+    Ejecuta todos los casos para cada tamaño y devuelve {tamaño: {etapa: segundos}}
+    tomando el mínimo de las repeticiones.
+    """
+    resultados = {}
+    for n in filas:
+        print(f"Generando reportes sintéticos de {n:,} filas...", file=sys.stderr)
+        archivos = generar_archivos(n)
+
+        mejores = {}
+        for _ in range(repeticiones):
+            tiempos = {}
+            for caso in CASOS:
+                caso(archivos, tiempos)
+            for etapa, segundos in tiempos.items():
+                mejores[etapa] = min(segundos, mejores.get(etapa, float("inf")))
+
+        resultados[str(n)] = {etapa: round(segundos, 4) for etapa, segundos in mejores.items()}
+    return resultados
+
+
+def comparar_con_base(resultados, base, tolerancia=0.2, minimo_segundos=0.05):
+    """
+    Compara contra una base guardada. Una etapa es regresión si tarda más de
+    (1 + tolerancia) veces la base y al menos minimo_segundos más (ruido).
+    Devuelve DataFrame con Tamaño, Etapa, Base, Actual, Razón y Regresión.
+    """
+    filas = []
+    for tamano, etapas in resultados.items():
+        for etapa, actual in etapas.items():
+            anterior = base.get("resultados", {}).get(tamano, {}).get(etapa)
+            if anterior is None:
+                continue
+            filas.append({
+                "Tamaño": tamano,
+                "Etapa": etapa,
+                "Base": anterior,
+                "Actual": actual,
+                "Razón": actual / anterior if anterior else np.nan,
+                "Regresión": actual > anterior * (1 + tolerancia) and actual - anterior > minimo_segundos,
+            })
+    return pd.DataFrame(filas, columns=["Tamaño", "Etapa", "Base", "Actual", "Razón", "Regresión"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de cargadores y páginas del dashboard")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000],
+                        help="Tamaños a generar (p. ej. 10000 100000 1000000)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--guardar-base", help="Guarda los resultados como base de comparación")
+    parser.add_argument("--base", help="Base JSON contra la cual comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Aumento relativo permitido antes de marcar regresión (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    reporte = {
+        "generado": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeticiones": args.repeticiones,
+        "resultados": ejecutar(args.filas, args.repeticiones),
+    }
+
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    print(texto)
+
+    for ruta in (args.salida, args.guardar_base):
+        if ruta:
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write(texto)
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        comparacion = comparar_con_base(reporte["resultados"], base, args.tolerancia)
+        print(comparacion.to_string(index=False), file=sys.stderr)
+        if comparacion["Regresión"].any():
+            print("❌ Hay etapas más lentas que la base.", file=sys.stderr)
+            return 1
+        print("✅ Sin regresiones contra la base.", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# candados.py
+"""
+Candados de archivo para lo que se lee y reescribe desde varios procesos a la vez: la app
+(con el vigilante del ERP en un hilo) y el vigilante como servicio aparte comparten datos/.
+
+candado_archivo(ruta) excluye a los demás hilos y procesos mientras dura el bloque. Es
+reentrante dentro del mismo hilo, así una función que ya lo tiene puede llamar a otra que
+también lo pide.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class _Candado:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.hilo = threading.RLock()
+        self.profundidad = 0
+        self.archivo = None
+
+    def adquirir(self):
+        self.hilo.acquire()
+        if self.profundidad == 0:
+            try:
+                os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+                self.archivo = open(self.ruta, "a+b")
+                _bloquear(self.archivo)
+            except BaseException:
+                if self.archivo is not None:
+                    self.archivo.close()
+                    self.archivo = None
+                self.hilo.release()
+                raise
+        self.profundidad += 1
+
+    def liberar(self):
+        self.profundidad -= 1
+        if self.profundidad == 0:
+            try:
+                _desbloquear(self.archivo)
+            finally:
+                self.archivo.close()
+                self.archivo = None
+        self.hilo.release()
+
+
+def _bloquear(archivo):
+    if fcntl is not None:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        return
+    archivo.seek(0)
+    while True:
+        try:
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK se rinde tras 10 s; el otro proceso sigue escribiendo
+            continue
+
+
+def _desbloquear(archivo):
+    if fcntl is not None:
+        fcntl.flock(archivo, fcntl.LOCK_UN)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+_candados = {}
+_registro = threading.Lock()
+
+
+@contextmanager
+def candado_archivo(ruta):
+    """Exclusión entre hilos y procesos sobre ruta (un archivo .lock que se crea vacío)."""
+    with _registro:
+        candado = _candados.setdefault(os.path.abspath(ruta), _Candado(ruta))
+    candado.adquirir()
+    try:
+        yield
+    finally:
+        candado.liberar()
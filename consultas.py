@@ -0,0 +1,228 @@
+# consultas.py
+"""
+Consultas SQL sobre los reportes cargados, sin pasar por Excel.
+
+Los DataFrames de la sesión (Timecard, Scheduled Jobs, Downtime, Orders, Sales, Forecast)
+y el último snapshot MRP se registran como tablas de una base SQLite en memoria, junto con
+las dimensiones compartidas (dim_wc, dim_item, ...), con índices en Job #, Item, W/C,
+Customer, Vendor, las llaves id_* y las columnas de fecha. La base se arma
+una sola vez por combinación de huellas de los datos y la comparten las sesiones
+(st.cache_resource); los resultados se cachean por (huellas, consulta, límite de filas).
+
+SQLite no puede leer los arreglos de pandas sin copiarlos: la copia se hace al armar la
+base, no en cada consulta. Las fechas quedan como texto ISO ('2025-06-01 00:00:00'),
+que se compara y ordena igual que la fecha.
+"""
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from dimensiones import DIMENSIONES, dimension
+from perfilador import seccion
+from telemetria import huellas_datasets
+from utils import listar_snapshots_mrp, cargar_snapshot_mrp, boton_descarga_reporte
+
+# Tabla SQL → llave de session_state
+TABLAS_SESION = {
+    "timecard": "df_clean",
+    "programacion": "df_plan",
+    "downtime": "df_downtime_procesado",
+    "orders": "df_orders",
+    "sales": "df_sales",
+    "forecast": "df_forecast_compras",
+}
+
+# Además de las columnas de fecha, se indexan estas y las llaves de dimensiones cuando la tabla las tiene
+COLUMNAS_INDICE = ["Job #", "Item", "Item/OP #", "W/C", "Customer", "Vendor"] + [
+    llave for llave, _, _ in DIMENSIONES.values()
+]
+
+LIMITE_FILAS = 1_000
+MAX_LIMITE_FILAS = 100_000
+MAX_SEGUNDOS_CONSULTA = 10
+
+CONSULTA_EJEMPLO = '''-- Costo de scrap por item en jobs terminados después de su Due
+SELECT t."Item/OP #" AS Item,
+       SUM(t."Scrap Cost") AS "Scrap Cost",
+       COUNT(DISTINCT t."Job #") AS Jobs
+FROM timecard t
+JOIN programacion p ON p."Job #" = t."Job #"
+WHERE t."Completed On" > p."Due"
+GROUP BY t."Item/OP #"
+ORDER BY "Scrap Cost" DESC'''
+
+
+# Lo único que puede hacer una consulta del usuario: leer tablas y llamar funciones.
+# PRAGMA query_only no basta (la propia consulta puede apagarlo) y la conexión es compartida.
+ACCIONES_PERMITIDAS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+PRAGMAS_LECTURA = {"table_info", "table_xinfo", "index_list", "index_info"}
+
+
+def _autorizar(accion, arg1, arg2, base, disparador):
+    if accion in ACCIONES_PERMITIDAS:
+        return sqlite3.SQLITE_OK
+    if accion == sqlite3.SQLITE_PRAGMA and arg1 and arg1.lower() in PRAGMAS_LECTURA:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+# 🗄️ BASE SQLITE
+
+class _BaseConsultas:
+    """
+    Conexión SQLite en memoria de solo lectura; el candado serializa las consultas entre sesiones.
+    Ya con las tablas cargadas, el autorizador rechaza todo lo que no sea leer
+    (INSERT, DROP, ATTACH, PRAGMA de escritura, ...).
+    """
+
+    def __init__(self, tablas):
+        self.conexion = sqlite3.connect(":memory:", check_same_thread=False)
+        self.candado = threading.Lock()
+        self.tablas = {}
+        for nombre, df in tablas.items():
+            self._registrar(nombre, df)
+        self.conexion.execute("PRAGMA query_only = ON")
+        self.conexion.set_authorizer(_autorizar)
+
+    def _registrar(self, nombre, df):
+        df = df.copy()
+        # SQLite no tiene categorías ni fechas: texto y texto ISO
+        for columna in df.columns:
+            if isinstance(df[columna].dtype, pd.CategoricalDtype):
+                df[columna] = df[columna].astype(object)
+        df.to_sql(nombre, self.conexion, index=False)
+
+        indexadas = [
+            c for c in df.columns
+            if c in COLUMNAS_INDICE or pd.api.types.is_datetime64_any_dtype(df[c])
+        ]
+        for i, columna in enumerate(indexadas):
+            self.conexion.execute(f'CREATE INDEX "ix_{nombre}_{i}" ON "{nombre}" ("{columna}")')
+        self.conexion.execute(f'ANALYZE "{nombre}"')
+        self.tablas[nombre] = {"Filas": len(df), "Columnas": list(df.columns), "Índices": indexadas}
+
+    def consultar(self, sql, limite):
+        """
+        Ejecuta la consulta y devuelve (DataFrame, truncada). Se leen a lo más limite + 1 filas
+        para saber si hubo más; una consulta de más de MAX_SEGUNDOS_CONSULTA se interrumpe.
+        """
+        with self.candado:
+            fin = time.monotonic() + MAX_SEGUNDOS_CONSULTA
+            self.conexion.set_progress_handler(lambda: int(time.monotonic() > fin), 10_000)
+            try:
+                cursor = self.conexion.execute(sql)
+                if cursor.description is None:
+                    return pd.DataFrame(), False
+                filas = cursor.fetchmany(limite + 1)
+            finally:
+                self.conexion.set_progress_handler(None, 0)
+        return pd.DataFrame(filas[:limite], columns=_nombres_unicos(cursor.description)), len(filas) > limite
+
+
+def _nombres_unicos(descripcion):
+    # SELECT * con JOIN repite columnas (Item, Item): st.dataframe y Arrow no lo aceptan
+    vistos, nombres = {}, []
+    for nombre, *_ in descripcion:
+        vistos[nombre] = vistos.get(nombre, 0) + 1
+        nombres.append(nombre if vistos[nombre] == 1 else f"{nombre} ({vistos[nombre]})")
+    return nombres
+
+
+def tablas_en_sesion():
+    """
+    DataFrames disponibles para SQL y su firma (huellas de contenido), que identifica la base.
+    El MRP es el último snapshot guardado: mrp_po y mrp_sin_req. Las dimensiones compartidas
+    van como dim_wc, dim_item, ... para unir por sus llaves id_*.
+    """
+    huellas = huellas_datasets()
+    tablas, firma = {}, []
+    for nombre, llave in TABLAS_SESION.items():
+        df = st.session_state.get(llave)
+        if isinstance(df, pd.DataFrame) and llave in huellas:
+            tablas[nombre] = df
+            firma.append(f"{nombre}:{huellas[llave]}")
+
+    snapshots = listar_snapshots_mrp()
+    if not snapshots.empty:
+        clave = snapshots["Clave"].iloc[-1]
+        tablas["mrp_po"], tablas["mrp_sin_req"] = cargar_snapshot_mrp(clave)
+        firma.append(f"mrp:{clave}")
+
+    if tablas:
+        for nombre in DIMENSIONES:
+            tabla = dimension(nombre)
+            if not tabla.empty:
+                tablas[f"dim_{nombre}"] = tabla
+                # Las dimensiones solo crecen; los atributos se cubren con la huella de los reportes
+                firma.append(f"dim_{nombre}:{len(tabla)}")
+
+    return tablas, "|".join(firma)
+
+
+@st.cache_resource(show_spinner="Preparando tablas SQL...", max_entries=4)
+def base_consultas(firma, _tablas):
+    return _BaseConsultas(_tablas)
+
+
+@st.cache_data(show_spinner=False, max_entries=50)
+def ejecutar_consulta(firma, sql, limite, _base):
+    """(resultado, truncada) de una consulta; se reutiliza mientras la firma de los datos no cambie."""
+    return _base.consultar(sql, limite)
+
+
+# 🧮 PÁGINA
+
+def consultas_app():
+    st.header("🧮 Consultas SQL")
+
+    tablas, firma = tablas_en_sesion()
+    if not tablas:
+        st.warning("Primero carga los reportes (o espera a que el vigilante del ERP los publique).")
+        return
+
+    with seccion("Base SQL", "carga"):
+        base = base_consultas(firma, tablas)
+
+    with st.expander("📚 Tablas disponibles"):
+        for nombre, info in base.tablas.items():
+            st.markdown(f"**{nombre}** · {info['Filas']:,} filas · índices: {', '.join(info['Índices']) or '—'}")
+            st.caption(", ".join(f'"{c}"' for c in info["Columnas"]))
+
+    sql = st.text_area(
+        "Consulta (solo lectura; nombres con espacios o # entre comillas dobles)",
+        value=CONSULTA_EJEMPLO, height=220, key="consulta_sql"
+    )
+    limite = st.number_input(
+        "Máximo de filas", min_value=1, max_value=MAX_LIMITE_FILAS, value=LIMITE_FILAS, step=LIMITE_FILAS
+    )
+    if not sql.strip():
+        return
+
+    inicio = time.perf_counter()
+    try:
+        with seccion("Consulta SQL", "agregación") as s:
+            resultado, truncada = ejecutar_consulta(firma, sql.strip(), int(limite), base)
+            s.carga(resultado)
+    except sqlite3.Error as e:
+        if str(e) == "interrupted":
+            st.error(f"❌ La consulta pasó de {MAX_SEGUNDOS_CONSULTA} s y se detuvo; agrega filtros.")
+        elif str(e) == "not authorized":
+            st.error("❌ Solo se permiten consultas de lectura (SELECT / WITH).")
+        else:
+            st.error(f"❌ {e}")
+        return
+
+    col1, col2 = st.columns(2)
+    col1.metric("Filas", f"{len(resultado):,}{'+' if truncada else ''}")
+    col2.metric("Tiempo de consulta", f"{(time.perf_counter() - inicio) * 1000:,.0f} ms")
+    if truncada:
+        st.warning(f"Se muestran las primeras {int(limite):,} filas; agrega filtros o sube el máximo.")
+
+    with seccion("Tabla resultado", "render"):
+        st.dataframe(resultado, hide_index=True, use_container_width=True)
+    boton_descarga_reporte(
+        resultado, "consulta_sql", key="descarga_consulta_sql", firma=(firma, sql.strip(), int(limite))
+    )
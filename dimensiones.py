@@ -0,0 +1,192 @@
+# dimensiones.py
+"""
+Dimensiones compartidas entre reportes (W/C, Item, Customer, Vendor, Employee) con llaves int32.
+
+Cada valor de texto recibe una llave la primera vez que aparece en cualquier reporte y la
+conserva: las dimensiones solo crecen y la llave es la posición del valor en la tabla, así
+que las llaves guardadas en datasets publicados y snapshots MRP siguen valiendo entre
+reinicios. La app y el vigilante del ERP (que puede correr como otro proceso) asignan llaves
+sobre los mismos archivos: cada asignación relee la tabla y escribe bajo un candado de
+archivo, así dos procesos nunca dan la misma llave a valores distintos. Al ingresar, cada reporte recibe una columna id_* por dimensión (con_llaves) y
+los filtros se hacen sobre esos enteros (filtrar_por_dimension).
+
+Los atributos viven en la dimensión: el W/C Type se toma de Timecard y Scheduled Jobs y
+llega por la llave a reportes que no lo traen, como Downtime.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from candados import candado_archivo
+
+DIRECTORIO_DIMENSIONES = os.path.join("datos", "dimensiones")
+
+# Llave de un valor vacío o que no está en la dimensión
+SIN_LLAVE = -1
+
+# Dimensión → (columna llave, columnas de los reportes que la usan, atributos)
+# La primera columna da nombre a los valores en la tabla de la dimensión.
+DIMENSIONES = {
+    "wc": ("id_wc", ["W/C"], ["W/C Type"]),
+    "item": ("id_item", ["Item"], []),
+    "customer": ("id_cliente", ["Customer"], []),
+    "vendor": ("id_proveedor", ["Vendor", "Vendor Limpio"], []),
+    "employee": ("id_empleado", ["Employee"], []),
+}
+
+_candado = threading.RLock()
+# nombre → (versión del parquet en disco, tabla)
+_tablas = {}
+
+
+def _ruta(nombre):
+    return os.path.join(DIRECTORIO_DIMENSIONES, f"{nombre}.parquet")
+
+
+def _tabla_vacia(nombre):
+    llave, columnas, atributos = DIMENSIONES[nombre]
+    tabla = pd.DataFrame({llave: pd.Series(dtype="int32"), columnas[0]: pd.Series(dtype=object)})
+    for atributo in atributos:
+        tabla[atributo] = pd.Series(dtype=object)
+    return tabla
+
+
+def _version(ruta):
+    # os.replace deja un archivo nuevo: inodo, tamaño y mtime en ns detectan la escritura de otro proceso
+    if not os.path.exists(ruta):
+        return None
+    info = os.stat(ruta)
+    return info.st_ino, info.st_size, info.st_mtime_ns
+
+
+def dimension(nombre):
+    """Tabla de la dimensión (llave, valor y atributos). Se relee solo si el archivo cambió."""
+    ruta = _ruta(nombre)
+    version = _version(ruta)
+    with _candado:
+        if nombre not in _tablas or _tablas[nombre][0] != version:
+            _tablas[nombre] = (version, pd.read_parquet(ruta) if version is not None else _tabla_vacia(nombre))
+        return _tablas[nombre][1]
+
+
+@contextmanager
+def _candado_registro(nombre):
+    """Exclusión entre hilos y entre procesos mientras se leen y escriben las llaves de una dimensión."""
+    with _candado, candado_archivo(_ruta(nombre) + ".lock"):
+        yield
+
+
+def _guardar(nombre, tabla):
+    # Escritura atómica: otra sesión (o el vigilante) puede estar leyéndola
+    temporal = _ruta(nombre) + ".tmp"
+    tabla.to_parquet(temporal, index=False)
+    os.replace(temporal, _ruta(nombre))
+    _tablas[nombre] = (_version(_ruta(nombre)), tabla)
+
+
+def _texto(valores):
+    """Forma en que se guardan y se buscan los valores: texto sin espacios a los lados."""
+    return pd.Index(valores).astype(str).str.strip()
+
+
+def _factorizar(valores):
+    """(códigos por renglón, valores únicos como texto); los vacíos quedan con código -1."""
+    codigos, unicos = pd.factorize(pd.Series(valores), use_na_sentinel=True)
+    return codigos, _texto(unicos)
+
+
+def asignar_llaves(nombre, valores, atributos=None):
+    """
+    Llaves int32 de los valores, agregando a la dimensión los que no estaban.
+    - atributos: DataFrame alineado con valores (p. ej. la columna W/C Type); el último valor
+      no vacío de cada renglón actualiza el atributo en la dimensión.
+    """
+    llave, columnas, _ = DIMENSIONES[nombre]
+    codigos, unicos = _factorizar(valores)
+
+    with _candado_registro(nombre):
+        # Ya con el candado: la tabla incluye lo que otro proceso haya agregado
+        tabla = dimension(nombre)
+        cambio = False
+
+        nuevos = unicos.difference(pd.Index(tabla[columnas[0]])).unique()
+        if len(nuevos):
+            agregados = pd.DataFrame({
+                llave: np.arange(len(tabla), len(tabla) + len(nuevos), dtype="int32"),
+                columnas[0]: nuevos.to_numpy(dtype=object),
+            })
+            tabla = pd.concat([tabla, agregados], ignore_index=True)
+            cambio = True
+
+        posiciones = pd.Index(tabla[columnas[0]]).get_indexer(unicos)
+
+        if atributos is not None and len(atributos.columns):
+            ultimos = (
+                atributos.assign(_posicion=np.where(codigos >= 0, posiciones[codigos], SIN_LLAVE))
+                .query("_posicion >= 0")
+                .drop_duplicates("_posicion", keep="last")
+                .set_index("_posicion")
+            )
+            for atributo in ultimos.columns:
+                nuevos_valores = ultimos[atributo].dropna()
+                nuevos_valores = pd.Series(_texto(nuevos_valores), index=nuevos_valores.index)
+                actuales = tabla[atributo].reindex(nuevos_valores.index)
+                cambios = nuevos_valores[actuales.ne(nuevos_valores)]
+                if len(cambios):
+                    if not cambio:
+                        tabla = tabla.copy()
+                    tabla.loc[cambios.index, atributo] = cambios
+                    cambio = True
+
+        if cambio:
+            _guardar(nombre, tabla)
+
+    return np.where(codigos >= 0, posiciones[codigos], SIN_LLAVE).astype("int32")
+
+
+def con_llaves(df):
+    """Copia de df con una columna id_* int32 por cada dimensión cuyas columnas trae el reporte."""
+    llaves = {}
+    for nombre, (llave, columnas, atributos) in DIMENSIONES.items():
+        columna = next((c for c in columnas if c in df.columns), None)
+        if columna is None:
+            continue
+        presentes = [a for a in atributos if a in df.columns]
+        llaves[llave] = asignar_llaves(nombre, df[columna], df[presentes] if presentes else None)
+    return df.assign(**llaves) if llaves else df
+
+
+def llaves_de(nombre, valores):
+    """Llaves de valores ya registrados (los desconocidos se omiten)."""
+    _, columnas, _ = DIMENSIONES[nombre]
+    posiciones = pd.Index(dimension(nombre)[columnas[0]]).get_indexer(_texto(valores))
+    return posiciones[posiciones >= 0].astype("int32")
+
+
+def llaves_por_atributo(nombre, atributo, valores):
+    """Llaves cuyo atributo (p. ej. W/C Type) está en valores."""
+    tabla = dimension(nombre)
+    return tabla[DIMENSIONES[nombre][0]][tabla[atributo].isin(_texto(valores))].to_numpy()
+
+
+def filtrar_por_dimension(df, nombre, valores, atributo=None):
+    """
+    Renglones de df cuyo valor de la dimensión (o de su atributo) está en valores, comparando llaves.
+    Si el reporte trae la columna del atributo manda la del renglón: la dimensión guarda el
+    último valor que escribió cualquier reporte y solo se usa para los que no lo traen (Downtime).
+    Reportes cargados antes de tener llaves se filtran por texto; si no hay cómo, df queda igual.
+    """
+    llave, columnas, _ = DIMENSIONES[nombre]
+    if atributo is not None and atributo in df.columns:
+        return df[df[atributo].isin(valores)]
+    if llave in df.columns:
+        seleccion = llaves_por_atributo(nombre, atributo, valores) if atributo else llaves_de(nombre, valores)
+        return df[df[llave].isin(seleccion)]
+
+    columna = atributo or next((c for c in columnas if c in df.columns), None)
+    if columna is None or columna not in df.columns:
+        return df
+    return df[df[columna].isin(valores)]
@@ -1,7 +1,8 @@
 # escalera.py
 
 import streamlit as st
-from utils import cargar_archivos_estilo_escalera, graficar_evolucion_item, exportar_excel
+from utils import cargar_archivos_estilo_escalera, graficar_evolucion_item, boton_descarga_reporte, volatilidad_escalera
+from perfilador import seccion
 
 def escalera_app():
     #st.set_page_config(page_title="Análisis Escalera", layout="wide")
@@ -34,7 +35,8 @@ def escalera_app():
 
     if archivos:
         # 🚀 Cargar datos estilo escalera
-        df_escalera, versiones = cargar_archivos_estilo_escalera(archivos)
+        with seccion("Lectura y tabla escalera", "carga") as s:
+            df_escalera, versiones = s.carga(cargar_archivos_estilo_escalera(archivos))
 
         if df_escalera is not None:
             # 📋 Mostrar tabla escalera
@@ -43,17 +45,67 @@ def escalera_app():
 
             # 📈 Gráfico por ítem
             st.subheader("📈 Evolución por Ítem")
-            item_sel = st.selectbox("Selecciona un ítem", sorted(df_escalera["Item"].unique()))
-            graficar_evolucion_item(df_escalera, item_sel)
-
-            # 💾 Exportar a Excel
-            st.subheader("⬇️ Exportar a Excel")
-            excel_data = exportar_excel(df_escalera)
-            st.download_button(
-                label="📥 Descargar archivo Excel",
-                data=excel_data,
-                file_name="analisis_escalera.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            item_sel = st.selectbox("Selecciona un ítem", df_escalera["Item"].unique())
+            with seccion("Evolución por ítem", "figura"):
+                graficar_evolucion_item(st.session_state.cubo_escalera, item_sel)
+
+            # 📉 Volatilidad de releases entre versiones consecutivas
+            st.subheader("📉 Volatilidad de Releases")
+            if len(versiones) < 2:
+                st.info("Se necesitan al menos dos archivos para medir cambios entre versiones.")
+            else:
+                dias_congelados = st.number_input("Ventana congelada (días desde el release)", min_value=0, value=14, step=7)
+
+                # Cliente por ítem tomado de la escalera de ventas, si ya se importó
+                df_escalera_ventas = st.session_state.get("df_escalera")
+                clientes = None
+                if df_escalera_ventas is not None:
+                    clientes = df_escalera_ventas.drop_duplicates("Item").set_index("Item")["Cliente"]
+
+                with seccion("Volatilidad de releases", "agregación"):
+                    cambios, resumen_volatilidad = volatilidad_escalera(
+                        st.session_state.cubo_escalera, int(dias_congelados), clientes
+                    )
+
+                if resumen_volatilidad.empty:
+                    st.success("✅ No hubo cambios de cantidades entre versiones.")
+                else:
+                    if clientes is not None:
+                        clientes_sel = st.multiselect("Cliente(s)", resumen_volatilidad["Cliente"].cat.categories.tolist())
+                        if clientes_sel:
+                            resumen_volatilidad = resumen_volatilidad[resumen_volatilidad["Cliente"].isin(clientes_sel)]
+                            cambios = cambios[cambios["Cliente"].isin(clientes_sel)]
+
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Ítems con cambios", f"{len(resumen_volatilidad):,}")
+                    col2.metric("Cambios totales", f"{resumen_volatilidad['Cambios'].sum():,}")
+                    col3.metric("Violaciones de ventana", f"{resumen_volatilidad['Violaciones Ventana'].sum():,}")
+
+                    top_n = st.slider("Top ítems más volátiles", 5, 100, 20)
+                    st.dataframe(
+                        resumen_volatilidad.head(top_n).style.format({
+                            "Delta Neto": "{:,.0f}",
+                            "Delta Absoluto": "{:,.0f}",
+                            "Volatilidad %": "{:.1f}%",
+                            "Score": "{:.1f}"
+                        }),
+                        use_container_width=True
+                    )
+
+                    if st.checkbox("Mostrar cambios del ítem seleccionado"):
+                        st.dataframe(cambios[cambios["Item"] == item_sel], use_container_width=True)
+
+            # 💾 Exportar
+            st.subheader("⬇️ Exportar Datos")
+            boton_descarga_reporte(
+                lambda: {
+                    "Escalera": df_escalera,
+                    "Totales por Snapshot": df_escalera.drop(columns="Item").groupby("Snapshot", sort=False).sum(numeric_only=True),
+                },
+                "analisis_escalera",
+                key="descarga_escalera",
+                # Huellas por archivo que ya calculó el cubo escalera
+                firma=tuple(st.session_state.cubo_escalera["huellas"])
             )
     else:
         st.info("Por favor, sube al menos dos archivos Excel para comenzar el análisis.")
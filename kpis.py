@@ -0,0 +1,435 @@
+# kpis.py
+"""
+KPIs del dashboard como funciones puras (sin st.*), compartidas por las páginas
+de Streamlit y por el modo batch de línea de comandos, para que ambos den siempre
+los mismos números.
+
+Modo batch: recibe archivos o carpetas, reconoce cada reporte por su encabezado
+(utils.clasificar_reporte), los lee en paralelo en varios procesos y escribe las
+tablas de KPIs en Parquet o CSV.
+
+Uso:
+    python kpis.py reportes/ --salida kpis/
+    python kpis.py timecard.xlsx plan.xlsx mrp_0601.xlsx mrp_0608.xlsx --formato csv --procesos 4
+
+Los snapshots MRP se comparan en orden de nombre de archivo (Antes = anterior).
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    # Fuera de Streamlit cada @st.cache_data avisa al importarse utils que no hay Runtime
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")
+    warnings.simplefilter("ignore", pd.errors.SettingWithCopyWarning)
+
+import utils
+
+COLUMNAS_RUN_RATE = ["Expected Run Rate /hr", "Actual Run Rate /hr"]
+COLUMNAS_PROMEDIO = ["Efficiency", "OEE"] + COLUMNAS_RUN_RATE
+
+# Columnas que se repiten en cada renglón de un mismo Timesheet (una fila por razón de downtime)
+COLUMNAS_POR_TIMESHEET = ["Quantity", "Hours", "Non-production Downtime Hours", "Scrap"]
+
+# Granularidad de los agregados diarios del timecard (los filtros del dashboard)
+DIMENSIONES_DIARIO = ["Día", "W/C Type", "W/C", "Shift"]
+
+
+# 🏭 PRODUCCIÓN
+
+def timesheets_unicos(df):
+    """Un renglón por Timesheet #, para sumar cantidades que el reporte repite."""
+    return df.drop_duplicates(subset=["Timesheet #"])
+
+
+def agregados_diarios(df):
+    """
+    Agregados del timecard por (Día, W/C Type, W/C, Shift), base de los KPIs de producción.
+    Los promedios se guardan como suma y conteo para poder combinarlos entre grupos:
+    - Efficiency, OEE y run rates: "<col> suma" y "<col> n" sobre todos los renglones
+    - Production Downtime Hours: suma de todos los renglones (uno por razón)
+    - Quantity, Hours, Non-production Downtime Hours, Scrap: suma por Timesheet # único
+    Un Timesheet pertenece a un solo día, W/C y turno, así que deduplicar antes de agrupar
+    equivale a hacerlo después de filtrar.
+    """
+    def llaves(datos):
+        return [datos["Completed On"].dt.normalize().rename("Día")] + [datos[c] for c in DIMENSIONES_DIARIO[1:]]
+
+    numericos = df[COLUMNAS_PROMEDIO].apply(pd.to_numeric, errors="coerce")
+    por_renglon = pd.concat([
+        numericos.groupby(llaves(df), dropna=False).sum().add_suffix(" suma"),
+        numericos.groupby(llaves(df), dropna=False).count().add_suffix(" n"),
+        df.groupby(llaves(df), dropna=False)[["Production Downtime Hours"]].sum(),
+    ], axis=1)
+
+    df_unico = timesheets_unicos(df)
+    por_timesheet = df_unico.groupby(llaves(df_unico), dropna=False)[COLUMNAS_POR_TIMESHEET].sum()
+
+    return por_renglon.join(por_timesheet).fillna({c: 0 for c in COLUMNAS_POR_TIMESHEET}).reset_index()
+
+
+def filtrar_diario(diario, fechas=None, turnos=None, wc_types=None, wcs=None):
+    """Mismos filtros del dashboard, aplicados a los agregados diarios."""
+    mascara = pd.Series(True, index=diario.index)
+    if fechas is not None:
+        mascara &= (diario["Día"] >= pd.to_datetime(fechas[0])) & (diario["Día"] <= pd.to_datetime(fechas[1]))
+    if turnos is not None:
+        mascara &= diario["Shift"].isin(turnos)
+    if wc_types is not None:
+        mascara &= diario["W/C Type"].isin(wc_types)
+    if wcs is not None:
+        mascara &= diario["W/C"].isin(wcs)
+    return diario[mascara]
+
+
+def _promedios(sumas):
+    for columna in COLUMNAS_PROMEDIO:
+        sumas[columna] = sumas[f"{columna} suma"] / sumas[f"{columna} n"].where(sumas[f"{columna} n"] > 0)
+    return sumas
+
+
+def resumen_desde_diario(diario):
+    """KPIs del encabezado del dashboard sobre los agregados diarios ya filtrados."""
+    totales = _promedios(diario.drop(columns=DIMENSIONES_DIARIO).sum().to_frame().T).iloc[0]
+    return {
+        "Eficiencia Promedio": totales["Efficiency"],
+        "OEE Promedio": totales["OEE"],
+        "Cantidad Producida": totales["Quantity"],
+        "Horas No-Producción": totales["Non-production Downtime Hours"],
+    }
+
+
+def kpis_por_wc_desde_diario(diario):
+    """Una fila por W/C con las columnas del timecard (promedios y sumas, ver agregados_diarios)."""
+    por_wc = _promedios(diario.drop(columns=["Día", "W/C Type", "Shift"]).groupby("W/C").sum())
+    columnas = COLUMNAS_PROMEDIO + ["Production Downtime Hours"] + COLUMNAS_POR_TIMESHEET
+    return por_wc[columnas].reset_index()
+
+
+def resumen_produccion(df):
+    """KPIs del encabezado del dashboard sobre el timecard ya filtrado."""
+    return resumen_desde_diario(agregados_diarios(df))
+
+
+def kpis_por_wc(df):
+    """KPIs por W/C sobre el timecard ya filtrado."""
+    return kpis_por_wc_desde_diario(agregados_diarios(df))
+
+
+def eficiencia_por_empleado(df):
+    return (
+        df.groupby("Employee")["Efficiency"]
+        .mean()
+        .reset_index()
+        .sort_values(by="Efficiency", ascending=False)
+    )
+
+
+def conteos_por_turno(df):
+    """Empleados y Jobs únicos por turno."""
+    return df.groupby("Shift")[["Employee", "Job #"]].nunique().reset_index()
+
+
+def cumplimiento_plan(df_plan):
+    """
+    Cumplimiento al plan por W/C sobre Scheduled Jobs: Produced / To Make
+    y piezas faltantes (Can Make - Remaining). Ordenado de menor a mayor cumplimiento.
+    """
+    columnas = ["To Make", "Produced", "Can Make", "Remaining"]
+    cumplimiento = (
+        df_plan[columnas].apply(pd.to_numeric, errors="coerce")
+        .groupby(df_plan["W/C"]).sum()
+        .reset_index()
+    )
+    cumplimiento["Cumplimiento (%)"] = (
+        (cumplimiento["Produced"] / cumplimiento["To Make"]) * 100
+    ).round(2).fillna(0)
+    cumplimiento["Piezas Faltantes"] = cumplimiento["Can Make"] - cumplimiento["Remaining"]
+    return cumplimiento.sort_values(by="Cumplimiento (%)", ascending=True)
+
+
+def carga_plan_por_dia(df_plan, desde=None, hasta=None, dias_laborales=range(5)):
+    """
+    Horas programadas de Scheduled Jobs por W/C y día, sin recorrer job por job: cada job se
+    repite una vez por día entre Starts On y Ends On (np.repeat). El Setup Hrs. cae en el
+    primer día laboral del job y el resto de Total Hrs. se reparte parejo entre sus días laborales.
+    - desde/hasta: solo se generan los días de esa ventana (el reparto usa la duración completa)
+    - dias_laborales: días de la semana con capacidad (0 = lunes), los mismos de capacidad_por_dia;
+      un job que solo cae en días no laborales se reparte entre todos sus días
+    Jobs sin Starts On se omiten; si Ends On falta o es anterior, el job ocupa un solo día.
+    Devuelve W/C, Día, Setup (hrs), Corrida (hrs), Carga (hrs).
+    """
+    inicio = pd.to_datetime(df_plan["Starts On"], errors="coerce").dt.normalize().to_numpy()
+    fin = pd.to_datetime(df_plan["Ends On"], errors="coerce").dt.normalize().to_numpy()
+    validos = ~np.isnat(inicio)
+    inicio, fin = inicio[validos], fin[validos]
+    fin = np.where(np.isnat(fin) | (fin < inicio), inicio, fin)
+    un_dia = np.timedelta64(1, "D")
+
+    # Días laborales de cada job y su primer día laboral (np.busday_* trabajan en días)
+    semana = [dia in dias_laborales for dia in range(7)]
+    laborales = np.busday_count(inicio.astype("M8[D]"), fin.astype("M8[D]") + 1, weekmask=semana)
+    sin_laborales = laborales == 0
+    duracion = np.where(sin_laborales, (fin - inicio) // un_dia + 1, laborales)
+    primer_laboral = np.busday_offset(inicio.astype("M8[D]"), 0, roll="forward", weekmask=semana).astype(inicio.dtype)
+    primer_dia = np.where(sin_laborales, inicio, primer_laboral)
+
+    total = pd.to_numeric(df_plan["Total Hrs."], errors="coerce").fillna(0).clip(lower=0).to_numpy()[validos]
+    setup = pd.to_numeric(df_plan["Setup Hrs."], errors="coerce").fillna(0).clip(lower=0).to_numpy()[validos]
+    setup = np.minimum(setup, total)
+    corrida_por_dia = (total - setup) / duracion
+
+    # Recorte a la ventana antes de expandir
+    primero = inicio if desde is None else np.maximum(inicio, np.datetime64(pd.Timestamp(desde).normalize(), "ns"))
+    ultimo = fin if hasta is None else np.minimum(fin, np.datetime64(pd.Timestamp(hasta).normalize(), "ns"))
+    dias = np.clip((ultimo - primero) // un_dia + 1, 0, None)
+
+    job = np.repeat(np.arange(len(dias)), dias)
+    desfase = np.arange(len(job)) - np.repeat(np.cumsum(dias) - dias, dias)
+    dia = primero[job] + desfase * un_dia
+    con_corrida = sin_laborales[job] | np.is_busday(dia.astype("M8[D]"), weekmask=semana)
+
+    buckets = pd.DataFrame({
+        "W/C": df_plan["W/C"].to_numpy()[validos][job],
+        "Día": dia,
+        "Setup (hrs)": np.where(dia == primer_dia[job], setup[job], 0.0),
+        "Corrida (hrs)": np.where(con_corrida, corrida_por_dia[job], 0.0),
+    })
+    carga = buckets.groupby(["W/C", "Día"]).sum().reset_index()
+    carga["Carga (hrs)"] = carga["Setup (hrs)"] + carga["Corrida (hrs)"]
+    return carga
+
+
+def capacidad_por_dia(carga, horas_por_dia, desde, hasta, wcs=None, diario=None, dias_laborales=range(5)):
+    """
+    Carga programada (carga_plan_por_dia) contra horas disponibles y horas reales por W/C y día.
+    - horas_por_dia: horas disponibles de cada W/C en un día laboral
+    - dias_laborales: días de la semana con capacidad (0 = lunes)
+    - diario: agregados_diarios del Timecard para las horas reales (Hours por Timesheet)
+    Devuelve una fila por W/C y día de la ventana (también los días sin carga) con
+    Carga (hrs), Disponible (hrs), Real (hrs), Utilización (%) y Real vs Disponible (%).
+    """
+    dias = pd.date_range(pd.Timestamp(desde).normalize(), pd.Timestamp(hasta).normalize(), freq="D", name="Día")
+    wcs = sorted(set(carga["W/C"]) | set(wcs if wcs is not None else []))
+    malla = pd.MultiIndex.from_product([pd.Index(wcs, name="W/C"), dias])
+
+    capacidad = carga.set_index(["W/C", "Día"])[["Carga (hrs)"]].reindex(malla, fill_value=0.0)
+    laboral = np.isin(malla.get_level_values("Día").dayofweek, list(dias_laborales))
+    capacidad["Disponible (hrs)"] = np.where(laboral, float(horas_por_dia), 0.0)
+
+    if diario is not None and not diario.empty:
+        real = diario.groupby(["W/C", "Día"], observed=True)["Hours"].sum()
+        capacidad["Real (hrs)"] = real.reindex(malla).fillna(0.0).to_numpy()
+    else:
+        capacidad["Real (hrs)"] = np.nan
+
+    disponible = capacidad["Disponible (hrs)"].where(capacidad["Disponible (hrs)"] > 0)
+    capacidad["Utilización (%)"] = capacidad["Carga (hrs)"] / disponible * 100
+    capacidad["Real vs Disponible (%)"] = capacidad["Real (hrs)"] / disponible * 100
+    return capacidad.reset_index()
+
+
+# 📉 MRP
+
+def items_por_tipo(df_po, df_sin_req):
+    """Items únicos por Type en un snapshot (con P/O más sin requerimiento)."""
+    resumen = pd.concat([
+        df_po.groupby("Type", observed=True)["Item"].nunique().reset_index(name="Cantidad"),
+        df_sin_req.groupby("Type", observed=True)["Item"].nunique().reset_index(name="Cantidad"),
+    ], ignore_index=True)
+    return resumen.groupby("Type", observed=True)["Cantidad"].sum().reset_index()
+
+
+def cambios_requerimiento(df_sin_req_antes, df_sin_req_despues):
+    """
+    Items que cambiaron de estado de requerimiento entre dos snapshots.
+    Devuelve (dejaron de tener requerimiento, empezaron a tener requerimiento).
+    """
+    sin_req_antes = set(df_sin_req_antes["Item"].dropna().unique())
+    sin_req_despues = set(df_sin_req_despues["Item"].dropna().unique())
+    return (
+        pd.DataFrame(sorted(sin_req_despues - sin_req_antes), columns=["Item"]),
+        pd.DataFrame(sorted(sin_req_antes - sin_req_despues), columns=["Item"]),
+    )
+
+
+def deltas_mrp(diff):
+    """Cantidades Antes/Después por Item y Fecha Llegada sobre el diff de utils.comparar_snapshots_mrp()."""
+    return diff.groupby(["Item", "Fecha Llegada"], observed=True)[
+        ["Cantidad Antes", "Cantidad Después", "Diferencia"]].sum().reset_index()
+
+
+# 💰 PRONÓSTICO VS VENTAS
+
+def pronostico_vs_ventas(cubo, periodo="Mes"):
+    """
+    Pronosticado, Vendido y Diferencia por periodo (Semana o Mes) y Customer,
+    con todas las combinaciones (las que no tienen movimiento en cero).
+    """
+    resumen = utils.consultar_cubo_ventas(cubo, [periodo, "Customer"]).rename(columns={periodo: "Periodo"})
+    base_completa = pd.MultiIndex.from_product(
+        [sorted(resumen["Periodo"].unique()), sorted(resumen["Customer"].unique())],
+        names=["Periodo", "Customer"]
+    )
+    completo = (
+        resumen.set_index(["Periodo", "Customer"])[["Pronosticado", "Vendido"]]
+        .reindex(base_completa, fill_value=0)
+        .reset_index()
+    )
+    completo["Diferencia"] = completo["Vendido"] - completo["Pronosticado"]
+    return completo
+
+
+def pronostico_vs_ventas_mensual(cubo):
+    """Vendido y Pronosticado por mes, sin huecos entre el primer y el último mes."""
+    por_mes = utils.consultar_cubo_ventas(cubo, ["Mes"]).set_index("Mes")
+    rango_meses = pd.date_range(start=por_mes.index.min(), end=por_mes.index.max(), freq="MS")
+    return (
+        por_mes[["Vendido", "Pronosticado"]]
+        .reindex(rango_meses, fill_value=0)
+        .rename_axis("Periodo")
+        .reset_index()
+    )
+
+
+# 🧮 MODO BATCH
+
+def archivos_de_entrada(rutas):
+    """Expande carpetas (recursivamente) a sus archivos .xlsx; ignora los temporales de Excel (~$)."""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for carpeta, _, nombres in os.walk(ruta):
+                archivos.extend(
+                    os.path.join(carpeta, n) for n in nombres
+                    if n.lower().endswith(".xlsx") and not n.startswith("~$")
+                )
+        else:
+            archivos.append(ruta)
+    return sorted(archivos)
+
+
+def procesar_archivo(ruta):
+    """Trabajo de cada proceso: clasificar y leer un archivo. Devuelve un dict serializable."""
+    t0 = time.perf_counter()
+    tipo, datos, error = None, None, None
+    try:
+        tipo, skiprows = utils.clasificar_reporte(ruta)
+        if tipo is None:
+            error = "El encabezado no coincide con ningún reporte conocido"
+        else:
+            # Sin llaves de dimensiones: los KPIs del lote no las usan y los procesos se
+            # formarían en el candado del registro
+            _, datos, error = utils.leer_reporte(ruta, tipo, skiprows, llaves=False)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"ruta": ruta, "tipo": tipo, "datos": datos, "error": error, "segundos": time.perf_counter() - t0}
+
+
+def _con_archivo(df, ruta):
+    return df.assign(Archivo=os.path.basename(ruta))
+
+
+def calcular_tablas(leidos):
+    """
+    KPIs de todos los reportes leídos. Timecards, planes, Orders y Sales de varios archivos
+    se concatenan (sin renglones repetidos); los snapshots MRP se comparan de dos en dos.
+    Devuelve {nombre de tabla: DataFrame}.
+    """
+    por_tipo = {}
+    for leido in leidos:
+        if leido["datos"] is not None:
+            por_tipo.setdefault(leido["tipo"], []).append(leido)
+
+    def concatenar(tipo):
+        return pd.concat([l["datos"] for l in por_tipo[tipo]], ignore_index=True).drop_duplicates()
+
+    tablas = {}
+    if "timecard" in por_tipo:
+        df = concatenar("timecard")
+        tablas["produccion_resumen"] = pd.DataFrame([resumen_produccion(df)])
+        tablas["produccion_por_wc"] = kpis_por_wc(df)
+        tablas["produccion_por_empleado"] = eficiencia_por_empleado(df)
+        tablas["produccion_por_turno"] = conteos_por_turno(df)
+
+    if "programacion" in por_tipo:
+        tablas["cumplimiento_plan"] = cumplimiento_plan(concatenar("programacion"))
+
+    if "mrp" in por_tipo:
+        snapshots = sorted(por_tipo["mrp"], key=lambda l: os.path.basename(l["ruta"]))
+        tablas["mrp_items_por_tipo"] = pd.concat(
+            [_con_archivo(items_por_tipo(*l["datos"]), l["ruta"]) for l in snapshots], ignore_index=True
+        )
+        deltas = []
+        for antes, despues in zip(snapshots, snapshots[1:]):
+            diff = utils.comparar_snapshots_mrp(antes["datos"][0], despues["datos"][0]).reset_index()
+            deltas.append(deltas_mrp(diff).assign(
+                Antes=os.path.basename(antes["ruta"]), Después=os.path.basename(despues["ruta"])
+            ))
+        if deltas:
+            tablas["mrp_deltas"] = pd.concat(deltas, ignore_index=True)
+
+    if "orders" in por_tipo and "sales" in por_tipo:
+        cubo = utils._sin_cache(utils.construir_cubo_ventas)(concatenar("orders"), concatenar("sales"))
+        tablas["ventas_por_mes_cliente"] = pronostico_vs_ventas(cubo, "Mes")
+        tablas["ventas_mensual"] = pronostico_vs_ventas_mensual(cubo)
+
+    return tablas
+
+
+def escribir_tablas(tablas, salida, formato="parquet"):
+    """Escribe cada tabla como <salida>/<nombre>.parquet o .csv.gz con los exportadores de utils."""
+    os.makedirs(salida, exist_ok=True)
+    exportar = utils.exportar_parquet if formato == "parquet" else utils.exportar_csv_gz
+    extension = ".parquet" if formato == "parquet" else ".csv.gz"
+    rutas = []
+    for nombre, df in tablas.items():
+        ruta = os.path.join(salida, nombre + extension)
+        with open(ruta, "wb") as f:
+            f.write(exportar(df))
+        rutas.append(ruta)
+    return rutas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula los KPIs del dashboard sin abrir Streamlit")
+    parser.add_argument("entradas", nargs="+", help="Archivos .xlsx o carpetas con reportes del ERP")
+    parser.add_argument("--salida", default="kpis", help="Carpeta donde escribir las tablas (por defecto: kpis)")
+    parser.add_argument("--formato", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count(),
+                        help="Procesos para leer archivos en paralelo (por defecto: núcleos disponibles)")
+    args = parser.parse_args(argv)
+
+    archivos = archivos_de_entrada(args.entradas)
+    if not archivos:
+        print("No se encontraron archivos .xlsx en las entradas indicadas.", file=sys.stderr)
+        return 1
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(args.procesos or 1, len(archivos)))) as ejecutor:
+        leidos = list(ejecutor.map(procesar_archivo, archivos))
+
+    for leido in leidos:
+        estado = ("omitido: " if leido["tipo"] is None else "") + (leido["error"] or "ok")
+        print(f"{leido['tipo'] or '?':<13} {leido['segundos']:7.2f}s  {leido['ruta']}  {estado}")
+
+    tablas = calcular_tablas(leidos)
+    tablas["archivos"] = pd.DataFrame(
+        [{k: l[k] for k in ("ruta", "tipo", "error", "segundos")} for l in leidos]
+    )
+    rutas = escribir_tablas(tablas, args.salida, args.formato)
+
+    print(f"\n{len(rutas)} tablas en {args.salida} ({time.perf_counter() - inicio:.1f}s)")
+    # Los archivos no reconocidos se omiten; solo falla si un reporte reconocido no se pudo leer
+    return 1 if any(l["error"] and l["tipo"] for l in leidos) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+# metricas.py
+"""
+Endpoint HTTP local con métricas en formato de texto de Prometheus.
+
+El servidor corre en un hilo daemon dentro del mismo proceso de Streamlit y se
+levanta una sola vez (app.py llama a iniciar_servidor_metricas() en cada rerun).
+No depende de ningún servicio externo: para probarlo basta con
+
+    python metricas.py http://127.0.0.1:9108/metrics
+
+Métricas expuestas:
+- lamtec_lectura_segundos{lector}: duración de cada lectura/parseo de archivo en utils.py.
+- lamtec_cache_hits_total / lamtec_cache_misses_total{funcion}: uso de @st.cache_data.
+- lamtec_dataset_bytes{dataset}: memoria de los datasets en session_state, sumada entre sesiones.
+- lamtec_sesiones_activas: sesiones conectadas al servidor de Streamlit.
+- lamtec_rerun_segundos{pagina} y lamtec_etapa_segundos{pagina,etapa}: latencia de reruns.
+- lamtec_exportes_total{tipo,estado}: exportes del ERP procesados por el vigilante de carpeta.
+"""
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PUERTO_METRICAS = int(os.environ.get("LAMTEC_METRICS_PORT", "9108"))
+HOST_METRICAS = os.environ.get("LAMTEC_METRICS_HOST", "127.0.0.1")
+
+# Buckets por defecto de los clientes de Prometheus, extendidos para lecturas largas de Excel
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Sin rerun en este tiempo, una sesión deja de contar (solo si no hay Runtime de Streamlit)
+VENTANA_SESION_SEGUNDOS = 15 * 60
+
+_candado = threading.Lock()
+_servidor = None
+_logger = logging.getLogger("lamtec.metricas")
+# Se avisa una sola vez si Streamlit deja de exponer las sesiones conectadas
+_aviso_sesiones = False
+
+
+# 📊 REGISTRO EN MEMORIA
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.series = {}
+
+    def encabezado(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class _Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, *valores, cantidad=1):
+        with _candado:
+            self.series[valores] = self.series.get(valores, 0) + cantidad
+
+    def exponer(self):
+        lineas = self.encabezado()
+        with _candado:
+            series = dict(self.series)
+        for valores, total in sorted(series.items()):
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(total)}")
+        return lineas
+
+
+class _Indicador(_Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def reemplazar(self, series):
+        """Sustituye todas las series de golpe: {(valores de etiquetas): valor}."""
+        with _candado:
+            self.series = dict(series)
+
+    def exponer(self):
+        lineas = self.encabezado()
+        if self.funcion is not None:
+            series = {(): self.funcion()}
+        else:
+            with _candado:
+                series = dict(self.series)
+        for valores, valor in sorted(series.items()):
+            if valor is not None:
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(valor)}")
+        return lineas
+
+
+class _Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observar(self, *valores, valor):
+        with _candado:
+            conteos, suma = self.series.get(valores, ([0] * len(self.buckets), 0.0))
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    conteos[i] += 1
+            self.series[valores] = (conteos, suma + valor)
+
+    def exponer(self):
+        lineas = self.encabezado()
+        nombres_le = self.etiquetas + ("le",)
+        with _candado:
+            series = {valores: (list(conteos), suma) for valores, (conteos, suma) in self.series.items()}
+        for valores, (conteos, suma) in sorted(series.items()):
+            for limite, conteo in zip(self.buckets, conteos):
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres_le, valores + (_numero(limite),))} {conteo}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {conteos[-1]}")
+        return lineas
+
+
+# 👥 SESIONES
+
+_ultimo_rerun_por_sesion = {}
+_bytes_por_sesion = {}
+
+
+def sesiones_activas():
+    """Sesiones conectadas según el Runtime de Streamlit; si no hay Runtime, las que hicieron rerun hace poco."""
+    global _aviso_sesiones
+    from streamlit.runtime import Runtime
+    if Runtime.exists():
+        try:
+            # Atributo interno (ver tests/test_streamlit_interno.py)
+            return Runtime.instance()._session_mgr.num_active_sessions()
+        except AttributeError:
+            if not _aviso_sesiones:
+                _aviso_sesiones = True
+                _logger.warning("Runtime de Streamlit sin _session_mgr; las sesiones se cuentan por reruns recientes")
+    limite = time.time() - VENTANA_SESION_SEGUNDOS
+    with _candado:
+        return sum(1 for t in _ultimo_rerun_por_sesion.values() if t >= limite)
+
+
+lectura_segundos = _Histograma(
+    "lamtec_lectura_segundos", "Duración de la lectura y parseo de archivos por lector.", ("lector",)
+)
+lectura_errores = _Contador(
+    "lamtec_lectura_errores_total", "Lecturas de archivo que terminaron en excepción.", ("lector",)
+)
+cache_hits = _Contador("lamtec_cache_hits_total", "Llamadas a @st.cache_data resueltas desde caché.", ("funcion",))
+cache_misses = _Contador("lamtec_cache_misses_total", "Llamadas a @st.cache_data que tuvieron que calcularse.", ("funcion",))
+dataset_bytes = _Indicador(
+    "lamtec_dataset_bytes", "Memoria de los datasets en session_state, sumada entre sesiones.", ("dataset",)
+)
+sesiones = _Indicador("lamtec_sesiones_activas", "Sesiones de Streamlit activas.", funcion=sesiones_activas)
+rerun_segundos = _Histograma("lamtec_rerun_segundos", "Duración total del rerun por página.", ("pagina",))
+etapa_segundos = _Histograma(
+    "lamtec_etapa_segundos", "Tiempo propio de cada etapa del rerun por página.", ("pagina", "etapa")
+)
+reruns = _Contador("lamtec_reruns_total", "Reruns ejecutados por página.", ("pagina",))
+exportes_procesados = _Contador(
+    "lamtec_exportes_total", "Exportes del ERP procesados por el vigilante de carpeta.", ("tipo", "estado")
+)
+
+METRICAS = [
+    lectura_segundos, lectura_errores, cache_hits, cache_misses, dataset_bytes,
+    sesiones, rerun_segundos, etapa_segundos, reruns, exportes_procesados,
+]
+
+
+def exponer_metricas():
+    """Texto completo en formato de exposición de Prometheus 0.0.4."""
+    lineas = []
+    for metrica in METRICAS:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+# ⏱️ PUNTOS DE MEDICIÓN
+
+def medir_lectura(funcion):
+    """
+    Decorador para los lectores de archivos de utils.py. Va debajo de @st.cache_data,
+    así que solo mide las lecturas reales (los hits de caché no parsean nada).
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        except Exception:
+            lectura_errores.incrementar(funcion.__name__)
+            raise
+        finally:
+            lectura_segundos.observar(funcion.__name__, valor=time.perf_counter() - t0)
+    return envoltura
+
+
+def observar_rerun(perfil, bytes_datasets):
+    """
+    Alimenta las métricas de rerun con el perfil que devuelve perfilador.finalizar_rerun().
+    - perfil: dict del rerun (None si no se abrió).
+    - bytes_datasets: {dataset: bytes} de los datasets en session_state de esta sesión.
+    """
+    if perfil is None:
+        return
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    sesion = ctx.session_id if ctx is not None else None
+
+    pagina = perfil["pagina"]
+    reruns.incrementar(pagina)
+    rerun_segundos.observar(pagina, valor=perfil["total"])
+
+    etapas = {}
+    for registro in perfil["secciones"]:
+        etapas[registro["etapa"]] = etapas.get(registro["etapa"], 0.0) + registro["propio"]
+    for etapa, segundos in etapas.items():
+        etapa_segundos.observar(pagina, etapa, valor=segundos)
+
+    with _candado:
+        _ultimo_rerun_por_sesion[sesion] = time.time()
+        _bytes_por_sesion[sesion] = bytes_datasets
+        # Las sesiones cerradas dejan de sumar memoria
+        limite = time.time() - VENTANA_SESION_SEGUNDOS
+        for vieja in [s for s, t in _ultimo_rerun_por_sesion.items() if t < limite]:
+            _ultimo_rerun_por_sesion.pop(vieja, None)
+            _bytes_por_sesion.pop(vieja, None)
+        totales = {}
+        for por_dataset in _bytes_por_sesion.values():
+            for dataset, n in por_dataset.items():
+                totales[dataset] = totales.get(dataset, 0) + n
+    dataset_bytes.reemplazar({(dataset,): n for dataset, n in totales.items()})
+
+
+# 🌐 SERVIDOR
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        cuerpo = exponer_metricas().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        # Sin una línea en consola por cada scrape
+        pass
+
+
+def iniciar_servidor_metricas(host=HOST_METRICAS, puerto=PUERTO_METRICAS):
+    """
+    Levanta el endpoint en un hilo daemon la primera vez que se llama en el proceso.
+    Si el puerto está ocupado lo reporta y la app sigue sin métricas.
+    """
+    global _servidor
+    with _candado:
+        if _servidor is not None:
+            return _servidor or None
+        try:
+            _servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+        except OSError as e:
+            print(f"No se pudo iniciar el endpoint de métricas en {host}:{puerto}: {e}")
+            _servidor = False
+            return None
+        _servidor.daemon_threads = True
+    threading.Thread(target=_servidor.serve_forever, name="lamtec-metricas", daemon=True).start()
+    return _servidor
+
+
+def raspar(url):
+    """Hace un scrape local del endpoint y devuelve el texto."""
+    with urllib.request.urlopen(url, timeout=5) as respuesta:
+        return respuesta.read().decode("utf-8")
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else f"http://{HOST_METRICAS}:{PUERTO_METRICAS}/metrics"
+    try:
+        print(raspar(url), end="")
+    except OSError as e:
+        print(f"No se pudo leer {url}: {e}", file=sys.stderr)
+        sys.exit(1)
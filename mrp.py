@@ -6,13 +6,25 @@ import datetime
 import seaborn as sns
 import plotly.express as px
 from utils import (
-    leer_mrp_excel
+    guardar_snapshot_mrp,
+    listar_snapshots_mrp,
+    cargar_snapshot_mrp,
+    diff_snapshots_mrp,
+    alertas_snapshot_mrp,
+    tendencia_mrp,
+    boton_descarga_reporte,
+    indice_facetas,
+    filas_facetas,
+    opciones_faceta
 )
+from perfilador import seccion, anotar_accion
+from kpis import items_por_tipo, cambios_requerimiento, deltas_mrp
 
 def mrp_app():
     st.header("📉 Análisis Reportes MRP")
-    menumrp = ["Importar Reportes", "Comparativo"]
+    menumrp = ["Importar Reportes", "Comparativo", "Tendencia"]
     option = st.sidebar.selectbox("Acciones:", menumrp)
+    anotar_accion(option)
 
     if option == "Importar Reportes":
         importar_reportes_mrp()
@@ -20,115 +32,95 @@ def mrp_app():
     elif option == "Comparativo":
         comparativo_mrp()
 
+    elif option == "Tendencia":
+        tendencia_items_mrp()
+
 def importar_reportes_mrp():
-    st.subheader("📥 Primer archivo MRP")
-    uploaded_file_1 = st.file_uploader("📄 Cargar primer archivo Excel MRP", type=["xlsx"], key="mrp1")
+    st.subheader("📥 Cargar ejecuciones MRP")
+    fecha_ejecucion = st.date_input("📅 Fecha de ejecución del MRP", value=datetime.date.today())
+    archivos = st.file_uploader(
+        "📄 Cargar archivos Excel MRP", type=["xlsx"], accept_multiple_files=True, key="mrp_archivos"
+    )
 
-    if uploaded_file_1 is not None and "df_po_1" not in st.session_state:
-        with st.spinner("Procesando primer archivo..."):
+    # Solo se procesan archivos cuyo contenido no esté ya en el historial
+    procesados = st.session_state.setdefault("mrp_archivos_procesados", set())
+    for archivo in archivos or []:
+        if archivo.file_id in procesados:
+            continue
+        with st.spinner(f"Procesando {archivo.name}..."):
             try:
-                df_po_1, df_sin_req_1 = leer_mrp_excel(uploaded_file_1)
-                st.session_state["df_po_1"] = df_po_1
-                st.session_state["df_sin_req_1"] = df_sin_req_1
-                st.success(f"✅ Primer archivo procesado ({len(df_po_1)} POs y {len(df_sin_req_1)} sin requerimiento)")
+                with seccion(f"Snapshot {archivo.name}", "carga"):
+                    clave, nuevo = guardar_snapshot_mrp(archivo, datetime.datetime.combine(
+                        fecha_ejecucion, datetime.datetime.now().time()))
+                procesados.add(archivo.file_id)
+                if nuevo:
+                    st.success(f"✅ {archivo.name} guardado como snapshot `{clave}`")
+                else:
+                    st.info(f"ℹ️ {archivo.name} ya estaba en el historial (`{clave}`)")
             except Exception as e:
-                st.error(f"❌ Error procesando primer archivo: {e}")
-                return
+                st.error(f"❌ Error procesando {archivo.name}: {e}")
 
-    if "df_po_1" in st.session_state:
-        if st.checkbox("📑 Mostrar datos del primer archivo"):
-            st.subheader("Órdenes de Compra (PO) - Primer archivo")
-            st.dataframe(st.session_state["df_po_1"])
+    # 🗂️ Historial de snapshots
+    df_indice = listar_snapshots_mrp()
+    st.subheader("🗂️ Historial de ejecuciones MRP")
 
-            st.subheader("Items sin Requerimiento - Primer archivo")
-            st.dataframe(st.session_state["df_sin_req_1"])
+    if df_indice.empty:
+        st.info("Aún no hay ejecuciones MRP guardadas.")
+        return
 
-    # Segundo archivo
-    st.subheader("📥 Segundo archivo MRP")
-    uploaded_file_2 = st.file_uploader("📄 Cargar segundo archivo Excel MRP", type=["xlsx"], key="mrp2")
+    st.dataframe(df_indice.drop(columns=["Hash"]), use_container_width=True)
 
-    if uploaded_file_2 is not None and "df_po_2" not in st.session_state:
-        with st.spinner("Procesando segundo archivo..."):
-            try:
-                df_po_2, df_sin_req_2 = leer_mrp_excel(uploaded_file_2)
-                st.session_state["df_po_2"] = df_po_2
-                st.session_state["df_sin_req_2"] = df_sin_req_2
-                st.success(f"✅ Segundo archivo procesado ({len(df_po_2)} POs y {len(df_sin_req_2)} sin requerimiento)")
-            except Exception as e:
-                st.error(f"❌ Error procesando segundo archivo: {e}")
-                return
+    clave_sel = st.selectbox("📑 Ver datos del snapshot", options=df_indice["Clave"][::-1])
+    if st.checkbox("📑 Mostrar datos del snapshot seleccionado"):
+        df_po, df_sin_req = cargar_snapshot_mrp(clave_sel)
+        st.subheader("Órdenes de Compra (PO)")
+        st.dataframe(df_po)
 
-    if "df_po_2" in st.session_state:
-        if st.checkbox("📑 Mostrar datos del segundo archivo"):
-            st.subheader("Órdenes de Compra (PO) - Segundo archivo")
-            st.dataframe(st.session_state["df_po_2"])
+        st.subheader("Items sin Requerimiento")
+        st.dataframe(df_sin_req)
 
-            st.subheader("Items sin Requerimiento - Segundo archivo")
-            st.dataframe(st.session_state["df_sin_req_2"])
+def seleccionar_snapshots_mrp():
+    """Selectores de snapshot Antes/Después en el sidebar. Por defecto, las dos últimas ejecuciones."""
+    df_indice = listar_snapshots_mrp()
+    if len(df_indice) < 2:
+        return None, None
+
+    claves = df_indice["Clave"].tolist()
+    etiquetas = dict(zip(claves, df_indice["Fecha"].dt.strftime("%d/%m/%Y %H:%M") + " · " + df_indice["Archivo"]))
+
+    st.sidebar.subheader("🗂️ Snapshots a comparar")
+    clave_antes = st.sidebar.selectbox(
+        "Antes:", options=claves, index=len(claves) - 2, format_func=etiquetas.get
+    )
+    clave_despues = st.sidebar.selectbox(
+        "Después:", options=claves, index=len(claves) - 1, format_func=etiquetas.get
+    )
+    return clave_antes, clave_despues
 
 def comparativo_mrp():
     st.subheader("📊 Cantidad de Items por Tipo")
 
-    if "df_po_1" not in st.session_state or "df_po_2" not in st.session_state:
-        st.warning("⚠️ Carga primero ambos reportes MRP para comparar.")
+    clave_antes, clave_despues = seleccionar_snapshots_mrp()
+    if clave_antes is None:
+        st.warning("⚠️ Carga primero al menos dos reportes MRP para comparar.")
         return
 
-    df_po_1 = st.session_state["df_po_1"].copy()
-    df_po_2 = st.session_state["df_po_2"].copy()
-
-    df_sin_req_1 = st.session_state["df_sin_req_1"].copy()
-    df_sin_req_2 = st.session_state["df_sin_req_2"].copy()
-
-    # Crear columna Vendor Limpio en ambos archivos
-    def extraer_vendor(vendor_string):
-        if pd.isna(vendor_string):
-            return "Sin Vendor"
-        vendor_string = str(vendor_string)
-        if "Vendor" in vendor_string and "P/O" in vendor_string:
-            return vendor_string.split("Vendor")[1].split("P/O")[0].strip(", ").strip()
-        elif "Vendor" in vendor_string:
-            return vendor_string.split("Vendor")[1].strip(", ").strip()
-        else:
-            return "Sin Vendor"
-
-    # Crear columna PO_Numero en ambos archivos
-    def extraer_po_num(vendor_string):
-        if pd.isna(vendor_string):
-            return "Sin P/O"
-        vendor_string = str(vendor_string)
-        if "P/O #" in vendor_string:
-            try:
-                return vendor_string.split("P/O #")[1].split(",")[0].strip()
-            except:
-                return "Sin P/O"
-        else:
-            return "Sin P/O"
-
-    df_po_1["PO_Numero"] = df_po_1["Proveedor_PO"].apply(extraer_po_num)
-    df_po_2["PO_Numero"] = df_po_2["Proveedor_PO"].apply(extraer_po_num)
+    with seccion("Lectura snapshots", "carga") as s:
+        df_po_1, df_sin_req_1 = s.carga(cargar_snapshot_mrp(clave_antes))
+        df_po_2, df_sin_req_2 = s.carga(cargar_snapshot_mrp(clave_despues))
 
-    df_po_1["Vendor Limpio"] = df_po_1["Proveedor_PO"].apply(extraer_vendor)
-    df_po_2["Vendor Limpio"] = df_po_2["Proveedor_PO"].apply(extraer_vendor)
+    # Items por Type en cada snapshot (misma función que el modo batch de kpis.py)
+    with seccion("Items por Type", "agregación"):
+        total_1 = items_por_tipo(df_po_1, df_sin_req_1)
+        total_2 = items_por_tipo(df_po_2, df_sin_req_2)
 
     col_a, col_b = st.columns(2)
 
     with col_a:
-        # Resumen Archivo 1
-        resumen_1 = df_po_1.groupby("Type")["Item"].nunique().reset_index(name="Cantidad")
-        resumen_1_sin_po = df_sin_req_1.groupby("Type")["Item"].nunique().reset_index(name="Cantidad")
         st.markdown("**📄 Pre-ejecición MPR**")
-        total_1 = pd.concat([resumen_1, resumen_1_sin_po], ignore_index=True)
-        total_1 = total_1.groupby("Type")["Cantidad"].sum().reset_index()
-
         st.dataframe(total_1, use_container_width=True)
     with col_b:
-        # Resumen Archivo 2
-        resumen_2 = df_po_2.groupby("Type")["Item"].nunique().reset_index(name="Cantidad")
-        resumen_2_sin_po = df_sin_req_2.groupby("Type")["Item"].nunique().reset_index(name="Cantidad")
         st.markdown("**📄 Post-Ejecución MRP**")
-        total_2 = pd.concat([resumen_2, resumen_2_sin_po], ignore_index=True)
-        total_2 = total_2.groupby("Type")["Cantidad"].sum().reset_index()
-
         st.dataframe(total_2, use_container_width=True)
 
 #    # Resumen Total Combinado (para referencia)
@@ -142,19 +134,8 @@ def comparativo_mrp():
     # 📋 Comparativa de Items con PO entre archivos
     st.subheader("📌 Cambios en Reuqerimiento")
 
-    # Items con PO en cada archivo
-    items_po_1 = set(df_sin_req_1["Item"].unique())
-    items_po_2 = set(df_sin_req_2["Item"].unique())
-
-    # Items que tenían PO en archivo 1 pero ya no en archivo 2
-    items_po_solo_en_1 = sorted(items_po_2 - items_po_1)
-
-    # Items que tienen PO en archivo 2 pero no en archivo 1
-    items_po_solo_en_2 = sorted(items_po_1 - items_po_2)
-
-    # Convertir a DataFrames
-    df_items_po_solo_1 = pd.DataFrame(items_po_solo_en_1, columns=["Item"])
-    df_items_po_solo_2 = pd.DataFrame(items_po_solo_en_2, columns=["Item"])
+    # Items que dejaron de tener requerimiento y los que empezaron a tenerlo
+    df_items_po_solo_1, df_items_po_solo_2 = cambios_requerimiento(df_sin_req_1, df_sin_req_2)
 
     # Mostrar en columnas
     col1, col2 = st.columns(2)
@@ -169,15 +150,15 @@ def comparativo_mrp():
         st.dataframe(df_items_po_solo_2, use_container_width=True)
         #st.metric("Total", len(df_items_po_solo_2))
 
-    # 📌 Calcular días de atraso en Archivo 2
-    hoy = pd.to_datetime(datetime.date.today())
-    df_po_2["Fecha Llegada"] = pd.to_datetime(df_po_2["Fecha Llegada"], errors='coerce')
-    df_po_2["Días de Atraso"] = (hoy - df_po_2["Fecha Llegada"]).dt.days
+    # 📌 Alertas de entrega precalculadas para el snapshot Después
+    with seccion("Alertas de entrega", "agregación"):
+        df_alertas, resumen_alertas = alertas_snapshot_mrp(clave_despues, pd.Timestamp(datetime.date.today()))
 
     # Filtrar items con P/O y más de 30 días de atraso
-    items_mas_30_dias = df_po_2[
-        (df_po_2["PO_Numero"] != "Sin P/O") & (df_po_2["Días de Atraso"] > 30)
-        ]
+    items_mas_30_dias = df_alertas[
+        (df_alertas["Estado Entrega"] == "Atrasada >30 días")
+        & (df_alertas.index.get_level_values("PO_Numero") != "Sin P/O")
+    ].reset_index()
 
     # Mostrar resumen
     st.subheader("📛 Items con Requerimiento y Más de 30 Días de Atraso")
@@ -197,78 +178,67 @@ def comparativo_mrp():
     col3, col4 = st.columns(2)
 
     with col3:
-        if "df_sin_req_1" in st.session_state:
-            total_items_1 = st.session_state["df_sin_req_1"]["Item"].nunique()
-            st.markdown(f"**📄 Antes — Total de items sin requerimiento: `{total_items_1}`**")
-            st.dataframe(
-                st.session_state["df_sin_req_1"][["Item", "Vendor"]],
-                use_container_width=True
-            )
-        else:
-            st.info("No se ha cargado el Archivo 1.")
+        total_items_1 = df_sin_req_1["Item"].nunique()
+        st.markdown(f"**📄 Antes — Total de items sin requerimiento: `{total_items_1}`**")
+        st.dataframe(
+            df_sin_req_1[["Item", "Vendor"]],
+            use_container_width=True
+        )
 
     with col4:
-        if "df_sin_req_2" in st.session_state:
-            total_items_2 = st.session_state["df_sin_req_2"]["Item"].nunique()
-            st.markdown(f"**📄 Después — Total de items sin requerimiento: `{total_items_2}`**")
-            st.dataframe(
-                st.session_state["df_sin_req_2"][["Item", "Vendor"]],
-                use_container_width=True
-            )
-        else:
-            st.info("No se ha cargado el Archivo 2.")
+        total_items_2 = df_sin_req_2["Item"].nunique()
+        st.markdown(f"**📄 Después — Total de items sin requerimiento: `{total_items_2}`**")
+        st.dataframe(
+            df_sin_req_2[["Item", "Vendor"]],
+            use_container_width=True
+        )
 
     st.subheader("📈 Gráfica: Items sin Requerimiento por Vendor")
 
-    # Validar que existan datos en ambos dataframes
-    if "df_sin_req_1" in st.session_state and "df_sin_req_2" in st.session_state:
-        df_sin_req_1 = st.session_state["df_sin_req_1"].copy()
-        df_sin_req_2 = st.session_state["df_sin_req_2"].copy()
-
-        # Agrupar por Vendor
-        df_vendor_1 = df_sin_req_1.groupby("Vendor")["Item"].nunique().reset_index(name="Total")
-        df_vendor_1["Archivo"] = "Antes"
+    # Agrupar por Vendor
+    df_vendor_1 = df_sin_req_1.groupby("Vendor", observed=True)["Item"].nunique().reset_index(name="Total")
+    df_vendor_1["Archivo"] = "Antes"
 
-        df_vendor_2 = df_sin_req_2.groupby("Vendor")["Item"].nunique().reset_index(name="Total")
-        df_vendor_2["Archivo"] = "Después"
+    df_vendor_2 = df_sin_req_2.groupby("Vendor", observed=True)["Item"].nunique().reset_index(name="Total")
+    df_vendor_2["Archivo"] = "Después"
 
-        df_vendor_total = pd.concat([df_vendor_1, df_vendor_2])
+    df_vendor_total = pd.concat([df_vendor_1, df_vendor_2])
 
-        if not df_vendor_total.empty:
-            fig = px.bar(
-                df_vendor_total,
-                x="Vendor",
-                y="Total",
-                color="Archivo",
-                barmode="group",
-                title="Items sin Requerimiento por Vendor",
-                height=500
-            )
-            fig.update_layout(xaxis_title="Vendor", yaxis_title="Total de Items")
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No hay datos de Items sin Requerimiento para graficar.")
+    if not df_vendor_total.empty:
+        fig = px.bar(
+            df_vendor_total,
+            x="Vendor",
+            y="Total",
+            color="Archivo",
+            barmode="group",
+            title="Items sin Requerimiento por Vendor",
+            height=500
+        )
+        fig.update_layout(xaxis_title="Vendor", yaxis_title="Total de Items")
+        st.plotly_chart(fig, use_container_width=True)
     else:
-        st.warning("⚠️ Carga ambos archivos para visualizar esta gráfica.")
+        st.info("No hay datos de Items sin Requerimiento para graficar.")
+
+    # 📌 Diff precalculado entre ambos snapshots
+    with seccion("Diff entre snapshots", "agregación") as s:
+        diff_mrp = s.carga(diff_snapshots_mrp(clave_antes, clave_despues))
 
     # 📌 Filtros en sidebar
     st.sidebar.subheader("🔍 Filtros para comparativo")
 
+    # Índice de facetas Type → Vendor → P/O → Item, una vez por par de snapshots
+    with seccion("Índice de facetas", "filtro"):
+        indice = indice_facetas(
+            (clave_antes, clave_despues), ("Type", "Vendor Limpio", "PO_Numero", "Item"), diff_mrp.index.to_frame(index=False)
+        )
+
     # Filtro de Type
-    tipos_disponibles = sorted(set(df_po_1["Type"].unique()).union(df_po_2["Type"].unique()))
+    tipos_disponibles = indice["valores"]["Type"].tolist()
     tipo_seleccionado = st.sidebar.selectbox("Selecciona Type:", options=["Todos"] + tipos_disponibles)
 
     # Vendor dinámico según Type seleccionado
-    if tipo_seleccionado != "Todos":
-        vendors_disponibles = sorted(
-            set(df_po_1[df_po_1["Type"] == tipo_seleccionado]["Vendor Limpio"].unique()).union(
-                df_po_2[df_po_2["Type"] == tipo_seleccionado]["Vendor Limpio"].unique()
-            )
-        )
-    else:
-        vendors_disponibles = sorted(
-            set(df_po_1["Vendor Limpio"].unique()).union(df_po_2["Vendor Limpio"].unique())
-        )
+    seleccion = {"Type": [tipo_seleccionado] if tipo_seleccionado != "Todos" else None}
+    vendors_disponibles = opciones_faceta(indice, "Vendor Limpio", filas_facetas(indice, seleccion))
 
     vendor_seleccionado = st.sidebar.selectbox("Selecciona Vendor:", options=["Todos"] + vendors_disponibles)
 
@@ -278,36 +248,26 @@ def comparativo_mrp():
             "⚠️ Selecciona un **Type** y un **Vendor** en los filtros del sidebar para habilitar el comparativo.")
         return
 
-    # Filtrar datos según Type y Vendor
-    df_po_1_filtrado = df_po_1[
-        (df_po_1["Type"] == tipo_seleccionado) & (df_po_1["Vendor Limpio"] == vendor_seleccionado)
-    ]
-    df_po_2_filtrado = df_po_2[
-        (df_po_2["Type"] == tipo_seleccionado) & (df_po_2["Vendor Limpio"] == vendor_seleccionado)
-    ]
-
     # Filtro dinámico de P/O según Vendor y Type seleccionado
-    po_disponibles = sorted(set(df_po_1_filtrado["PO_Numero"].unique()).union(df_po_2_filtrado["PO_Numero"].unique()))
+    seleccion["Vendor Limpio"] = [vendor_seleccionado]
+    po_disponibles = opciones_faceta(indice, "PO_Numero", filas_facetas(indice, seleccion))
 
     po_seleccionado = st.sidebar.selectbox("Selecciona P/O #:", options=["Todos"] + po_disponibles)
 
     # Solo aplicar filtro si se selecciona una P/O específica
     if po_seleccionado != "Todos":
-        df_po_1_filtrado = df_po_1_filtrado[df_po_1_filtrado["PO_Numero"] == po_seleccionado]
-        df_po_2_filtrado = df_po_2_filtrado[df_po_2_filtrado["PO_Numero"] == po_seleccionado]
+        seleccion["PO_Numero"] = [po_seleccionado]
 
-    # Filtro dinámico de Items según Vendor seleccionado
-    items_disponibles = sorted(set(df_po_1_filtrado["Item"].unique()).union(df_po_2_filtrado["Item"].unique()))
+    # Filtro dinámico de Items según P/O seleccionada
+    filas = filas_facetas(indice, seleccion)
+    items_disponibles = opciones_faceta(indice, "Item", filas)
 
     items_seleccionados = st.sidebar.multiselect(
         "Selecciona Items:", options=items_disponibles, default=items_disponibles
     )
 
-    fechas_1 = pd.to_datetime(df_po_1["Fecha Llegada"], errors='coerce')
-    fechas_2 = pd.to_datetime(df_po_2["Fecha Llegada"], errors='coerce')
-
-    fecha_min = min(fechas_1.min(), fechas_2.min())
-    fecha_max = max(fechas_1.max(), fechas_2.max())
+    fecha_min = diff_mrp["Fecha Llegada"].min()
+    fecha_max = diff_mrp["Fecha Llegada"].max()
 
     rango_fechas = st.sidebar.date_input(
         "Rango de Fechas:",
@@ -316,32 +276,25 @@ def comparativo_mrp():
         max_value=fecha_max
     )
 
-    # Comparativa agrupada
-    comparativo_df_1 = df_po_1_filtrado.groupby(["Item", "Fecha Llegada"])["Cantidad"].sum().reset_index()
-    comparativo_df_1.rename(columns={"Cantidad": "Cantidad Antes"}, inplace=True)
-
-    comparativo_df_2 = df_po_2_filtrado.groupby(["Item", "Fecha Llegada"])["Cantidad"].sum().reset_index()
-    comparativo_df_2.rename(columns={"Cantidad": "Cantidad Después"}, inplace=True)
-
-    comparativo_final = pd.merge(
-        comparativo_df_1, comparativo_df_2,
-        on=["Item", "Fecha Llegada"], how="outer"
-    ).fillna(0)
-
-    comparativo_final["Fecha Llegada"] = pd.to_datetime(comparativo_final["Fecha Llegada"], errors='coerce')
-    comparativo_final["Diferencia"] = comparativo_final["Cantidad Después"] - comparativo_final["Cantidad Antes"]
-
-    # Aplicar filtros de Item
-    comparativo_final = comparativo_final[comparativo_final["Item"].isin(items_seleccionados)]
+    # Aplicar filtros (intersección de filas del índice de facetas)
+    seleccion["Item"] = items_seleccionados
+    with seccion("Filtro comparativo", "filtro") as s:
+        filas = filas_facetas(indice, seleccion) if items_seleccionados else []
+        diff_filtrado = diff_mrp.iloc[filas].reset_index()
+
+        # Validar que el usuario haya seleccionado ambas fechas antes de filtrar por rango
+        if isinstance(rango_fechas, tuple) and len(rango_fechas) == 2:
+            fecha_inicio, fecha_fin = pd.to_datetime(rango_fechas[0]), pd.to_datetime(rango_fechas[1])
+            diff_filtrado = diff_filtrado[
+                (diff_filtrado["Fecha Llegada"] >= fecha_inicio) & (diff_filtrado["Fecha Llegada"] <= fecha_fin)
+                ]
+        else:
+            st.info("Selecciona ambas fechas para aplicar el filtro de rango.")
+        s.carga(diff_filtrado)
 
-    # Validar que el usuario haya seleccionado ambas fechas antes de filtrar por rango
-    if isinstance(rango_fechas, tuple) and len(rango_fechas) == 2:
-        fecha_inicio, fecha_fin = pd.to_datetime(rango_fechas[0]), pd.to_datetime(rango_fechas[1])
-        comparativo_final = comparativo_final[
-            (comparativo_final["Fecha Llegada"] >= fecha_inicio) & (comparativo_final["Fecha Llegada"] <= fecha_fin)
-            ]
-    else:
-        st.info("Selecciona ambas fechas para aplicar el filtro de rango.")
+    # Comparativa agrupada por Item y Fecha
+    with seccion("Comparativo por Item y Fecha", "agregación"):
+        comparativo_final = deltas_mrp(diff_filtrado)
 
     if comparativo_final.empty:
         st.info("No hay datos para mostrar con los filtros seleccionados.")
@@ -370,31 +323,45 @@ def comparativo_mrp():
 
     if st.checkbox("Mostrar Tabla Comparativa"):
         st.subheader("📑 Tabla Comparativa de Requerimientos Filtrada")
-        st.dataframe(comparativo_final)
+        st.dataframe(diff_filtrado.drop(columns=["En Antes", "En Después"]))
+
+    st.subheader("⬇️ Exportar Comparativo")
+    boton_descarga_reporte(
+        {"Comparativo": diff_mrp, "Filtrado": diff_filtrado, "Por Item y Fecha": comparativo_final},
+        "comparativo_mrp",
+        key="descarga_comparativo_mrp",
+        firma=(clave_antes, clave_despues, tipo_seleccionado, vendor_seleccionado, po_seleccionado,
+               tuple(items_seleccionados), tuple(rango_fechas))
+    )
 
-    # Obtener fecha actual
-    hoy = pd.to_datetime(datetime.date.today())
+    # 📌 Alertas del archivo 2 para el Type / Vendor / P/O seleccionados
+    llave_alertas = (tipo_seleccionado, vendor_seleccionado)
+    if po_seleccionado != "Todos":
+        llave_alertas += (po_seleccionado,)
 
-    # Calcular días restantes y días de atraso sobre el archivo 2 filtrado
-    df_po_2_filtrado["Fecha Llegada"] = pd.to_datetime(df_po_2_filtrado["Fecha Llegada"], errors='coerce')
-    df_po_2_filtrado["Días Restantes"] = (df_po_2_filtrado["Fecha Llegada"] - hoy).dt.days
+    if llave_alertas in resumen_alertas.index:
+        niveles = list(range(len(llave_alertas)))
+        conteo_alertas = resumen_alertas.xs(llave_alertas, level=niveles, drop_level=False).sum()
+        alertas_filtradas = df_alertas.xs(llave_alertas, level=niveles, drop_level=False)
+    else:
+        # La combinación solo existe en el snapshot Antes
+        conteo_alertas = pd.Series(0, index=resumen_alertas.columns)
+        alertas_filtradas = df_alertas.iloc[0:0]
 
-    # Filtrar items próximos a entregar en 7 días
-    proximos_7_dias = df_po_2_filtrado[
-        (df_po_2_filtrado["Días Restantes"] >= 0) & (df_po_2_filtrado["Días Restantes"] <= 7)
-        ]
+    # Items próximos a entregar en 7 días
+    proximos_7_dias = alertas_filtradas[alertas_filtradas["Estado Entrega"] == "Próxima (7 días)"].copy()
+    proximos_7_dias["Días Restantes"] = -proximos_7_dias["Días de Atraso"]
 
-    # Filtrar items atrasados
-    atrasados = df_po_2_filtrado[df_po_2_filtrado["Días Restantes"] < 0].copy()
-    atrasados["Días de Atraso"] = atrasados["Días Restantes"].abs()
+    # Items atrasados
+    atrasados = alertas_filtradas[alertas_filtradas["Estado Entrega"].isin(["Atrasada >30 días", "Atrasada"])]
 
     # 📊 Mostrar resumen de alertas
     st.subheader("🚨 Alertas de Entregas")
 
     # Métricas resumen
     col1, col2 = st.columns(2)
-    col1.metric("Próximos a entregar (7 días)", len(proximos_7_dias))
-    col2.metric("Items Atrasados", len(atrasados))
+    col1.metric("Próximos a entregar (7 días)", int(conteo_alertas["Próxima (7 días)"]))
+    col2.metric("Items Atrasados", int(conteo_alertas["Atrasada >30 días"] + conteo_alertas["Atrasada"]))
 
     # Mostrar tabla de próximos
     if not proximos_7_dias.empty:
@@ -412,4 +379,51 @@ def comparativo_mrp():
             atrasados[["Item", "Fecha Llegada", "Días de Atraso", "Cantidad"]]
         )
     else:
-        st.success("✅ No hay entregas atrasadas.")
\ No newline at end of file
+        st.success("✅ No hay entregas atrasadas.")
+
+def tendencia_items_mrp():
+    st.subheader("📈 Tendencia de Requerimientos por Item")
+
+    df_indice = listar_snapshots_mrp()
+    if df_indice.empty:
+        st.warning("⚠️ Carga primero reportes MRP para ver su tendencia.")
+        return
+    if len(df_indice) < 2:
+        st.info("ℹ️ La tendencia necesita al menos dos ejecuciones MRP guardadas; carga otra para compararlas.")
+        return
+
+    ultimas = st.sidebar.slider(
+        "Últimas ejecuciones:", min_value=1, max_value=len(df_indice), value=min(30, len(df_indice))
+    )
+    claves = df_indice["Clave"].tail(ultimas).tolist()
+
+    with seccion("Tendencia MRP", "agregación") as s:
+        tendencia = s.carga(tendencia_mrp(claves))
+    items_disponibles = sorted(tendencia["Item"].dropna().unique())
+    items_seleccionados = st.multiselect("Selecciona Item(s):", options=items_disponibles, max_selections=10)
+
+    if not items_seleccionados:
+        st.info("Selecciona al menos un item para ver su evolución.")
+        return
+
+    tendencia_items = tendencia[tendencia["Item"].isin(items_seleccionados)]
+
+    fig = px.line(
+        tendencia_items,
+        x="Fecha",
+        y="Cantidad",
+        color="Item",
+        markers=True,
+        hover_data=["Lineas_PO", "Proxima_Llegada"],
+        title=f"Requerimiento total en las últimas {ultimas} ejecuciones MRP",
+        labels={"Fecha": "Ejecución MRP", "Cantidad": "Cantidad requerida"},
+        height=500
+    )
+    fig.update_layout(hovermode="x unified")
+    st.plotly_chart(fig, use_container_width=True)
+
+    if st.checkbox("Mostrar tabla de tendencia"):
+        st.dataframe(
+            tendencia_items.pivot_table(index="Item", columns="Fecha", values="Cantidad", aggfunc="sum", observed=True),
+            use_container_width=True
+        )
@@ -0,0 +1,388 @@
+# perfilador.py
+"""
+Instrumentación de reruns de Streamlit.
+
+Cada rerun se divide en secciones con nombre y etapa (carga, filtro, agregación,
+figura, render). Las secciones se registran en session_state y un panel de
+administrador en el sidebar muestra el desglose de los últimos reruns, con la
+opción de capturar un cProfile completo de un solo rerun.
+
+Las llamadas a Plotly Express y los elementos st.plotly_chart / st.dataframe /
+st.table se instrumentan de forma global con instrumentar_streamlit(), así que
+las páginas solo marcan explícitamente carga, filtros y agregaciones.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+from streamlit.runtime.caching.cache_utils import CachedFunc
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import metricas
+
+# Sin contraseña configurada el panel no se muestra
+ADMIN_PASSWORD = os.environ.get("LAMTEC_ADMIN_PASSWORD", "")
+
+ETAPAS = ["carga", "filtro", "agregación", "figura", "render"]
+MAX_PERFILES = 20
+MAX_FUNCIONES_CPROFILE = 40
+
+FUNCIONES_FIGURA = [
+    "bar", "line", "scatter", "area", "pie", "histogram", "box", "imshow",
+    "treemap", "sunburst", "timeline", "density_heatmap",
+]
+ELEMENTOS_RENDER = ["plotly_chart", "dataframe", "data_editor", "table", "altair_chart", "pyplot"]
+
+
+# 🧭 ESTADO DEL RERUN
+
+def _en_streamlit():
+    """True si hay un script de Streamlit corriendo (no en benchmark.py ni en scripts sueltos)."""
+    return get_script_run_ctx() is not None
+
+
+def _perfil_actual():
+    if not _en_streamlit():
+        return None
+    return st.session_state.get("_perfil_actual")
+
+
+def perfilador_activo():
+    """El tamaño de los payloads solo se mide con la sesión de administrador abierta."""
+    return _en_streamlit() and st.session_state.get("perfilador_admin", False)
+
+
+def iniciar_rerun(pagina):
+    """
+    Abre el registro del rerun. Si se pidió una captura cProfile, la arranca aquí.
+    - pagina: opción del menú principal que se va a ejecutar.
+    """
+    perfil = {
+        "pagina": pagina,
+        "inicio": pd.Timestamp.now(),
+        "t0": time.perf_counter(),
+        "accion": None,
+        "secciones": [],
+        "pila": [],
+        "cache": {},
+        "profiler": None,
+        "cprofile": None,
+    }
+    if st.session_state.pop("perfilador_cprofile_pendiente", False):
+        perfil["profiler"] = cProfile.Profile()
+        perfil["profiler"].enable()
+    st.session_state["_perfil_actual"] = perfil
+    return perfil
+
+
+def anotar_accion(accion):
+    """Registra la opción del submenú (Acciones:) elegida dentro de la página."""
+    perfil = _perfil_actual()
+    if perfil is not None:
+        perfil["accion"] = accion
+
+
+def finalizar_rerun():
+    """Cierra el registro del rerun y lo agrega al historial. Seguro de llamar en un finally."""
+    perfil = st.session_state.pop("_perfil_actual", None)
+    if perfil is None:
+        return None
+
+    total = time.perf_counter() - perfil.pop("t0")
+    profiler = perfil.pop("profiler")
+    perfil.pop("pila")
+    if profiler is not None:
+        profiler.disable()
+        salida = io.StringIO()
+        pstats.Stats(profiler, stream=salida).sort_stats("cumulative").print_stats(MAX_FUNCIONES_CPROFILE)
+        perfil["cprofile"] = salida.getvalue()
+
+    for registro in perfil["secciones"]:
+        cargas = registro.pop("cargas")
+        if cargas:
+            registro["bytes"] = tamano_carga(cargas)
+
+    perfil["total"] = total
+    historial = st.session_state.setdefault("_perfiles", deque(maxlen=MAX_PERFILES))
+    historial.append(perfil)
+    return perfil
+
+
+# ⏱️ SECCIONES
+
+class _Seccion:
+    """Registro de una sección en curso. `carga()` anota el tamaño del resultado."""
+
+    __slots__ = ("registro",)
+
+    def __init__(self, registro):
+        self.registro = registro
+
+    def carga(self, objeto):
+        if self.registro is None:
+            return objeto
+        filas = contar_filas(objeto)
+        if filas is not None:
+            self.registro["filas"] = (self.registro["filas"] or 0) + filas
+        # El tamaño se calcula en finalizar_rerun() para no sumarlo al tiempo de la sección
+        if perfilador_activo():
+            self.registro["cargas"].append(objeto)
+        return objeto
+
+
+@contextmanager
+def seccion(nombre, etapa):
+    """
+    Mide el tiempo de un bloque dentro del rerun actual.
+    Las secciones anidadas descuentan su tiempo de la sección padre (tiempo propio).
+    - nombre: texto que aparece en el panel.
+    - etapa: una de ETAPAS.
+    """
+    perfil = _perfil_actual()
+    if perfil is None:
+        yield _Seccion(None)
+        return
+
+    pila = perfil["pila"]
+    registro = {
+        "nombre": nombre,
+        "etapa": etapa,
+        "nivel": len(pila),
+        "segundos": 0.0,
+        "propio": 0.0,
+        "filas": None,
+        "bytes": None,
+        "cargas": [],
+    }
+    perfil["secciones"].append(registro)
+    pila.append(registro)
+    t0 = time.perf_counter()
+    try:
+        yield _Seccion(registro)
+    finally:
+        duracion = time.perf_counter() - t0
+        pila.pop()
+        registro["segundos"] = duracion
+        registro["propio"] += duracion
+        if pila:
+            pila[-1]["propio"] -= duracion
+
+
+def contar_filas(objeto):
+    """Filas de los DataFrames/Series en el objeto (o en una tupla de resultados). None si no hay."""
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        return len(objeto)
+    if isinstance(objeto, (tuple, list)):
+        filas = [f for f in (contar_filas(o) for o in objeto) if f is not None]
+        return sum(filas) if filas else None
+    return None
+
+
+def tamano_carga(objeto):
+    """Tamaño aproximado en bytes de lo que se manda al navegador o se guarda en memoria."""
+    if objeto is None:
+        return 0
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        return int(objeto.memory_usage(deep=True).sum()) if isinstance(objeto, pd.DataFrame) \
+            else int(objeto.memory_usage(deep=True))
+    if isinstance(objeto, (bytes, bytearray)):
+        return len(objeto)
+    if isinstance(objeto, (tuple, list)):
+        return sum(tamano_carga(o) for o in objeto)
+    if isinstance(objeto, dict):
+        return sum(tamano_carga(o) for o in objeto.values())
+    if hasattr(objeto, "to_json"):
+        # Figuras de Plotly: aproxima lo que Streamlit serializa al navegador
+        try:
+            return len(objeto.to_json())
+        except Exception:
+            return 0
+    if hasattr(objeto, "nbytes"):
+        return int(objeto.nbytes)
+    return 0
+
+
+# 🎨 INSTRUMENTACIÓN GLOBAL DE FIGURAS Y RENDER
+
+def _instrumentar(funcion, nombre, etapa, argumento_carga):
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        with seccion(nombre, etapa) as s:
+            resultado = funcion(*args, **kwargs)
+            if argumento_carga is None:
+                s.carga(resultado)
+            elif len(args) > argumento_carga:
+                s.carga(args[argumento_carga])
+        return resultado
+    envoltura._perfilador = True
+    return envoltura
+
+
+def _contador_cache(funcion):
+    """Cuenta hits y misses de @st.cache_data por función; en un miss mide también el cómputo."""
+    perfil = _perfil_actual()
+    if perfil is None:
+        return None
+    return perfil["cache"].setdefault(funcion.__qualname__, {"hits": 0, "misses": 0, "segundos_miss": 0.0})
+
+
+def _instrumentar_cache():
+    hit_original = CachedFunc._handle_cache_hit
+    miss_original = CachedFunc._handle_cache_miss
+    if getattr(miss_original, "_perfilador", False):
+        return
+
+    @functools.wraps(hit_original)
+    def hit(self, *args, **kwargs):
+        metricas.cache_hits.incrementar(self._info.func.__qualname__)
+        contador = _contador_cache(self._info.func)
+        if contador is not None:
+            contador["hits"] += 1
+        return hit_original(self, *args, **kwargs)
+
+    @functools.wraps(miss_original)
+    def miss(self, *args, **kwargs):
+        metricas.cache_misses.incrementar(self._info.func.__qualname__)
+        contador = _contador_cache(self._info.func)
+        t0 = time.perf_counter()
+        try:
+            return miss_original(self, *args, **kwargs)
+        finally:
+            if contador is not None:
+                contador["misses"] += 1
+                contador["segundos_miss"] += time.perf_counter() - t0
+
+    miss._perfilador = True
+    CachedFunc._handle_cache_hit = hit
+    CachedFunc._handle_cache_miss = miss
+
+
+def instrumentar_streamlit():
+    """
+    Envuelve una sola vez las funciones de Plotly Express (etapa figura), los elementos
+    de Streamlit que serializan datos al navegador (etapa render) y los hits/misses de
+    @st.cache_data.
+    """
+    _instrumentar_cache()
+
+    for nombre in FUNCIONES_FIGURA:
+        funcion = getattr(px, nombre, None)
+        if funcion is not None and not getattr(funcion, "_perfilador", False):
+            setattr(px, nombre, _instrumentar(funcion, f"px.{nombre}", "figura", None))
+
+    for nombre in ELEMENTOS_RENDER:
+        metodo = getattr(DeltaGenerator, nombre, None)
+        if metodo is None or getattr(metodo, "_perfilador", False):
+            continue
+        # args[0] es el DeltaGenerator, args[1] la figura o el DataFrame
+        envoltura = _instrumentar(metodo, f"st.{nombre}", "render", 1)
+        setattr(DeltaGenerator, nombre, envoltura)
+        # st.<elemento> es un método ya ligado al DeltaGenerator principal
+        if hasattr(st, nombre):
+            setattr(st, nombre, envoltura.__get__(getattr(st, nombre).__self__))
+
+
+# 🛠️ PANEL DE ADMINISTRADOR
+
+def _tabla_perfil(perfil):
+    df = pd.DataFrame(perfil["secciones"], columns=["nombre", "etapa", "nivel", "segundos", "propio", "filas", "bytes"])
+    medido = df["propio"].sum()
+    sin_medir = max(perfil["total"] - medido, 0.0)
+
+    df["Sección"] = ["  " * n + nombre for n, nombre in zip(df["nivel"], df["nombre"])]
+    tabla = pd.DataFrame({
+        "Sección": df["Sección"],
+        "Etapa": df["etapa"],
+        "ms": (df["segundos"] * 1000).round(1),
+        "ms propios": (df["propio"] * 1000).round(1),
+        "% rerun": (df["propio"] / perfil["total"] * 100).round(1),
+        "Filas": df["filas"].astype("Int64"),
+        "KB": (df["bytes"].astype(float) / 1024).round(1),
+    })
+
+    por_etapa = df.groupby("etapa")["propio"].sum().reindex(ETAPAS, fill_value=0.0)
+    por_etapa["sin medir"] = sin_medir
+    por_etapa = (por_etapa * 1000).round(1).rename("ms").rename_axis("Etapa").reset_index()
+    return tabla, por_etapa
+
+
+def _clave_admin():
+    st.session_state["perfilador_admin"] = st.session_state["perfilador_clave"] == ADMIN_PASSWORD
+    del st.session_state["perfilador_clave"]
+
+
+def _solicitar_cprofile():
+    st.session_state["perfilador_cprofile_pendiente"] = True
+
+
+def _cerrar_admin():
+    st.session_state.pop("perfilador_admin", None)
+
+
+def panel_perfilador():
+    """Panel del sidebar con el desglose de los últimos reruns. Solo para administradores."""
+    if not ADMIN_PASSWORD:
+        return
+
+    with st.sidebar.expander("🛠️ Perfilador", expanded=False):
+        if not st.session_state.get("perfilador_admin", False):
+            st.text_input(
+                "Contraseña de administrador", type="password", on_change=_clave_admin, key="perfilador_clave"
+            )
+            if st.session_state.get("perfilador_admin") is False:
+                st.error("Contraseña incorrecta")
+            return
+
+        historial = list(st.session_state.get("_perfiles", []))
+        if not historial:
+            st.info("Aún no hay reruns registrados.")
+        else:
+            # Sin key: al llegar un rerun nuevo cambian las opciones y se vuelve a seleccionar el último
+            indices = list(range(len(historial)))[::-1]
+            idx = st.selectbox(
+                "Rerun",
+                indices,
+                format_func=lambda i: f"{historial[i]['inicio']:%H:%M:%S} · {historial[i]['pagina']} "
+                                      f"· {historial[i]['total'] * 1000:,.0f} ms",
+            )
+            perfil = historial[idx]
+            tabla, por_etapa = _tabla_perfil(perfil)
+
+            st.metric("Tiempo total del rerun", f"{perfil['total'] * 1000:,.0f} ms")
+            st.dataframe(por_etapa, hide_index=True, use_container_width=True)
+            st.dataframe(tabla, hide_index=True, use_container_width=True)
+
+            if perfil["cache"]:
+                cache = pd.DataFrame.from_dict(perfil["cache"], orient="index").rename_axis("Función").reset_index()
+                cache["ms miss"] = (cache.pop("segundos_miss") * 1000).round(1)
+                st.dataframe(cache, hide_index=True, use_container_width=True)
+
+            # La captura cProfile más reciente, aunque se haya seleccionado otro rerun
+            capturas = [p for p in historial if p["cprofile"]]
+            if capturas:
+                captura = capturas[-1]
+                st.markdown(f"**cProfile** · {captura['inicio']:%H:%M:%S} · {captura['pagina']}")
+                st.download_button(
+                    "📥 Descargar cProfile",
+                    captura["cprofile"],
+                    file_name=f"cprofile_{captura['inicio']:%Y%m%d_%H%M%S}.txt",
+                    key="perfilador_descarga_cprofile",
+                )
+                st.code(captura["cprofile"], language="text")
+
+        st.button(
+            "📸 Capturar cProfile del siguiente rerun",
+            on_click=_solicitar_cprofile,
+            key="perfilador_cprofile",
+        )
+        st.caption("El tamaño de los datos (KB) solo se mide con la sesión de administrador abierta.")
+        st.button("Cerrar sesión de administrador", on_click=_cerrar_admin, key="perfilador_salir")
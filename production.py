@@ -11,13 +11,30 @@ from utils import (
     cargar_downtime,
     extraer_downtime,
     catalogo_downtime,
-    filtrar_downtime
+    filtrar_downtime,
+    hash_contenido,
+    boton_descarga_reporte,
+    anexar_timecard
+)
+from perfilador import seccion, anotar_accion
+from dimensiones import con_llaves, filtrar_por_dimension
+from kpis import (
+    agregados_diarios,
+    filtrar_diario,
+    resumen_desde_diario,
+    kpis_por_wc_desde_diario,
+    eficiencia_por_empleado,
+    conteos_por_turno,
+    cumplimiento_plan as calcular_cumplimiento_plan,
+    carga_plan_por_dia,
+    capacidad_por_dia
 )
 
 def produccion_app():
 
-    menuproduction = ["Importar Reportes", "Dashboard"]
+    menuproduction = ["Importar Reportes", "Dashboard", "Capacidad"]
     option = st.sidebar.selectbox("Acciones:", menuproduction)
+    anotar_accion(option)
 
     if option == "Importar Reportes":
         importar_reportes()
@@ -25,29 +42,60 @@ def produccion_app():
     elif option == "Dashboard":
         dashboard()
 
+    elif option == "Capacidad":
+        capacidad()
+
 def importar_reportes():
     st.header("📥 Importar Reporte Production Timecard")
+    modo_timecard = st.radio(
+        "Modo de carga",
+        ["Reemplazar", "Anexar al historial"],
+        horizontal=True,
+        help="Anexar guarda solo los renglones cuyo Timesheet # / Job # / Item/OP # no estaban en el historial."
+    )
     uploaded_file = st.file_uploader("Selecciona el archivo Excel del reporte", type=["xlsx"])
 
     if uploaded_file is not None:
-        df, error = cargar_datos_columnas_requeridas(uploaded_file, required_columns, skiprows=4)
+        with seccion("Lectura Timecard", "carga") as s:
+            df, error = s.carga(cargar_datos_columnas_requeridas(uploaded_file, required_columns, skiprows=4))
         if df is None:
             st.error(f"❌ {error}")
             st.stop()
-
-        st.session_state.df_clean = df
-        st.success("✅ Archivo cargado.")
+        df = con_llaves(df)
+
+        if modo_timecard == "Anexar al historial":
+            # El archivo sigue en el uploader en cada rerun: se anexa una sola vez por contenido
+            anexados = st.session_state.setdefault("_timecards_anexados", {})
+            huella = hash_contenido(uploaded_file)
+            if huella not in anexados:
+                with seccion("Anexar Timecard", "agregación") as s:
+                    df, diario, resumen = anexar_timecard(df, uploaded_file.name, huella)
+                    s.carga(df)
+                st.session_state.df_clean = df
+                st.session_state.diario_timecard = diario
+                anexados[huella] = resumen
+            resumen = anexados[huella]
+            st.success(
+                f"✅ {resumen['nuevos']:,} renglones nuevos anexados "
+                f"({resumen['repetidos']:,} ya estaban; {resumen['dias']} días recalculados)."
+            )
+        else:
+            with seccion("Agregados diarios", "agregación") as s:
+                st.session_state.diario_timecard = s.carga(agregados_diarios(df))
+            st.session_state.df_clean = df
+            st.success("✅ Archivo cargado.")
         if st.checkbox("Mostrar datos cargados"):
             st.dataframe(df)
 
     st.header("📥 Importar Reporte Scheduled Jobs")
     uploaded_plan = st.file_uploader("Selecciona el archivo Excel de la programación", type=["xlsx"], key="plan")
     if uploaded_plan is not None:
-        df_plan, error = cargar_datos_columnas_requeridas(uploaded_plan, required_columns_plan, skiprows=5)
+        with seccion("Lectura Scheduled Jobs", "carga") as s:
+            df_plan, error = s.carga(cargar_datos_columnas_requeridas(uploaded_plan, required_columns_plan, skiprows=5))
         if df_plan is None:
             st.error(f"❌ {error}")
             st.stop()
-        st.session_state.df_plan = df_plan
+        st.session_state.df_plan = con_llaves(df_plan)
         st.success("✅ Archivo de programación cargado.")
         if st.checkbox("Mostrar datos de programación"):
             st.dataframe(df_plan)
@@ -55,13 +103,15 @@ def importar_reportes():
     st.header("📥 Importar Reporte Downtime por W/C")
     uploaded_downtime = st.file_uploader("Selecciona el archivo Excel de Downtime", type=["xlsx"], key="downtime")
     if uploaded_downtime is not None:
-        df_downtime = cargar_downtime(uploaded_downtime)
+        with seccion("Lectura Downtime", "carga") as s:
+            df_downtime = s.carga(cargar_downtime(uploaded_downtime))
         if df_downtime is None:
             st.error("❌ No se pudo leer el archivo de Downtime.")
             st.stop()
 
         st.session_state.df_downtime = df_downtime
-        df_downtime_procesado = extraer_downtime(df_downtime)
+        with seccion("Extraer Downtime", "agregación") as s:
+            df_downtime_procesado = s.carga(con_llaves(extraer_downtime(df_downtime)))
         st.session_state.df_downtime_procesado = df_downtime_procesado
 
         st.success("✅ Archivo de Downtime cargado.")
@@ -74,6 +124,11 @@ def dashboard():
         return
 
     df = st.session_state.df_clean
+    # Los KPIs salen de los agregados por día/W/C/turno; las gráficas por empleado usan los renglones
+    if st.session_state.get("diario_timecard") is None:
+        with seccion("Agregados diarios", "agregación") as s:
+            st.session_state.diario_timecard = s.carga(agregados_diarios(df))
+    diario = st.session_state.diario_timecard
 
     # Filtros por Fecha
     fechas = st.sidebar.date_input(
@@ -81,10 +136,11 @@ def dashboard():
         [df["Completed On"].min(), df["Completed On"].max()]
     )
 
-    df_filtrado = df[
-        (df["Completed On"] >= pd.to_datetime(fechas[0])) &
-        (df["Completed On"] <= pd.to_datetime(fechas[1]))
-        ]
+    with seccion("Filtro fechas", "filtro"):
+        df_filtrado = df[
+            (df["Completed On"] >= pd.to_datetime(fechas[0])) &
+            (df["Completed On"] <= pd.to_datetime(fechas[1]))
+            ]
 
     # Filtro por turno (global para todas las gráficas)
     turnos_disponibles = df_filtrado["Shift"].unique()
@@ -95,7 +151,8 @@ def dashboard():
     )
 
     # Aplicar filtro de turnos
-    df_filtrado = df_filtrado[df_filtrado["Shift"].isin(turnos_seleccionados)]
+    with seccion("Filtro turnos", "filtro"):
+        df_filtrado = df_filtrado[df_filtrado["Shift"].isin(turnos_seleccionados)]
 
     # Filtro por W/C Type
     wc_types_disponibles = df_filtrado["W/C Type"].unique()
@@ -105,17 +162,19 @@ def dashboard():
         default=wc_types_disponibles
     )
 
-    df_filtrado = df_filtrado[df_filtrado["W/C Type"].isin(wc_types_seleccionados)]
-    # Filtrar Timecards únicos antes de agrupar
-    df_filtrado_unique = df_filtrado.drop_duplicates(subset=["Timesheet #"])
+    with seccion("Filtro tipos W/C", "filtro"):
+        df_filtrado = df_filtrado[df_filtrado["W/C Type"].isin(wc_types_seleccionados)]
 
-    # KPIs resumen
+    # KPIs resumen (mismas funciones que el modo batch de kpis.py)
+    with seccion("KPIs resumen", "agregación"):
+        diario_filtrado = filtrar_diario(diario, fechas, turnos_seleccionados, wc_types_seleccionados)
+        resumen = resumen_desde_diario(diario_filtrado)
     st.subheader("🔍 Resumen General")
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Eficiencia Promedio", f'{df_filtrado["Efficiency"].mean():.2f}%')
-    col2.metric("OEE Promedio", f'{df_filtrado["OEE"].mean():.2f}%')
-    col3.metric("Cantidad Producida", f'{df_filtrado_unique["Quantity"].sum():,.0f}')
-    col4.metric("Horas No-Producción", f'{df_filtrado_unique["Non-production Downtime Hours"].sum():,.2f}')
+    col1.metric("Eficiencia Promedio", f'{resumen["Eficiencia Promedio"]:.2f}%')
+    col2.metric("OEE Promedio", f'{resumen["OEE Promedio"]:.2f}%')
+    col3.metric("Cantidad Producida", f'{resumen["Cantidad Producida"]:,.0f}')
+    col4.metric("Horas No-Producción", f'{resumen["Horas No-Producción"]:,.2f}')
 
     # Obtener lista única de W/C disponibles
     wc_options = df_filtrado["W/C"].unique().tolist()
@@ -129,7 +188,14 @@ def dashboard():
     )
 
     # Filtrar según selección
-    df_wc = df_filtrado[df_filtrado["W/C"].isin(selected_wc)]
+    with seccion("Filtro W/C", "filtro") as s:
+        df_wc = s.carga(filtrar_por_dimension(df_filtrado, "wc", selected_wc))
+
+    # KPIs por W/C, empleado y turno para tablas y gráficas
+    with seccion("KPIs por W/C", "agregación"):
+        por_wc = kpis_por_wc_desde_diario(filtrar_diario(diario_filtrado, wcs=selected_wc))
+        eficiencia_empleado = eficiencia_por_empleado(df_wc)
+        por_turno = conteos_por_turno(df_wc)
 
     # Sección: Top 5 Centros de Trabajo Críticos
     st.subheader("📉 Centros de Trabajo con Indicadores Críticos")
@@ -140,9 +206,7 @@ def dashboard():
     with col_x:
         st.markdown("**Menor Eficiencia (Top 5)**")
         top5_low_eff = (
-            df_wc.groupby("W/C")["Efficiency"]
-            .mean()
-            .reset_index()
+            por_wc[["W/C", "Efficiency"]]
             .sort_values(by="Efficiency", ascending=True)
             .head(5)
         )
@@ -152,9 +216,7 @@ def dashboard():
     with col_y:
         st.markdown("**Más Tiempo de Downtime (Top 5)**")
         top5_downtime = (
-            df_wc.groupby("W/C")["Production Downtime Hours"]
-            .sum()
-            .reset_index()
+            por_wc[["W/C", "Production Downtime Hours"]]
             .sort_values(by="Production Downtime Hours", ascending=False)
             .head(5)
         )
@@ -164,9 +226,7 @@ def dashboard():
     with col_z:
         st.markdown("**Más Scrap (Top 5)**")
         top5_scrap = (
-            df_wc.groupby("W/C")["Scrap"]
-            .sum()
-            .reset_index()
+            por_wc[["W/C", "Scrap"]]
             .sort_values(by="Scrap", ascending=False)
             .head(5)
         )
@@ -208,9 +268,7 @@ def dashboard():
     # Gráfica 1: Eficiencia por W/C
     with col_a:
         efficiency_wc = (
-            df_wc.groupby("W/C")["Efficiency"]
-            .mean()
-            .reset_index()
+            por_wc[["W/C", "Efficiency"]]
             .sort_values(by="Efficiency", ascending=True)
         )
 
@@ -256,12 +314,9 @@ def dashboard():
 
     # Gráfica 2: Partes Producidas por W/C
     with col_b:
-        # Filtrar TimeSheet únicos antes de agrupar
-        df_unique_timesheet_parts = df_wc.drop_duplicates(subset=["Timesheet #"])
+        # Cantidad sumada por TimeSheet único
         quantity_wc = (
-            df_unique_timesheet_parts.groupby("W/C")["Quantity"]
-            .sum()
-            .reset_index()
+            por_wc[["W/C", "Quantity"]]
             .sort_values(by="Quantity", ascending=True)
         )
 
@@ -310,13 +365,14 @@ def dashboard():
         df_downtime = st.session_state.df_downtime_procesado
 
         # Filtramos downtime con los mismos criterios
-        df_downtime_filtrado = filtrar_downtime(
-            df_downtime,
-            fechas=fechas,
-            turnos=turnos_seleccionados,
-            wc_types=wc_types_seleccionados,
-            wcs=selected_wc
-        )
+        with seccion("Filtro Downtime", "filtro"):
+            df_downtime_filtrado = filtrar_downtime(
+                df_downtime,
+                fechas=fechas,
+                turnos=turnos_seleccionados,
+                wc_types=wc_types_seleccionados,
+                wcs=selected_wc
+            )
 
         with col_c:
             downtime_wc = (
@@ -370,13 +426,14 @@ def dashboard():
     if "df_downtime_procesado" in st.session_state:
         df_downtime = st.session_state.df_downtime_procesado
 
-        df_downtime_filtrado = filtrar_downtime(
-            df_downtime,
-            fechas=fechas,
-            turnos=turnos_seleccionados,
-            wc_types=wc_types_seleccionados,
-            wcs=selected_wc
-        )
+        with seccion("Filtro Downtime", "filtro"):
+            df_downtime_filtrado = filtrar_downtime(
+                df_downtime,
+                fechas=fechas,
+                turnos=turnos_seleccionados,
+                wc_types=wc_types_seleccionados,
+                wcs=selected_wc
+            )
         with col_d:
             if "Razones" in df_downtime_filtrado.columns:
                 downtime_por_wc = df_downtime_filtrado.groupby(
@@ -439,13 +496,6 @@ def dashboard():
 
     # Gráfica 5: Eficiencia promedio por Empleado
     with col_e:
-        eficiencia_empleado = (
-            df_wc.groupby("Employee")["Efficiency"]
-            .mean()
-            .reset_index()
-            .sort_values(by="Efficiency", ascending=False)
-        )
-
         # Gráfico interactivo con Plotly Express
         fig = px.bar(
             eficiencia_empleado,
@@ -485,9 +535,7 @@ def dashboard():
     # Gráfica 6: OEE por W/C
     with col_f:
         oee_wc = (
-            df_wc.groupby("W/C")["OEE"]
-            .mean()
-            .reset_index()
+            por_wc[["W/C", "OEE"]]
             .sort_values(by="OEE", ascending=False)
         )
 
@@ -538,13 +586,9 @@ def dashboard():
 
     # Gráfica 7: horas por W/C
     with col_g:
-        # Filtrar TimeSheet únicos antes de agrupar
-        df_unique_timesheet = df_wc.drop_duplicates(subset=["Timesheet #"])
-
+        # Horas sumadas por TimeSheet único
         horas_wc = (
-            df_unique_timesheet.groupby("W/C")["Hours"]
-            .sum()
-            .reset_index()
+            por_wc[["W/C", "Hours"]]
             .sort_values(by="Hours", ascending=False)
         )
 
@@ -593,14 +637,9 @@ def dashboard():
 
     # Gráfica 8: Non-production by W/C
     with col_h:
-        # Eliminar jobs duplicados para esta gráfica
-        df_unique = df_wc.drop_duplicates(subset=["Timesheet #"])
-
-        # Agrupar y sumar las Non-production Downtime Hours por W/C
+        # Non-production Downtime Hours sumadas por TimeSheet único
         non_prod_wc = (
-            df_unique.groupby("W/C")["Non-production Downtime Hours"]
-            .sum()
-            .reset_index()
+            por_wc[["W/C", "Non-production Downtime Hours"]]
             .sort_values(by="Non-production Downtime Hours", ascending=False)
         )
 
@@ -652,13 +691,9 @@ def dashboard():
 
     # Gráfica 9: Scrap por W/C
     with col_i:
-        # Filtrar TimeSheet únicos antes de agrupar
-        df_unique_timesheet_scrap = df_wc.drop_duplicates(subset=["Timesheet #"])
-
+        # Scrap sumado por TimeSheet único
         scrap_wc = (
-            df_unique_timesheet_scrap.groupby("W/C")["Scrap"]
-            .sum()
-            .reset_index()
+            por_wc[["W/C", "Scrap"]]
             .sort_values(by="Scrap", ascending=False)
         )
 
@@ -707,24 +742,12 @@ def dashboard():
 
         # Gráfica 10: Expected vs Actual Run Rate /hr por W/C
     with col_j:
-        # Filtrar df_wc por turno si se seleccionó alguno
-        df_wc_filtrado = df_wc.copy()
-
-        if turnos_seleccionados:
-            df_wc_filtrado = df_wc_filtrado[df_wc_filtrado["Shift"].isin(turnos_seleccionados)]
-
-        # Asegurarnos que son numéricos
-        df_wc_filtrado["Expected Run Rate /hr"] = pd.to_numeric(df_wc_filtrado["Expected Run Rate /hr"],
-                                                                errors="coerce")
-        df_wc_filtrado["Actual Run Rate /hr"] = pd.to_numeric(df_wc_filtrado["Actual Run Rate /hr"],
-                                                              errors="coerce")
-
-        # Agrupar por W/C y calcular promedios
-        runrate_wc = df_wc_filtrado.groupby("W/C")[
-            ["Expected Run Rate /hr", "Actual Run Rate /hr"]].mean().reset_index()
-        runrate_wc = runrate_wc.sort_values(by="Expected Run Rate /hr", ascending=False)
-
-        runrate_wc.dropna(subset=["Expected Run Rate /hr", "Actual Run Rate /hr"], inplace=True)
+        # Promedios de run rate por W/C (df_wc ya viene filtrado por turno)
+        runrate_wc = (
+            por_wc[["W/C", "Expected Run Rate /hr", "Actual Run Rate /hr"]]
+            .sort_values(by="Expected Run Rate /hr", ascending=False)
+            .dropna(subset=["Expected Run Rate /hr", "Actual Run Rate /hr"])
+        )
 
         # Transformar a formato largo
         runrate_wc_melted = runrate_wc.melt(
@@ -787,9 +810,7 @@ def dashboard():
     # Gráfica 12: Emeplados por turno
     with col_k:
         empleados_turno = (
-            df_wc.groupby("Shift")["Employee"]
-            .nunique()
-            .reset_index()
+            por_turno[["Shift", "Employee"]]
             .sort_values(by="Employee", ascending=True)
         )
 
@@ -833,9 +854,7 @@ def dashboard():
     with col_l:
         # Agrupar por turno y contar WO únicos
         wo_por_turno = (
-            df_wc.groupby("Shift")["Job #"]
-            .nunique()
-            .reset_index()
+            por_turno[["Shift", "Job #"]]
             .sort_values(by="Job #", ascending=True)
         )
 
@@ -922,18 +941,12 @@ def dashboard():
                 )
 
         if selected_wc_local:
-            df_plan_filtrado_local = df_plan_filtrado_local[df_plan_filtrado_local["W/C"].isin(selected_wc_local)]
-
-        # Cumplimiento Agrupado
-        cumplimiento_plan = df_plan_filtrado_local.groupby("W/C")[
-            ["To Make", "Produced", "Can Make", "Remaining"]].sum().reset_index()
+            df_plan_filtrado_local = filtrar_por_dimension(df_plan_filtrado_local, "wc", selected_wc_local)
 
-        cumplimiento_plan["Cumplimiento (%)"] = (
-                (cumplimiento_plan["Produced"] / cumplimiento_plan["To Make"]) * 100
-        ).round(2)
-        cumplimiento_plan["Cumplimiento (%)"].fillna(0, inplace=True)
-
-        cumplimiento_plan = cumplimiento_plan.sort_values(by="Cumplimiento (%)", ascending=True)
+        # Cumplimiento Agrupado (incluye Piezas Faltantes)
+        with seccion("Cumplimiento al plan", "agregación"):
+            cumplimiento = calcular_cumplimiento_plan(df_plan_filtrado_local)
+        cumplimiento_plan = cumplimiento.drop(columns=["Piezas Faltantes"])
 
         # Gráfica Cumplimiento
         fig = px.bar(
@@ -969,9 +982,10 @@ def dashboard():
         # Gráfica de piezas faltantes
         st.subheader("Piezas faltantes para cumplimiento")
 
-        piezas_faltantes = df_plan_filtrado_local.groupby("W/C")[["Can Make", "Remaining"]].sum().reset_index()
-        piezas_faltantes["Piezas Faltantes"] = (piezas_faltantes["Can Make"] - piezas_faltantes["Remaining"])
-        piezas_faltantes = piezas_faltantes.sort_values(by="Piezas Faltantes", ascending=True)
+        piezas_faltantes = (
+            cumplimiento[["W/C", "Can Make", "Remaining", "Piezas Faltantes"]]
+            .sort_values(by="Piezas Faltantes", ascending=True)
+        )
 
         fig_faltantes = px.bar(
             piezas_faltantes,
@@ -1009,3 +1023,115 @@ def dashboard():
 
     else:
         st.info("Carga primero el archivo de Scheduled Jobs para mostrar esta gráfica.")
+
+
+def capacidad():
+    st.header("🗓️ Carga vs Capacidad por Centro de Trabajo")
+    if st.session_state.df_plan is None:
+        st.warning("Primero carga el reporte de Scheduled Jobs.")
+        return
+
+    df_plan = st.session_state.df_plan
+    inicio_plan = pd.to_datetime(df_plan["Starts On"], errors="coerce").min()
+    fin_plan = pd.to_datetime(df_plan["Ends On"], errors="coerce").max()
+    if pd.isna(inicio_plan):
+        st.warning("El reporte de Scheduled Jobs no trae fechas de Starts On.")
+        return
+    fin_plan = max(fin_plan, inicio_plan) if pd.notna(fin_plan) else inicio_plan
+
+    # Por omisión un trimestre desde el primer job programado
+    fechas = st.sidebar.date_input(
+        "Rango de fechas",
+        [inicio_plan.date(), min(inicio_plan + pd.Timedelta(days=90), fin_plan).date()]
+    )
+    if len(fechas) != 2:
+        st.info("Selecciona la fecha final del rango.")
+        return
+    desde, hasta = pd.Timestamp(fechas[0]), pd.Timestamp(fechas[1])
+
+    turnos_dia = st.sidebar.number_input("Turnos por día", min_value=1, max_value=3, value=2)
+    horas_turno = st.sidebar.number_input("Horas por turno", min_value=1.0, max_value=12.0, value=8.0, step=0.5)
+    fines_semana = st.sidebar.checkbox("Se trabaja sábado y domingo", value=False)
+    horas_dia = turnos_dia * horas_turno
+
+    wc_types = sorted(df_plan["W/C Type"].dropna().unique())
+    wc_types_seleccionados = st.sidebar.multiselect("Tipo(s) de Centro de Trabajo", wc_types, default=wc_types)
+    estados = sorted(df_plan["Status"].dropna().unique())
+    estados_seleccionados = st.sidebar.multiselect("Status de los jobs", estados, default=estados)
+
+    with seccion("Filtro plan", "filtro") as s:
+        df_plan_filtrado = df_plan[df_plan["W/C Type"].isin(wc_types_seleccionados)]
+        df_plan_filtrado = s.carga(df_plan_filtrado[df_plan_filtrado["Status"].isin(estados_seleccionados)])
+
+    # Horas reales del Timecard por W/C y día (agregados diarios del dashboard)
+    diario = st.session_state.get("diario_timecard")
+    if diario is None and st.session_state.df_clean is not None:
+        with seccion("Agregados diarios", "agregación") as s:
+            st.session_state.diario_timecard = diario = s.carga(agregados_diarios(st.session_state.df_clean))
+
+    dias_laborales = range(7) if fines_semana else range(5)
+    with seccion("Carga vs capacidad", "agregación") as s:
+        carga = carga_plan_por_dia(df_plan_filtrado, desde, hasta, dias_laborales)
+        tabla = s.carga(capacidad_por_dia(
+            carga, horas_dia, desde, hasta,
+            wcs=df_plan_filtrado["W/C"].dropna().unique(),
+            diario=diario,
+            dias_laborales=dias_laborales
+        ))
+
+    if tabla.empty:
+        st.info("No hay centros de trabajo con los filtros seleccionados.")
+        return
+
+    sobrecargados = tabla[tabla["Carga (hrs)"] > tabla["Disponible (hrs)"]]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Carga programada", f'{tabla["Carga (hrs)"].sum():,.0f} hrs')
+    col2.metric("Horas disponibles", f'{tabla["Disponible (hrs)"].sum():,.0f} hrs')
+    col3.metric(
+        "Utilización",
+        f'{tabla["Carga (hrs)"].sum() / tabla["Disponible (hrs)"].sum() * 100:,.1f}%'
+        if tabla["Disponible (hrs)"].sum() else "—"
+    )
+    col4.metric("W/C-días sobrecargados", f"{len(sobrecargados):,}")
+
+    st.subheader("🔥 Utilización por W/C y día")
+    with seccion("Mapa de calor capacidad", "figura"):
+        mapa = tabla.pivot(index="W/C", columns="Día", values="Utilización (%)")
+        fig = px.imshow(
+            mapa,
+            color_continuous_scale="RdYlGn_r",
+            zmin=0,
+            zmax=150,
+            aspect="auto",
+            labels={"x": "Día", "y": "Centro de Trabajo", "color": "Utilización (%)"},
+            height=max(400, 18 * len(mapa)),
+        )
+        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', margin=dict(t=30, l=50, r=30, b=50))
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption("Días sin capacidad (fines de semana) quedan en blanco; más de 100% es carga mayor a lo disponible.")
+
+    st.subheader("📈 Carga, capacidad y horas reales por día")
+    with seccion("Gráfica capacidad diaria", "figura"):
+        por_dia = tabla.groupby("Día")[["Carga (hrs)", "Disponible (hrs)", "Real (hrs)"]].sum(min_count=1).reset_index()
+        fig = px.line(
+            por_dia, x="Día", y=["Carga (hrs)", "Disponible (hrs)", "Real (hrs)"],
+            labels={"value": "Horas", "variable": ""}, height=400
+        )
+        fig.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            yaxis=dict(showgrid=True, gridcolor='lightgrey'),
+            margin=dict(t=30, l=50, r=30, b=50)
+        )
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("⚠️ W/C-días sobrecargados")
+    if sobrecargados.empty:
+        st.success("Ningún centro de trabajo pasa de su capacidad en el rango.")
+    else:
+        st.dataframe(
+            sobrecargados.sort_values("Utilización (%)", ascending=False),
+            hide_index=True, use_container_width=True
+        )
+    boton_descarga_reporte(
+        {"Capacidad": tabla, "Sobrecargas": sobrecargados}, "capacidad_wc", key="descarga_capacidad"
+    )
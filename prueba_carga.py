@@ -0,0 +1,364 @@
+# prueba_carga.py
+"""
+Prueba de carga multi-sesión de app.py con streamlit.testing (AppTest).
+
+Cada sesión simulada pasa por la contraseña, "sube" los reportes sintéticos de
+benchmark.py y recorre Producción → Dashboard, MRP → Comparativo y
+Management → Comparativa con filtros aleatorios. Las sesiones corren en
+paralelo en el mismo proceso, compartiendo la caché de @st.cache_data como en
+un servidor real.
+
+AppTest no puede llenar un st.file_uploader, así que la carga se simula igual
+que la hacen las páginas de importación: los archivos pasan por los mismos
+cargadores de utils.py y el resultado se deja en session_state. Las dos
+ejecuciones MRP se guardan como snapshots en un directorio temporal.
+
+Uso:
+    python prueba_carga.py --password "..." --sesiones 1 5 10
+    LAMTEC_PASSWORD="..." python prueba_carga.py --sesiones 20 --iteraciones 5 --filas 20000 --salida carga.json
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import streamlit
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest, app_test
+
+import benchmark
+import utils
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+warnings.simplefilter("ignore", pd.errors.SettingWithCopyWarning)
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+RUTA_APP = os.path.join(RAIZ, "app.py")
+
+
+def memoria_mb():
+    """Memoria residente actual del proceso (Linux); en otros sistemas, el pico."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        from telemetria import memoria_pico_mb
+        return memoria_pico_mb()
+
+
+def preparar_apptest_concurrente():
+    """
+    AppTest asigna un Runtime simulado al inicio de cada run y lo borra al final, lo que rompe
+    a las demás sesiones que corren al mismo tiempo. Se le da una subclase para que esas
+    asignaciones no toquen el Runtime real y se deja un solo Runtime simulado para el proceso,
+    como el del servidor (caché y archivos de medios compartidos).
+    """
+    # Partes internas de streamlit.testing (ver tests/test_streamlit_interno.py): si cambian,
+    # el reemplazo no tendría efecto y las sesiones se pisarían sin avisar
+    runtime_apptest = getattr(app_test, "Runtime", None)
+    if not (isinstance(runtime_apptest, type) and issubclass(runtime_apptest, Runtime)) or not hasattr(Runtime, "_instance"):
+        raise RuntimeError(
+            f"streamlit {streamlit.__version__} ya no expone app_test.Runtime / Runtime._instance; "
+            "revisa preparar_apptest_concurrente() contra la versión de requirements.txt"
+        )
+
+    class _RuntimePorRun(Runtime):
+        pass
+
+    app_test.Runtime = _RuntimePorRun
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    # AppTest activa esta opción con un patch por run; entre hilos el patch se pisa
+    config.set_option("global.appTest", True)
+
+
+# 📦 DATOS DE LAS SESIONES
+
+def preparar_datos(filas, semilla=0):
+    """
+    Genera los reportes sintéticos y los procesa con los cargadores de utils.py, como lo harían
+    las páginas de importación. Devuelve el session_state que deja una carga completa.
+    Debe llamarse con el directorio de trabajo ya en la carpeta temporal (snapshots MRP).
+    """
+    rng = np.random.default_rng(semilla)
+    cargar = utils.cargar_datos_columnas_requeridas
+
+    df_clean, _ = cargar(BytesIO(benchmark.generar_timecard(filas, rng)), utils.required_columns, skiprows=4)
+    df_plan, _ = cargar(
+        BytesIO(benchmark.generar_programacion(max(filas // 10, 1), rng)), utils.required_columns_plan, skiprows=5
+    )
+    df_downtime = utils.cargar_downtime(BytesIO(benchmark.generar_downtime(max(filas // 10, 1), rng)))
+
+    df_orders, _ = cargar(
+        BytesIO(benchmark.generar_orders(filas, rng)), ["Ship On", "Customer", "Item", "Amount"], skiprows=4
+    )
+    df_sales, _ = cargar(
+        BytesIO(benchmark.generar_sales(filas, rng)), ["Invoice Date", "Customer", "Item", "Amount"], skiprows=8
+    )
+
+    # Dos ejecuciones MRP distintas para que el Comparativo tenga Antes y Después
+    ahora = datetime.datetime.now()
+    for i in range(2):
+        utils.guardar_snapshot_mrp(
+            BytesIO(benchmark.generar_mrp(filas, rng)), ahora - datetime.timedelta(days=1 - i)
+        )
+
+    return {
+        "df_clean": df_clean,
+        "df_plan": df_plan,
+        "df_downtime": df_downtime,
+        "df_downtime_procesado": utils.extraer_downtime(df_downtime),
+        "df_orders": df_orders,
+        "df_sales": df_sales,
+        "cubo_ventas": utils.construir_cubo_ventas(df_orders, df_sales),
+    }
+
+
+# 🧑‍💼 SESIÓN SIMULADA
+
+def _widget(elementos, etiqueta):
+    for elemento in elementos:
+        if elemento.label == etiqueta:
+            return elemento
+    return None
+
+
+def _subconjunto(rng, opciones):
+    """Subconjunto aleatorio no vacío de las opciones de un multiselect."""
+    if not opciones:
+        return []
+    n = int(rng.integers(1, len(opciones) + 1))
+    return [opciones[i] for i in sorted(rng.choice(len(opciones), size=n, replace=False))]
+
+
+def _elegir_indice(rng, selectbox, omitir_primero=False):
+    inicio = 1 if omitir_primero and len(selectbox.options) > 1 else 0
+    selectbox.select_index(int(rng.integers(inicio, len(selectbox.options))))
+
+
+class _Sesion:
+    """Una sesión de AppTest que cronometra cada rerun."""
+
+    def __init__(self, numero, timeout):
+        self.numero = numero
+        self.at = AppTest.from_file(RUTA_APP, default_timeout=timeout)
+        self.mediciones = []
+
+    def rerun(self, paso):
+        t0 = time.perf_counter()
+        error = None
+        try:
+            self.at.run()
+            if self.at.exception:
+                error = self.at.exception[0].message
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.mediciones.append({
+            "sesion": self.numero, "paso": paso, "segundos": time.perf_counter() - t0, "error": error,
+        })
+        return error is None
+
+    def ir_a(self, menu, accion=None):
+        _widget(self.at.sidebar.selectbox, "Menú:").select(menu)
+        if not self.rerun(f"{menu}") or accion is None:
+            return
+        _widget(self.at.sidebar.selectbox, "Acciones:").select(accion)
+        self.rerun(f"{menu} → {accion}")
+
+
+def _recorrido_produccion(sesion, rng):
+    sesion.ir_a("Producción", "Dashboard")
+    at = sesion.at
+    for etiqueta in ("Selecciona Turno(s)", "Selecciona Tipo(s) de Centro de Trabajo"):
+        filtro = _widget(at.sidebar.multiselect, etiqueta)
+        if filtro is not None:
+            filtro.set_value(_subconjunto(rng, filtro.options))
+            sesion.rerun(f"Producción → Dashboard · {etiqueta}")
+
+
+def _recorrido_mrp(sesion, rng):
+    sesion.ir_a("MRP", "Comparativo")
+    at = sesion.at
+    for etiqueta in ("Selecciona Type:", "Selecciona Vendor:"):
+        filtro = _widget(at.sidebar.selectbox, etiqueta)
+        if filtro is not None:
+            _elegir_indice(rng, filtro, omitir_primero=True)
+            sesion.rerun(f"MRP → Comparativo · {etiqueta}")
+
+
+def _recorrido_ventas(sesion, rng):
+    sesion.ir_a("Management", "Comparativa")
+    at = sesion.at
+    agrupacion = _widget(at.sidebar.radio, "📊 Agrupar por:")
+    if agrupacion is not None:
+        agrupacion.set_value(str(rng.choice(agrupacion.options)))
+        sesion.rerun("Management → Comparativa · Agrupar por")
+    cliente = _widget(at.sidebar.selectbox, "📌 Filtrar por Cliente")
+    if cliente is not None:
+        _elegir_indice(rng, cliente)
+        sesion.rerun("Management → Comparativa · Cliente")
+
+
+RECORRIDOS = [_recorrido_produccion, _recorrido_mrp, _recorrido_ventas]
+
+
+def simular_sesion(numero, datos, password, iteraciones, semilla, timeout):
+    """
+    Ejecuta una sesión completa y devuelve sus mediciones por rerun.
+    - numero: identificador de la sesión (también semilla de sus filtros).
+    - datos: session_state de una carga completa (preparar_datos).
+    """
+    rng = np.random.default_rng(semilla + numero)
+    sesion = _Sesion(numero, timeout)
+    at = sesion.at
+
+    sesion.rerun("Inicio")
+    _widget(at.text_input, "Introduce la contraseña").input(password)
+    if not sesion.rerun("Contraseña") or not at.session_state["password_correct"]:
+        sesion.mediciones[-1]["error"] = sesion.mediciones[-1]["error"] or "Contraseña incorrecta"
+        return sesion.mediciones
+
+    # "Subida" de reportes: cada sesión tiene su propio session_state con los datos cargados
+    for llave, valor in datos.items():
+        at.session_state[llave] = valor
+
+    for _ in range(iteraciones):
+        for recorrido in RECORRIDOS:
+            recorrido(sesion, rng)
+    return sesion.mediciones
+
+
+# 📈 REPORTE
+
+def _percentiles(segundos):
+    return {
+        "p50_ms": round(float(np.percentile(segundos, 50)) * 1000, 1),
+        "p90_ms": round(float(np.percentile(segundos, 90)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(segundos, 95)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(segundos, 99)) * 1000, 1),
+        "max_ms": round(float(np.max(segundos)) * 1000, 1),
+    }
+
+
+def ejecutar_nivel(n_sesiones, datos, password, iteraciones, semilla, timeout):
+    """Corre n_sesiones concurrentes y resume throughput, latencias y memoria."""
+    memoria_inicial = memoria_mb()
+    pico = [memoria_inicial]
+    terminado = threading.Event()
+
+    def muestrear_memoria():
+        while not terminado.wait(0.25):
+            pico.append(memoria_mb())
+
+    muestreo = threading.Thread(target=muestrear_memoria, daemon=True)
+    muestreo.start()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sesiones) as pool:
+        futuros = [
+            pool.submit(simular_sesion, i, datos, password, iteraciones, semilla, timeout)
+            for i in range(n_sesiones)
+        ]
+        mediciones = [m for f in futuros for m in f.result()]
+    duracion = time.perf_counter() - t0
+    terminado.set()
+    muestreo.join()
+    memoria_final = memoria_mb()
+
+    df = pd.DataFrame(mediciones)
+    correctas = df[df["error"].isna()]
+    por_paso = {
+        paso: {"reruns": len(grupo), **_percentiles(grupo["segundos"])}
+        for paso, grupo in correctas.groupby("paso", sort=False)
+    }
+    errores = df.loc[df["error"].notna(), ["sesion", "paso", "error"]]
+
+    return {
+        "sesiones": n_sesiones,
+        "reruns": len(df),
+        "errores": len(errores),
+        "duracion_s": round(duracion, 2),
+        "reruns_por_segundo": round(len(df) / duracion, 2),
+        "latencia": _percentiles(correctas["segundos"]) if not correctas.empty else None,
+        "latencia_por_paso": por_paso,
+        "memoria_inicial_mb": round(memoria_inicial, 1),
+        "memoria_final_mb": round(memoria_final, 1),
+        "memoria_pico_mb": round(max(pico), 1),
+        "crecimiento_memoria_mb": round(memoria_final - memoria_inicial, 1),
+        "primeros_errores": errores.head(10).to_dict(orient="records"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga multi-sesión de app.py con AppTest")
+    parser.add_argument("--password", default=os.environ.get("LAMTEC_PASSWORD"),
+                        help="Contraseña de la app (por defecto, variable LAMTEC_PASSWORD)")
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[5],
+                        help="Sesiones concurrentes por nivel (p. ej. 1 5 10 20)")
+    parser.add_argument("--iteraciones", type=int, default=3,
+                        help="Veces que cada sesión recorre las tres páginas")
+    parser.add_argument("--filas", type=int, default=5_000, help="Filas de los reportes sintéticos")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="Segundos máximos por rerun")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar el reporte")
+    args = parser.parse_args(argv)
+
+    if not args.password:
+        parser.error("Falta la contraseña: usa --password o la variable LAMTEC_PASSWORD")
+
+    # Snapshots MRP, telemetría y logo en una carpeta temporal para no tocar datos/
+    directorio_original = os.getcwd()
+    temporal = tempfile.mkdtemp(prefix="lamtec_carga_")
+    shutil.copytree(os.path.join(RAIZ, "static"), os.path.join(temporal, "static"))
+    os.chdir(temporal)
+    preparar_apptest_concurrente()
+    try:
+        print(f"Generando reportes sintéticos de {args.filas:,} filas...", file=sys.stderr)
+        datos = preparar_datos(args.filas, args.semilla)
+
+        niveles = []
+        for n in args.sesiones:
+            print(f"Corriendo {n} sesiones concurrentes...", file=sys.stderr)
+            niveles.append(ejecutar_nivel(n, datos, args.password, args.iteraciones, args.semilla, args.timeout))
+    finally:
+        os.chdir(directorio_original)
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    reporte = {
+        "generado": datetime.datetime.now().isoformat(timespec="seconds"),
+        "filas": args.filas,
+        "iteraciones": args.iteraciones,
+        "niveles": niveles,
+    }
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+    return 1 if any(nivel["errores"] for nivel in niveles) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
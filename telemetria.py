@@ -0,0 +1,303 @@
+# telemetria.py
+"""
+Historial de reruns en un JSONL rotativo y página de análisis de latencias.
+
+Cada rerun que cierra el perfilador se escribe como una línea JSON con la página,
+la acción, las huellas de los datasets en sesión, las filas que dejaron los
+filtros, el tiempo por etapa, los hits/misses de caché y la memoria pico.
+"""
+import glob
+import json
+import logging
+import os
+import sys
+from logging.handlers import RotatingFileHandler
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from perfilador import ETAPAS, tamano_carga
+from utils import huella_dataframe
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DIRECTORIO_TELEMETRIA = os.path.join("datos", "telemetria")
+ARCHIVO_TELEMETRIA = os.path.join(DIRECTORIO_TELEMETRIA, "reruns.jsonl")
+MAX_BYTES_TELEMETRIA = 5 * 1024 * 1024
+RESPALDOS_TELEMETRIA = 5
+
+# Datasets de session_state cuya huella se guarda con cada rerun
+DATASETS_TELEMETRIA = [
+    "df_clean", "df_plan", "df_downtime_procesado", "df_orders", "df_sales", "cubo_ventas",
+    "df_ordenes_plataforma", "df_escalera", "cubo_escalera", "df_forecast_compras",
+    "diario_timecard",
+]
+
+_logger = logging.getLogger("lamtec.telemetria")
+
+
+def _logger_telemetria():
+    """Logger con RotatingFileHandler, creado una sola vez por proceso."""
+    if not _logger.handlers:
+        os.makedirs(DIRECTORIO_TELEMETRIA, exist_ok=True)
+        handler = RotatingFileHandler(
+            ARCHIVO_TELEMETRIA, maxBytes=MAX_BYTES_TELEMETRIA, backupCount=RESPALDOS_TELEMETRIA, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _logger
+
+
+def memoria_pico_mb():
+    """Memoria residente pico del proceso en MB (None en Windows)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _datasets_en_sesion():
+    """
+    Huella y memoria de cada dataset cargado en la sesión. Se recalculan solo cuando cambia el objeto.
+    """
+    memo = st.session_state.setdefault("_telemetria_huellas", {})
+    datasets = {}
+    for llave in DATASETS_TELEMETRIA:
+        objeto = st.session_state.get(llave)
+        if objeto is None:
+            memo.pop(llave, None)
+            continue
+        if llave in memo and memo[llave][0] == id(objeto):
+            datasets[llave] = memo[llave][1:]
+            continue
+        if isinstance(objeto, pd.DataFrame):
+            huella = huella_dataframe(objeto)[:16]
+        elif isinstance(objeto, dict) and "huellas" in objeto:
+            huella = ",".join(h[:16] for h in objeto["huellas"])
+        else:
+            continue
+        memo[llave] = (id(objeto), huella, tamano_carga(objeto))
+        datasets[llave] = memo[llave][1:]
+    return datasets
+
+
+def huellas_datasets():
+    return {llave: huella for llave, (huella, _) in _datasets_en_sesion().items()}
+
+
+def bytes_datasets():
+    return {llave: n for llave, (_, n) in _datasets_en_sesion().items()}
+
+
+def registro_rerun(perfil):
+    """
+    Convierte el perfil de un rerun (perfilador.finalizar_rerun) en un registro plano para el log.
+    - perfil: dict devuelto por finalizar_rerun().
+    """
+    etapas = dict.fromkeys(ETAPAS, 0.0)
+    secciones = {}
+    filtros = {}
+    for registro in perfil["secciones"]:
+        etapas[registro["etapa"]] = etapas.get(registro["etapa"], 0.0) + registro["propio"]
+        secciones[registro["nombre"]] = secciones.get(registro["nombre"], 0.0) + registro["propio"]
+        if registro["etapa"] == "filtro" and registro["filas"] is not None:
+            filtros[registro["nombre"]] = registro["filas"]
+    etapas["sin medir"] = max(perfil["total"] - sum(etapas.values()), 0.0)
+
+    ctx = get_script_run_ctx()
+    return {
+        "fecha": perfil["inicio"].isoformat(timespec="milliseconds"),
+        "sesion": ctx.session_id if ctx is not None else None,
+        "pagina": perfil["pagina"],
+        "accion": perfil["accion"],
+        "total_ms": round(perfil["total"] * 1000, 2),
+        "etapas_ms": {etapa: round(segundos * 1000, 2) for etapa, segundos in etapas.items()},
+        "secciones_ms": {nombre: round(segundos * 1000, 2) for nombre, segundos in secciones.items()},
+        "filtros_filas": filtros,
+        "cache": {
+            funcion: {"hits": c["hits"], "misses": c["misses"], "ms_miss": round(c["segundos_miss"] * 1000, 2)}
+            for funcion, c in perfil["cache"].items()
+        },
+        "datasets": huellas_datasets(),
+        "rss_pico_mb": memoria_pico_mb(),
+    }
+
+
+def registrar_rerun(perfil):
+    """Agrega el rerun al log JSONL. Un error de escritura nunca interrumpe la app."""
+    if perfil is None:
+        return
+    try:
+        _logger_telemetria().info(json.dumps(registro_rerun(perfil), ensure_ascii=False, default=str))
+    except Exception as e:
+        print(f"Error al registrar telemetría: {e}")
+
+
+# 📈 ANÁLISIS DEL LOG
+
+def archivos_telemetria():
+    """Log actual y respaldos rotados, del más antiguo al más reciente."""
+    archivos = glob.glob(ARCHIVO_TELEMETRIA + ".*") + glob.glob(ARCHIVO_TELEMETRIA)
+    return sorted(archivos, key=os.path.getmtime)
+
+
+@st.cache_data(show_spinner="Leyendo telemetría...", max_entries=5)
+def leer_telemetria(firma):
+    """
+    Lee todos los registros del log en un DataFrame plano (etapas y caché como columnas).
+    - firma: tupla (archivo, mtime, tamaño) de los archivos; invalida la caché al rotar o crecer el log.
+    """
+    registros = []
+    for archivo, _, _ in firma:
+        with open(archivo, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registros.append(json.loads(linea))
+                except json.JSONDecodeError:
+                    continue
+    if not registros:
+        return pd.DataFrame()
+
+    # La caché (función → contadores) queda como columna de dicts; lo demás se aplana un nivel
+    caches = [r.pop("cache", {}) for r in registros]
+    df = pd.json_normalize(registros, sep="|", max_level=1)
+    df["cache"] = caches
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    df["accion"] = df["accion"].fillna("—")
+    return df.sort_values("fecha", ignore_index=True)
+
+
+def firma_telemetria():
+    return tuple((a, os.path.getmtime(a), os.path.getsize(a)) for a in archivos_telemetria())
+
+
+def _percentiles(df, por, columna):
+    agrupado = df.groupby(por, observed=True)[columna]
+    return pd.DataFrame({
+        "Reruns": agrupado.size(),
+        "p50 ms": agrupado.quantile(0.5).round(1),
+        "p95 ms": agrupado.quantile(0.95).round(1),
+        "máx ms": agrupado.max().round(1),
+    }).reset_index()
+
+
+def latencias_por_pagina(df):
+    """p50/p95 del rerun completo por página y acción."""
+    return _percentiles(df, ["pagina", "accion"], "total_ms").sort_values("p95 ms", ascending=False)
+
+
+def latencias_por_etapa(df):
+    """p50/p95 del tiempo propio de cada etapa, por página."""
+    columnas = [c for c in df.columns if c.startswith("etapas_ms|")]
+    largo = df.melt(id_vars=["pagina"], value_vars=columnas, var_name="etapa", value_name="ms").dropna()
+    largo["etapa"] = largo["etapa"].str.split("|").str[1]
+    return _percentiles(largo, ["pagina", "etapa"], "ms")
+
+
+def latencias_por_dataset(df, dataset):
+    """p50/p95 por huella de un dataset: distingue qué archivo cargado trajo una regresión."""
+    columna = f"datasets|{dataset}"
+    if columna not in df.columns:
+        return pd.DataFrame()
+    con_dataset = df.dropna(subset=[columna])
+    resumen = _percentiles(con_dataset, ["pagina", columna], "total_ms").rename(columns={columna: "Huella"})
+    vistas = con_dataset.groupby(columna)["fecha"].agg(["min", "max"]).rename(
+        columns={"min": "Primera vez", "max": "Última vez"})
+    return resumen.merge(vistas, left_on="Huella", right_index=True).sort_values("Primera vez")
+
+
+def resumen_cache(df):
+    """Hits, misses y tiempo de cómputo en miss por función cacheada."""
+    filas = []
+    for cache in df["cache"]:
+        for funcion, c in cache.items():
+            filas.append({"Función": funcion, **c})
+    if not filas:
+        return pd.DataFrame()
+    detalle = pd.DataFrame(filas)
+    resumen = detalle.groupby("Función").agg(
+        Hits=("hits", "sum"), Misses=("misses", "sum"), ms_miss=("ms_miss", "sum")
+    )
+    resumen["% hit"] = (resumen["Hits"] / (resumen["Hits"] + resumen["Misses"]) * 100).round(1)
+    resumen["ms por miss"] = (resumen.pop("ms_miss") / resumen["Misses"].where(resumen["Misses"] > 0)).round(1)
+    return resumen.reset_index().sort_values("Misses", ascending=False)
+
+
+def telemetria_app():
+    st.header("📡 Telemetría de Reruns")
+
+    firma = firma_telemetria()
+    if not firma:
+        st.info("Aún no hay reruns registrados.")
+        return
+
+    df = leer_telemetria(firma)
+    if df.empty:
+        st.info("Aún no hay reruns registrados.")
+        return
+
+    # Los reruns de esta misma página no entran al análisis
+    df = df[df["pagina"] != "Telemetría"]
+
+    fecha_min, fecha_max = df["fecha"].min().date(), df["fecha"].max().date()
+    fechas = st.sidebar.date_input(
+        "Rango de fechas", value=(fecha_min, fecha_max), min_value=fecha_min, max_value=fecha_max
+    )
+    if isinstance(fechas, tuple) and len(fechas) == 2:
+        df = df[(df["fecha"].dt.date >= fechas[0]) & (df["fecha"].dt.date <= fechas[1])]
+
+    paginas = sorted(df["pagina"].unique())
+    paginas_sel = st.sidebar.multiselect("Página(s)", paginas, default=paginas)
+    df = df[df["pagina"].isin(paginas_sel)]
+    if df.empty:
+        st.warning("No hay reruns con los filtros seleccionados.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Reruns", f"{len(df):,}")
+    col2.metric("p95 del rerun", f"{df['total_ms'].quantile(0.95):,.0f} ms")
+    if df["rss_pico_mb"].notna().any():
+        col3.metric("Memoria pico", f"{df['rss_pico_mb'].max():,.0f} MB")
+
+    st.subheader("⏱️ Latencia por página y acción")
+    st.dataframe(latencias_por_pagina(df), hide_index=True, use_container_width=True)
+
+    st.subheader("🧩 Latencia por etapa")
+    por_etapa = latencias_por_etapa(df)
+    fig = px.bar(
+        por_etapa, x="pagina", y="p95 ms", color="etapa", barmode="group",
+        category_orders={"etapa": ETAPAS + ["sin medir"]}, title="p95 por etapa"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(por_etapa, hide_index=True, use_container_width=True)
+
+    st.subheader("📈 p95 diario por página")
+    diario = (
+        df.groupby([df["fecha"].dt.date.rename("Día"), "pagina"])["total_ms"]
+        .quantile(0.95).rename("p95 ms").reset_index()
+    )
+    fig = px.line(diario, x="Día", y="p95 ms", color="pagina", markers=True)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("🗂️ Latencia por archivo cargado")
+    datasets = [c.split("|", 1)[1] for c in df.columns if c.startswith("datasets|")]
+    if datasets:
+        dataset = st.selectbox("Dataset", datasets)
+        st.dataframe(latencias_por_dataset(df, dataset), hide_index=True, use_container_width=True)
+    else:
+        st.info("Ningún rerun tenía datasets cargados.")
+
+    st.subheader("🗄️ Caché")
+    cache = resumen_cache(df)
+    if cache.empty:
+        st.info("Sin llamadas a funciones cacheadas en el periodo.")
+    else:
+        st.dataframe(cache, hide_index=True, use_container_width=True)
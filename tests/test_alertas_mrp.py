@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def snapshot_po(lineas=20_000, tipos=12, vendors=400, pos=5_000, semilla=7):
+    rng = np.random.default_rng(semilla)
+    df_po = pd.DataFrame({
+        "Item": pd.Categorical(rng.choice([f"IT{i:05d}" for i in range(3_000)], lineas)),
+        "Type": pd.Categorical(rng.choice([f"T{i}" for i in range(tipos)], lineas)),
+        "Vendor Limpio": pd.Categorical(rng.choice([f"V{i:04d}" for i in range(vendors)], lineas)),
+        "PO_Numero": pd.Categorical(rng.choice([f"PO{i:06d}" for i in range(pos)], lineas)),
+        "Fecha Llegada": pd.Timestamp("2025-06-01") + pd.to_timedelta(rng.integers(-90, 90, lineas), "D"),
+        "Cantidad": rng.integers(1, 1_000, lineas).astype(float),
+    })
+    df_po.loc[::97, "Fecha Llegada"] = pd.NaT
+    return df_po
+
+
+def test_resumen_alertas_solo_combinaciones_observadas(monkeypatch):
+    df_po = snapshot_po()
+    monkeypatch.setattr(utils, "cargar_snapshot_mrp", lambda clave: (df_po.copy(), None))
+
+    df_alertas, resumen = utils._sin_cache(utils.alertas_snapshot_mrp)("clave", pd.Timestamp("2025-06-01"))
+
+    llave = ["Type", "Vendor Limpio", "PO_Numero"]
+    observadas = df_po.groupby(llave, observed=True).size()
+    assert len(resumen) == len(observadas)
+    assert list(resumen.columns) == utils.ESTADOS_ENTREGA
+    assert (resumen.sum(axis=1) > 0).all()
+    assert resumen.to_numpy().sum() == len(df_po)
+    pd.testing.assert_series_equal(
+        resumen.sum(axis=1), observadas.sort_index(), check_names=False, check_dtype=False
+    )
+    assert resumen["Sin fecha"].sum() == df_po["Fecha Llegada"].isna().sum()
+    assert len(df_alertas) == len(df_po)
+
+
+def test_resumen_requerimiento_conserva_lineas_sin_type(monkeypatch):
+    df_po = snapshot_po(lineas=2_000)
+    df_po.loc[::10, "Type"] = None
+    monkeypatch.setattr(utils, "cargar_snapshot_mrp", lambda clave: (df_po.copy(), None))
+
+    resumen = utils._sin_cache(utils.resumen_requerimiento_mrp)("clave")
+
+    assert resumen["Cantidad"].sum() == df_po["Cantidad"].sum()
+    assert resumen["Lineas_PO"].sum() == len(df_po)
+    assert resumen["Type"].isna().any()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpis import carga_plan_por_dia, capacidad_por_dia
+
+
+def _carga_job_por_job(df_plan, dias_laborales):
+    """Referencia lenta: un renglón por job y día laboral."""
+    renglones = []
+    for _, job in df_plan.iterrows():
+        dias = pd.date_range(job["Starts On"].normalize(), job["Ends On"].normalize(), freq="D")
+        laborales = [d for d in dias if d.dayofweek in dias_laborales] or list(dias)
+        corrida = (job["Total Hrs."] - job["Setup Hrs."]) / len(laborales)
+        for i, dia in enumerate(laborales):
+            renglones.append((job["W/C"], dia, job["Setup Hrs."] if i == 0 else 0.0, corrida))
+    carga = pd.DataFrame(renglones, columns=["W/C", "Día", "Setup (hrs)", "Corrida (hrs)"])
+    return carga.groupby(["W/C", "Día"]).sum().reset_index()
+
+
+@pytest.fixture
+def plan():
+    rng = np.random.default_rng(0)
+    n = 300
+    inicio = pd.Timestamp("2025-06-02") + pd.to_timedelta(rng.integers(0, 60, n), unit="D")
+    return pd.DataFrame({
+        "W/C": rng.choice(["PRESS01", "PRESS02", "WELD01"], n),
+        "Starts On": inicio,
+        "Ends On": inicio + pd.to_timedelta(rng.integers(0, 12, n), unit="D"),
+        "Setup Hrs.": rng.uniform(0, 2, n).round(2),
+        "Total Hrs.": rng.uniform(2, 80, n).round(2),
+    })
+
+
+@pytest.mark.parametrize("dias_laborales", [range(5), range(7)])
+def test_reparto_igual_que_job_por_job(plan, dias_laborales):
+    carga = carga_plan_por_dia(plan, dias_laborales=dias_laborales)
+    esperado = _carga_job_por_job(plan, dias_laborales)
+
+    carga = carga[carga["Carga (hrs)"] > 0].reset_index(drop=True)
+    pd.testing.assert_frame_equal(carga.drop(columns="Carga (hrs)"), esperado, check_dtype=False)
+
+
+def test_fin_de_semana_sin_carga_ni_sobrecarga(plan):
+    # Los jobs que solo caen en sábado y domingo se quedan ahí (siguiente prueba)
+    plan = plan[np.busday_count(plan["Starts On"].to_numpy("M8[D]"), plan["Ends On"].to_numpy("M8[D]") + 1) > 0]
+    desde, hasta = pd.Timestamp("2025-06-01"), pd.Timestamp("2025-08-31")
+    carga = carga_plan_por_dia(plan, desde, hasta)
+    tabla = capacidad_por_dia(carga, 16.0, desde, hasta)
+
+    fin_de_semana = tabla["Día"].dt.dayofweek >= 5
+    assert tabla.loc[fin_de_semana, "Carga (hrs)"].sum() == 0
+    assert plan["Total Hrs."].sum() == pytest.approx(carga["Carga (hrs)"].sum())
+
+
+def test_job_solo_en_fin_de_semana_conserva_sus_horas():
+    plan = pd.DataFrame({
+        "W/C": ["PRESS01"], "Starts On": [pd.Timestamp("2025-06-07")], "Ends On": [pd.Timestamp("2025-06-08")],
+        "Setup Hrs.": [1.0], "Total Hrs.": [9.0],
+    })
+    carga = carga_plan_por_dia(plan)
+    assert list(carga["Carga (hrs)"]) == [5.0, 4.0]
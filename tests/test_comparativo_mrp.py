@@ -0,0 +1,27 @@
+import pandas as pd
+
+import utils
+
+
+def _snapshot(items, types):
+    # Como quedan al guardarlos (compactar_snapshot_mrp): categorías propias de cada archivo
+    n = len(items)
+    return pd.DataFrame({
+        "Item": pd.Categorical(items),
+        "Type": pd.Categorical(types),
+        "Vendor Limpio": pd.Categorical(["ACME"] * n),
+        "PO_Numero": pd.Categorical(["PO1"] * n),
+        "Fecha Llegada": pd.to_datetime(["2025-07-01"] * n),
+        "Cantidad": [10.0] * n,
+    })
+
+
+def test_snapshots_con_types_distintos():
+    diff = utils.comparar_snapshots_mrp(
+        _snapshot(["A", "B"], ["X", "Y"]), _snapshot(["A", "C"], ["X", "Z"])
+    ).reset_index()
+
+    cambios = dict(zip(diff["Item"], diff["Cambio"]))
+    tipos = dict(zip(diff["Item"], diff["Type"]))
+    assert cambios == {"A": "Sin Cambio", "B": "Eliminada", "C": "Nueva"}
+    assert tipos == {"A": "X", "B": "Y", "C": "Z"}
@@ -0,0 +1,53 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from consultas import _BaseConsultas
+
+
+@pytest.fixture
+def base():
+    timecard = pd.DataFrame({
+        "W/C": ["PRESS01", "PRESS02", "WELD01"],
+        "Job #": [1, 2, 3],
+        "Completed On": pd.to_datetime(["2025-06-01", "2025-06-02", "2025-06-03"]),
+        "Hours": [8.0, 7.5, 6.0],
+    })
+    return _BaseConsultas({"timecard": timecard})
+
+
+@pytest.mark.parametrize("sql", [
+    "PRAGMA query_only = OFF",
+    "PRAGMA writable_schema = ON",
+    "DROP TABLE timecard",
+    """INSERT INTO timecard ("W/C") VALUES ('X')""",
+    "DELETE FROM timecard",
+    "CREATE TABLE otra (x)",
+    "ATTACH DATABASE ':memory:' AS otra",
+])
+def test_rechaza_lo_que_no_es_lectura(base, sql):
+    with pytest.raises(sqlite3.DatabaseError):
+        base.consultar(sql, 10)
+
+
+def test_drop_despues_de_intentar_apagar_query_only(base):
+    with pytest.raises(sqlite3.DatabaseError):
+        base.consultar("PRAGMA query_only = OFF", 10)
+    with pytest.raises(sqlite3.DatabaseError):
+        base.consultar("DROP TABLE timecard", 10)
+    resultado, _ = base.consultar("SELECT COUNT(*) AS n FROM timecard", 10)
+    assert resultado["n"].iloc[0] == 3
+
+
+def test_permite_consultas_de_lectura(base):
+    resultado, truncada = base.consultar('SELECT "W/C", SUM(Hours) AS h FROM timecard GROUP BY 1 ORDER BY 1', 2)
+    assert list(resultado["W/C"]) == ["PRESS01", "PRESS02"]
+    assert truncada
+
+    resultado, _ = base.consultar("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 5) "
+                                  "SELECT MAX(x) AS m FROM c", 10)
+    assert resultado["m"].iloc[0] == 5
+
+    resultado, _ = base.consultar("PRAGMA table_info(timecard)", 10)
+    assert "Hours" in set(resultado["name"])
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import utils
+
+
+@pytest.fixture(autouse=True)
+def directorio_temporal(tmp_path, monkeypatch):
+    _usar_directorio(str(tmp_path), monkeypatch.setattr)
+
+
+def _usar_directorio(directorio, asignar=setattr):
+    asignar(utils, "DIRECTORIO_DATASETS", directorio)
+    asignar(utils, "INDICE_DATASETS", os.path.join(directorio, "indice.json"))
+    asignar(utils, "CANDADO_DATASETS", os.path.join(directorio, "indice.json.lock"))
+
+
+def _publicar_en_proceso(directorio, proceso):
+    _usar_directorio(directorio)
+    for i in range(10):
+        huella = f"{proceso:02d}{i:02d}".ljust(64, "0")
+        utils.publicar_dataset(f"tabla{proceso}", pd.DataFrame({"x": [i]}), "exporte.xlsx", huella)
+
+
+def test_hilos_no_pierden_exportes_procesados():
+    huellas = [f"{i:064x}" for i in range(40)]
+    hilos = [threading.Thread(target=utils.marcar_exporte_procesado, args=(h,)) for h in huellas]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sorted(utils._leer_indice_datasets()["procesados"]) == huellas
+    assert not [n for n in os.listdir(utils.DIRECTORIO_DATASETS) if n.endswith(".tmp")]
+
+
+def test_procesos_no_pierden_datasets_publicados():
+    contexto = multiprocessing.get_context("spawn")
+    procesos = [
+        contexto.Process(target=_publicar_en_proceso, args=(utils.DIRECTORIO_DATASETS, p)) for p in range(4)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(timeout=60)
+        assert proceso.exitcode == 0
+
+    indice = utils._leer_indice_datasets()
+    assert sorted(indice["datasets"]) == [f"tabla{p}" for p in range(4)]
+    assert len(indice["procesados"]) == 40
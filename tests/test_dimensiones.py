@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+import dimensiones
+
+
+@pytest.fixture(autouse=True)
+def directorio_temporal(tmp_path, monkeypatch):
+    monkeypatch.setattr(dimensiones, "DIRECTORIO_DIMENSIONES", str(tmp_path))
+    monkeypatch.setattr(dimensiones, "_tablas", {})
+
+
+def test_el_tipo_del_renglon_manda_sobre_el_de_la_dimension():
+    timecard = dimensiones.con_llaves(pd.DataFrame({"W/C": ["A", "A", "B"], "W/C Type": ["PRESS", "PRESS", "WELD"]}))
+    # Scheduled Jobs le asigna otro tipo a A: la dimensión queda con el último
+    dimensiones.con_llaves(pd.DataFrame({"W/C": ["A"], "W/C Type": ["ASSY"]}))
+
+    filtrado = dimensiones.filtrar_por_dimension(timecard, "wc", ["PRESS"], atributo="W/C Type")
+    assert list(filtrado["W/C"]) == ["A", "A"]
+
+
+def test_downtime_toma_el_tipo_de_la_dimension():
+    dimensiones.con_llaves(pd.DataFrame({"W/C": ["A", "B"], "W/C Type": ["PRESS", "WELD"]}))
+    downtime = dimensiones.con_llaves(pd.DataFrame({"W/C": ["A", "B", "B"], "Horas Downtime": [1.0, 2.0, 3.0]}))
+
+    filtrado = dimensiones.filtrar_por_dimension(downtime, "wc", ["WELD"], atributo="W/C Type")
+    assert filtrado["Horas Downtime"].sum() == 5.0
+
+
+def test_busqueda_normaliza_igual_que_al_guardar():
+    df = dimensiones.con_llaves(pd.DataFrame({"W/C": [" PRESS01 ", "WELD01"], "W/C Type": [" PRESS", "WELD "]}))
+    assert len(dimensiones.llaves_de("wc", ["PRESS01 "])) == 1
+    assert len(dimensiones.filtrar_por_dimension(df, "wc", [" PRESS01"])) == 1
+    assert list(dimensiones.llaves_por_atributo("wc", "W/C Type", ["PRESS"])) == list(df["id_wc"].iloc[:1])
+
+
+def _asignar_en_proceso(directorio, valores, cola):
+    dimensiones.DIRECTORIO_DIMENSIONES = directorio
+    cola.put(dict(zip(valores, dimensiones.asignar_llaves("item", pd.Series(valores)).tolist())))
+
+
+def test_procesos_concurrentes_no_reparten_la_misma_llave(tmp_path):
+    import multiprocessing
+
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    lotes = [[f"P{p}-{i}" for i in range(200)] + ["COMUN"] for p in range(4)]
+    procesos = [contexto.Process(target=_asignar_en_proceso, args=(str(tmp_path), lote, cola)) for lote in lotes]
+    for proceso in procesos:
+        proceso.start()
+    asignadas = [cola.get(timeout=60) for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+
+    registro = dimensiones.dimension("item").set_index("Item")["id_item"]
+    for llaves in asignadas:
+        assert all(registro[valor] == llave for valor, llave in llaves.items())
+    assert len(registro) == 4 * 200 + 1
+    assert registro.is_unique
@@ -0,0 +1,52 @@
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def _archivo(columnas, filas):
+    salida = BytesIO()
+    pd.DataFrame(filas, columns=columnas).to_excel(salida, index=False)
+    return BytesIO(salida.getvalue())
+
+
+def test_encabezados_numericos_no_son_fechas():
+    archivo = _archivo(
+        ["Item", 1, 2024, "Total", datetime(2025, 7, 7), "14/07/2025"],
+        [["A", 5, 6, 7, 10.0, 20.0], ["B", 5, 6, 7, 30.0, 40.0]],
+    )
+    items, fechas, valores = utils._sin_cache(utils.leer_archivo_escalera)(None, archivo)
+
+    assert list(fechas) == [pd.Timestamp("2025-07-07"), pd.Timestamp("2025-07-14")]
+    assert list(items) == ["A", "B"]
+    np.testing.assert_array_equal(valores, [[10.0, 20.0], [30.0, 40.0]])
+
+
+def test_archivo_sin_encabezados_de_fecha():
+    archivo = _archivo(["Item", 1, 2, 3], [["A", 1, 2, 3]])
+    assert utils._sin_cache(utils.leer_archivo_escalera)(None, archivo) is None
+
+
+def test_varios_snapshots_de_una_vez_igual_que_uno_por_uno():
+    rng = np.random.default_rng(3)
+    snapshots = []
+    for k in range(6):
+        items = np.array(sorted(rng.choice([f"IT{i:03d}" for i in range(60)], 25, replace=False)), dtype=object)
+        fechas = pd.date_range("2025-07-07", periods=8, freq="W-MON") + pd.Timedelta(weeks=k)
+        snapshots.append((f"Archivo_{k + 1}", str(k), items, fechas, rng.integers(0, 100, (25, 8)).astype(float)))
+
+    de_una_vez = utils.agregar_snapshots_escalera(None, snapshots)
+    uno_por_uno = None
+    for snapshot in snapshots:
+        uno_por_uno = utils.agregar_snapshots_escalera(uno_por_uno, [snapshot])
+    en_dos = utils.agregar_snapshots_escalera(utils.agregar_snapshots_escalera(None, snapshots[:2]), snapshots[2:])
+
+    for cubo in (uno_por_uno, en_dos):
+        assert cubo["items"].equals(de_una_vez["items"])
+        assert cubo["fechas"].equals(de_una_vez["fechas"])
+        assert cubo["huellas"] == de_una_vez["huellas"] == [str(k) for k in range(6)]
+        np.testing.assert_array_equal(cubo["valores"], de_una_vez["valores"])
+    pd.testing.assert_frame_equal(utils.tabla_escalera(de_una_vez), utils.tabla_escalera(uno_por_uno))
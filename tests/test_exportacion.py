@@ -0,0 +1,34 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def test_nombres_de_hoja_validos_y_unicos():
+    hojas = {
+        "Plataforma Destino Día por Semana": pd.DataFrame({"x": [1]}),
+        "Plataforma Destino Día por Semana 2": pd.DataFrame({"x": [2]}),
+        "Q1/Q2 [MXN]: ¿total?": pd.DataFrame({"x": [3]}),
+        "RESUMEN": pd.DataFrame({"x": [4]}),
+        "Resumen": pd.DataFrame({"x": [5]}),
+    }
+    libro = pd.read_excel(BytesIO(utils.exportar_reporte_excel(hojas)), sheet_name=None)
+
+    nombres = list(libro)
+    assert len({n.lower() for n in nombres}) == len(hojas)
+    assert all(len(n) <= 31 and not utils.CARACTERES_INVALIDOS_HOJA.search(n) for n in nombres)
+    assert [int(df["x"].iloc[0]) for df in libro.values()] == [1, 2, 3, 4, 5]
+
+
+def test_escritura_por_bloques_conserva_valores_y_vacios(monkeypatch):
+    monkeypatch.setattr(utils, "FILAS_POR_BLOQUE_EXCEL", 7)
+    df = pd.DataFrame({
+        "Item": [f"IT{i}" if i % 5 else np.nan for i in range(30)],
+        "Cantidad": np.where(np.arange(30) % 4 == 0, np.nan, np.arange(30.0)),
+        "Fecha": pd.date_range("2025-06-01", periods=30).where(np.arange(30) % 6 != 0),
+    })
+    leido = pd.read_excel(BytesIO(utils.exportar_reporte_excel({"Datos": df})))
+
+    pd.testing.assert_frame_equal(leido, df, check_dtype=False)
@@ -0,0 +1,71 @@
+"""
+perfilador.py, metricas.py y prueba_carga.py se enganchan a partes internas de Streamlit
+(probadas con la versión fijada en requirements.txt). Si una actualización las mueve,
+estas pruebas fallan en lugar de que los contadores dejen de moverse sin avisar.
+"""
+import inspect
+import os
+
+import streamlit
+from streamlit.delta_generator import DeltaGenerator
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.cache_utils import CachedFunc
+from streamlit.runtime.session_manager import SessionManager
+from streamlit.testing.v1 import AppTest, app_test
+
+import perfilador
+
+
+def _version_fijada():
+    with open(os.path.join(os.path.dirname(__file__), "..", "requirements.txt"), "rb") as f:
+        contenido = f.read()
+    texto = contenido.decode("utf-16" if contenido[:2] in (b"\xff\xfe", b"\xfe\xff") else "utf-8")
+    return next(linea.split("==")[1].strip() for linea in texto.splitlines() if linea.startswith("streamlit=="))
+
+
+def test_version_de_streamlit_fijada():
+    assert streamlit.__version__ == _version_fijada()
+
+
+def test_atributos_internos_existen():
+    # perfilador: hits/misses de caché y elementos que se envuelven
+    assert callable(CachedFunc._handle_cache_hit)
+    assert callable(CachedFunc._handle_cache_miss)
+    assert all(hasattr(DeltaGenerator, nombre) for nombre in perfilador.ELEMENTOS_RENDER)
+    # metricas: sesiones conectadas
+    assert "self._session_mgr" in inspect.getsource(Runtime.__init__)
+    assert hasattr(SessionManager, "num_active_sessions")
+    # prueba_carga: Runtime simulado de AppTest
+    assert app_test.Runtime is Runtime
+    assert hasattr(Runtime, "_instance")
+
+
+def _pagina_instrumentada():
+    import pandas as pd
+    import streamlit as st
+
+    import perfilador
+
+    perfilador.instrumentar_streamlit()
+
+    @st.cache_data
+    def doble(x):
+        return x * 2
+
+    perfil = perfilador.iniciar_rerun("prueba")
+    doble(21)
+    doble(21)
+    st.dataframe(pd.DataFrame({"x": [1, 2]}))
+    st.session_state.cache = {nombre: dict(c) for nombre, c in perfil["cache"].items()}
+    st.session_state.secciones = [s["nombre"] for s in perfil["secciones"]]
+    perfilador.finalizar_rerun()
+
+
+def test_hooks_de_cache_y_render_se_llaman():
+    at = AppTest.from_function(_pagina_instrumentada, default_timeout=30)
+    at.run()
+    assert not at.exception
+
+    contador = next(c for nombre, c in at.session_state["cache"].items() if nombre.endswith("doble"))
+    assert (contador["hits"], contador["misses"]) == (1, 1)
+    assert "st.dataframe" in at.session_state["secciones"]
@@ -1,10 +1,19 @@
 # utils.py
 import pandas as pd
+import numpy as np
 import streamlit as st
 import io
+import os
+import json
+import hashlib
+import re
+import tempfile
 import plotly.express as px
 from datetime import datetime
 from io import BytesIO
+from candados import candado_archivo
+from metricas import medir_lectura
+from dimensiones import con_llaves, filtrar_por_dimension
 
 # Columnas requeridas para Production Efficiency
 required_columns = [
@@ -43,6 +52,7 @@ columnas_sales = [
 
 # Función para cargar Production Efficiency
 @st.cache_data
+@medir_lectura
 def cargar_reporte_produccion(file):
     df = pd.read_excel(file)
     if list(df.columns) != required_columns:
@@ -53,6 +63,7 @@ def cargar_reporte_produccion(file):
 
 # Función para cargar Scheduled Jobs
 @st.cache_data
+@medir_lectura
 def cargar_programacion(file):
     df = pd.read_excel(file)
     if list(df.columns) != required_columns_plan:
@@ -133,6 +144,7 @@ catalogo_downtime = pd.DataFrame({
 
 # Extraer DownTime
 @st.cache_data
+@medir_lectura
 def cargar_downtime(file):
     try:
         df_raw = pd.read_excel(
@@ -189,18 +201,18 @@ def filtrar_downtime(df_downtime, fechas=None, turnos=None, wc_types=None, wcs=N
         if "Shift" in df_filtrado.columns:
             df_filtrado = df_filtrado[df_filtrado["Shift"].isin(turnos)]
 
+    # Downtime no trae W/C Type: se toma de la dimensión W/C por su llave
     if wc_types is not None:
-        if "W/C Type" in df_filtrado.columns:
-            df_filtrado = df_filtrado[df_filtrado["W/C Type"].isin(wc_types)]
+        df_filtrado = filtrar_por_dimension(df_filtrado, "wc", wc_types, atributo="W/C Type")
 
     if wcs is not None:
-        if "W/C" in df_filtrado.columns:
-            df_filtrado = df_filtrado[df_filtrado["W/C"].isin(wcs)]
+        df_filtrado = filtrar_por_dimension(df_filtrado, "wc", wcs)
 
     return df_filtrado
 
 # Función para cargar cualquier archivo y extraer solo las columnas requeridas
 @st.cache_data
+@medir_lectura
 def cargar_datos_columnas_requeridas(file, columnas_requeridas, skiprows=0):
     """Carga un archivo Excel, limpia encabezados y devuelve columnas requeridas."""
     try:
@@ -238,6 +250,7 @@ def cargar_datos_columnas_requeridas(file, columnas_requeridas, skiprows=0):
     except Exception as e:
         return None, f"Error al cargar el archivo: {str(e)}"
 
+@medir_lectura
 def leer_mrp_excel(ruta_archivo, hoja=0):
     df_raw = pd.read_excel(ruta_archivo, sheet_name=hoja)
 
@@ -281,11 +294,651 @@ def leer_mrp_excel(ruta_archivo, hoja=0):
                 'Proveedor_PO': row.iloc[5]
             })
 
-    df_po = pd.DataFrame(df_po_rows)
+    df_po = pd.DataFrame(
+        df_po_rows,
+        columns=['Item', 'Type', 'Fecha Llegada', 'Fecha Envío', 'Cantidad', 'Proveedor_PO']
+    )
     df_sin_requerimiento = pd.DataFrame(df_sin_req_rows)
 
+    # Vendor y P/O se extraen una sola vez al leer el archivo
+    df_po[["Vendor Limpio", "PO_Numero"]] = extraer_vendor_po(df_po["Proveedor_PO"])
+
     return df_po, df_sin_requerimiento
 
+def extraer_vendor_po(proveedor_po):
+    """
+    Extrae de forma vectorizada el Vendor y el número de P/O de la columna Proveedor_PO.
+    Devuelve un DataFrame con columnas categóricas: Vendor Limpio, PO_Numero.
+    """
+    texto = proveedor_po.astype(str)
+    vacios = proveedor_po.isna()
+
+    vendor = (
+        texto.str.extract(r"(?s)Vendor(.*?)(?:P/O|Vendor|$)", expand=False)
+             .str.strip(", ")
+             .str.strip()
+    )
+    po_numero = (
+        texto.str.extract(r"(?s)P/O #(.*?)(?:,|P/O #|$)", expand=False)
+             .str.strip()
+    )
+
+    return pd.DataFrame({
+        "Vendor Limpio": vendor.mask(vacios).fillna("Sin Vendor").astype("category"),
+        "PO_Numero": po_numero.mask(vacios).fillna("Sin P/O").astype("category"),
+    }, index=proveedor_po.index)
+
+def comparar_snapshots_mrp(df_po_antes, df_po_despues):
+    """
+    Compara dos snapshots MRP línea por línea de PO.
+    Cada línea se identifica por (Item, PO_Numero, Fecha Llegada) y se clasifica como
+    Nueva, Eliminada, Reprogramada, Cambio de Cantidad o Sin Cambio.
+
+    Devuelve un DataFrame indexado y ordenado por (Type, Vendor Limpio, PO_Numero, Item)
+    para que los filtros del comparativo sean búsquedas sobre el índice.
+    """
+    llave = ["Item", "PO_Numero", "Fecha Llegada"]
+
+    def agrupar(df_po, columna):
+        # Los snapshots guardan Type e Item como categorías propias de cada archivo; con
+        # categorías distintas el merge y el fillna de abajo fallan
+        df_po = df_po.astype({"Vendor Limpio": str, "PO_Numero": str, "Type": object, "Item": object})
+        return df_po.groupby(llave, dropna=False, observed=True).agg(**{
+            columna: ("Cantidad", "sum"),
+            "Type": ("Type", "first"),
+            "Vendor Limpio": ("Vendor Limpio", "first"),
+        }).reset_index()
+
+    antes = agrupar(df_po_antes, "Cantidad Antes")
+    despues = agrupar(df_po_despues, "Cantidad Después")
+
+    diff = antes.merge(despues, on=llave, how="outer", suffixes=(" Antes", ""), indicator=True)
+    diff["Type"] = diff["Type"].fillna(diff["Type Antes"])
+    diff["Vendor Limpio"] = diff["Vendor Limpio"].fillna(diff["Vendor Limpio Antes"])
+    diff["En Antes"] = diff["_merge"] != "right_only"
+    diff["En Después"] = diff["_merge"] != "left_only"
+    diff[["Cantidad Antes", "Cantidad Después"]] = diff[["Cantidad Antes", "Cantidad Después"]].fillna(0)
+    diff["Diferencia"] = diff["Cantidad Después"] - diff["Cantidad Antes"]
+
+    # Una P/O que pierde una fecha y gana otra se considera reprogramada
+    pares = pd.MultiIndex.from_frame(diff[["Item", "PO_Numero"]])
+    solo_antes = diff["_merge"] == "left_only"
+    solo_despues = diff["_merge"] == "right_only"
+    reprogramada = (
+        (diff["PO_Numero"] != "Sin P/O")
+        & pares.isin(pares[solo_antes])
+        & pares.isin(pares[solo_despues])
+    )
+
+    diff["Cambio"] = np.select(
+        [
+            ~solo_antes & ~solo_despues & (diff["Diferencia"] == 0),
+            ~solo_antes & ~solo_despues,
+            reprogramada,
+            solo_despues,
+        ],
+        ["Sin Cambio", "Cambio de Cantidad", "Reprogramada", "Nueva"],
+        default="Eliminada"
+    )
+    diff["Cambio"] = pd.Categorical(
+        diff["Cambio"],
+        categories=["Nueva", "Eliminada", "Reprogramada", "Cambio de Cantidad", "Sin Cambio"]
+    )
+
+    columnas = [
+        "Type", "Vendor Limpio", "PO_Numero", "Item", "Fecha Llegada",
+        "Cantidad Antes", "Cantidad Después", "Diferencia", "Cambio", "En Antes", "En Después"
+    ]
+    return diff[columnas].set_index(["Type", "Vendor Limpio", "PO_Numero", "Item"]).sort_index()
+
+# 🗂️ HISTORIAL DE SNAPSHOTS MRP
+DIRECTORIO_SNAPSHOTS_MRP = os.path.join("datos", "mrp")
+INDICE_SNAPSHOTS_MRP = os.path.join(DIRECTORIO_SNAPSHOTS_MRP, "indice.json")
+
+
+def _escribir_json_atomico(ruta, datos):
+    """Escritura atómica: temporal con nombre único en la misma carpeta y os.replace."""
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directorio, suffix=".tmp", delete=False) as f:
+        json.dump(datos, f, ensure_ascii=False, indent=1)
+    os.replace(f.name, ruta)
+
+
+def hash_contenido(file):
+    """Devuelve el hash SHA-256 del contenido de un archivo cargado."""
+    return hashlib.sha256(file.getvalue()).hexdigest()
+
+
+def compactar_snapshot_mrp(df_po, df_sin_req):
+    """Convierte un snapshot MRP a tipos compactos (categorías, fechas y números) para guardarlo en columnas."""
+    df_po = df_po.copy()
+    df_sin_req = df_sin_req.copy()
+
+    for df, columnas in [(df_po, ["Item", "Type", "Proveedor_PO"]), (df_sin_req, ["Item", "Type", "Vendor"])]:
+        for col in columnas:
+            if col in df.columns:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str)).astype("category")
+
+    for col in ["Fecha Llegada", "Fecha Envío"]:
+        df_po[col] = pd.to_datetime(df_po[col], errors="coerce")
+    df_po["Cantidad"] = pd.to_numeric(df_po["Cantidad"], errors="coerce")
+
+    for col in ["On Hand", "Demand Total"]:
+        if col in df_sin_req.columns:
+            df_sin_req[col] = pd.to_numeric(df_sin_req[col], errors="coerce")
+
+    return con_llaves(df_po), con_llaves(df_sin_req)
+
+
+def listar_snapshots_mrp():
+    """Devuelve el índice de snapshots MRP guardados, ordenado por fecha de ejecución."""
+    columnas = ["Clave", "Fecha", "Archivo", "Hash", "POs", "Sin Requerimiento"]
+    if not os.path.exists(INDICE_SNAPSHOTS_MRP):
+        return pd.DataFrame(columns=columnas)
+
+    with open(INDICE_SNAPSHOTS_MRP, encoding="utf-8") as f:
+        indice = json.load(f)
+
+    df_indice = pd.DataFrame(indice, columns=columnas)
+    df_indice["Fecha"] = pd.to_datetime(df_indice["Fecha"])
+    return df_indice.sort_values(["Fecha", "Clave"]).reset_index(drop=True)
+
+
+def guardar_snapshot_mrp(file, fecha):
+    """
+    Procesa un archivo MRP y lo guarda como snapshot en formato parquet.
+    Si ya existe un snapshot con el mismo contenido no se vuelve a leer el Excel.
+    Devuelve la clave del snapshot y si fue creado en esta llamada.
+    """
+    hash_archivo = hash_contenido(file)
+    df_indice = listar_snapshots_mrp()
+    existente = df_indice[df_indice["Hash"] == hash_archivo]
+    if not existente.empty:
+        return existente["Clave"].iloc[0], False
+
+    df_po, df_sin_req = compactar_snapshot_mrp(*leer_mrp_excel(file))
+
+    fecha = pd.Timestamp(fecha)
+    clave = f"{fecha:%Y%m%d-%H%M%S}_{hash_archivo[:16]}"
+
+    os.makedirs(DIRECTORIO_SNAPSHOTS_MRP, exist_ok=True)
+    df_po.to_parquet(os.path.join(DIRECTORIO_SNAPSHOTS_MRP, f"{clave}_po.parquet"), index=False)
+    df_sin_req.to_parquet(os.path.join(DIRECTORIO_SNAPSHOTS_MRP, f"{clave}_sin_req.parquet"), index=False)
+
+    registro = {
+        "Clave": clave,
+        "Fecha": fecha.isoformat(),
+        "Archivo": getattr(file, "name", ""),
+        "Hash": hash_archivo,
+        "POs": len(df_po),
+        "Sin Requerimiento": len(df_sin_req),
+    }
+    # El índice se relee bajo el candado: otra sesión o el vigilante pudo agregar un snapshot
+    with candado_archivo(INDICE_SNAPSHOTS_MRP + ".lock"):
+        df_indice = listar_snapshots_mrp()
+        existente = df_indice[df_indice["Hash"] == hash_archivo]
+        if not existente.empty:
+            return existente["Clave"].iloc[0], False
+        indice = df_indice.assign(Fecha=df_indice["Fecha"].map(pd.Timestamp.isoformat)).to_dict("records")
+        _escribir_json_atomico(INDICE_SNAPSHOTS_MRP, indice + [registro])
+
+    return clave, True
+
+
+@st.cache_data
+@medir_lectura
+def cargar_snapshot_mrp(clave):
+    """Lee un snapshot MRP guardado. Devuelve (df_po, df_sin_requerimiento)."""
+    df_po = pd.read_parquet(os.path.join(DIRECTORIO_SNAPSHOTS_MRP, f"{clave}_po.parquet"))
+    df_sin_req = pd.read_parquet(os.path.join(DIRECTORIO_SNAPSHOTS_MRP, f"{clave}_sin_req.parquet"))
+    return df_po, df_sin_req
+
+
+@st.cache_data
+def diff_snapshots_mrp(clave_antes, clave_despues):
+    """Diff entre dos snapshots guardados; se calcula una sola vez por par de claves."""
+    df_po_antes, _ = cargar_snapshot_mrp(clave_antes)
+    df_po_despues, _ = cargar_snapshot_mrp(clave_despues)
+    return comparar_snapshots_mrp(df_po_antes, df_po_despues)
+
+
+@st.cache_data
+def resumen_requerimiento_mrp(clave):
+    """Requerimiento total y número de líneas de PO por Item para un snapshot (también sin Type)."""
+    df_po, _ = cargar_snapshot_mrp(clave)
+    resumen = df_po.groupby(["Item", "Type"], observed=True, dropna=False).agg(
+        Cantidad=("Cantidad", "sum"),
+        Lineas_PO=("Cantidad", "size"),
+        Proxima_Llegada=("Fecha Llegada", "min")
+    ).reset_index()
+    resumen["Clave"] = clave
+    return resumen
+
+
+ESTADOS_ENTREGA = ["Atrasada >30 días", "Atrasada", "Próxima (7 días)", "Futura", "Sin fecha"]
+
+
+@st.cache_data
+def alertas_snapshot_mrp(clave, hoy):
+    """
+    Etapa de alertas de un snapshot MRP: calcula una sola vez los días de atraso (entero)
+    y clasifica cada línea de PO en Atrasada >30 días, Atrasada, Próxima (7 días) o Futura.
+
+    Devuelve:
+    - DataFrame de líneas indexado por (Type, Vendor Limpio, PO_Numero)
+    - Conteo de líneas por (Type, Vendor Limpio, PO_Numero) y estado de entrega
+    """
+    df_po, _ = cargar_snapshot_mrp(clave)
+
+    dias_atraso = (pd.Timestamp(hoy) - df_po["Fecha Llegada"]).dt.days
+    df_po["Días de Atraso"] = dias_atraso.astype("Int32")
+    df_po["Estado Entrega"] = pd.Categorical(
+        np.select(
+            [dias_atraso > 30, dias_atraso > 0, dias_atraso >= -7, dias_atraso < -7],
+            ESTADOS_ENTREGA[:4],
+            default="Sin fecha"
+        ),
+        categories=ESTADOS_ENTREGA
+    )
+
+    # Solo las combinaciones observadas: con llaves categóricas el producto cartesiano
+    # Type × Vendor × PO se vuelve millones de filas vacías (crosstab con dropna=False y
+    # SeriesGroupBy.value_counts lo generan aunque se pida observed=True)
+    llave = ["Type", "Vendor Limpio", "PO_Numero"]
+    resumen = (
+        df_po.groupby(llave + ["Estado Entrega"], observed=True).size()
+        .unstack(fill_value=0)
+        .reindex(columns=ESTADOS_ENTREGA, fill_value=0)
+        .sort_index()
+    )
+
+    df_alertas = df_po[llave + ["Item", "Fecha Llegada", "Días de Atraso", "Estado Entrega", "Cantidad"]]
+    return df_alertas.set_index(llave).sort_index(), resumen
+
+
+def tendencia_mrp(claves, items=None):
+    """
+    Evolución del requerimiento por Item a lo largo de varios snapshots.
+    Solo concatena los resúmenes en caché de cada snapshot, sin volver a leer ningún Excel.
+    """
+    df_indice = listar_snapshots_mrp().set_index("Clave")
+
+    tendencia = pd.concat([resumen_requerimiento_mrp(clave) for clave in claves], ignore_index=True)
+    if items is not None:
+        tendencia = tendencia[tendencia["Item"].isin(items)]
+
+    tendencia["Fecha"] = tendencia["Clave"].map(df_indice["Fecha"])
+    return tendencia.sort_values(["Fecha", "Item"]).reset_index(drop=True)
+
+# 🗃️ DATASETS COMPARTIDOS (exportes del ERP ya procesados, ver vigilante.py)
+DIRECTORIO_DATASETS = os.path.join("datos", "datasets")
+INDICE_DATASETS = os.path.join(DIRECTORIO_DATASETS, "indice.json")
+
+# Huellas de exportes ya procesados que se recuerdan para no volver a leerlos
+MAX_EXPORTES_PROCESADOS = 2000
+
+# Lectura y reescritura del índice (y del historial de Timecard) entre el vigilante,
+# las sesiones que anexan a mano y el vigilante como servicio aparte
+CANDADO_DATASETS = INDICE_DATASETS + ".lock"
+
+
+def _leer_indice_datasets():
+    if not os.path.exists(INDICE_DATASETS):
+        return {"datasets": {}, "procesados": []}
+    with open(INDICE_DATASETS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _escribir_indice_datasets(indice):
+    _escribir_json_atomico(INDICE_DATASETS, indice)
+
+
+def listar_datasets():
+    """Datasets publicados: {nombre: {Version, Archivo, Hash, Fecha, Filas}}."""
+    return _leer_indice_datasets()["datasets"]
+
+
+def exporte_procesado(hash_archivo):
+    """True si un exporte con este contenido ya se procesó (publicado o descartado)."""
+    return hash_archivo in _leer_indice_datasets()["procesados"]
+
+
+def marcar_exporte_procesado(hash_archivo):
+    with candado_archivo(CANDADO_DATASETS):
+        indice = _leer_indice_datasets()
+        if hash_archivo not in indice["procesados"]:
+            indice["procesados"] = (indice["procesados"] + [hash_archivo])[-MAX_EXPORTES_PROCESADOS:]
+            _escribir_indice_datasets(indice)
+
+
+def publicar_dataset(nombre, df, archivo, hash_archivo, fecha=None):
+    """
+    Guarda un dataset procesado como parquet y lo registra como la versión vigente.
+    Se conserva también la versión anterior, por si una sesión la está leyendo en ese momento.
+    Devuelve la versión publicada.
+    """
+    fecha = pd.Timestamp(fecha if fecha is not None else datetime.now())
+    version = f"{fecha:%Y%m%d-%H%M%S}_{hash_archivo[:16]}"
+
+    os.makedirs(DIRECTORIO_DATASETS, exist_ok=True)
+    with open(os.path.join(DIRECTORIO_DATASETS, f"{nombre}_{version}.parquet"), "wb") as f:
+        f.write(exportar_parquet(df))
+
+    with candado_archivo(CANDADO_DATASETS):
+        indice = _leer_indice_datasets()
+        anterior = indice["datasets"].get(nombre, {}).get("Version")
+        indice["datasets"][nombre] = {
+            "Version": version,
+            "Archivo": archivo,
+            "Hash": hash_archivo,
+            "Fecha": fecha.isoformat(),
+            "Filas": len(df),
+        }
+        if hash_archivo not in indice["procesados"]:
+            indice["procesados"] = (indice["procesados"] + [hash_archivo])[-MAX_EXPORTES_PROCESADOS:]
+        _escribir_indice_datasets(indice)
+
+        # Versiones: fecha-hora y 16 hex del hash (timecard_... no debe tocar timecard_diario_...)
+        patron = re.compile(re.escape(nombre) + r"_\d{8}-\d{6}_[0-9a-f]{16}\.parquet")
+        vigentes = {f"{nombre}_{v}.parquet" for v in (version, anterior) if v}
+        for archivo_viejo in os.listdir(DIRECTORIO_DATASETS):
+            if patron.fullmatch(archivo_viejo) and archivo_viejo not in vigentes:
+                os.remove(os.path.join(DIRECTORIO_DATASETS, archivo_viejo))
+
+    return version
+
+
+@st.cache_data(show_spinner=False, max_entries=20)
+@medir_lectura
+def cargar_dataset(nombre, version):
+    """Lee una versión publicada de un dataset compartido."""
+    return pd.read_parquet(os.path.join(DIRECTORIO_DATASETS, f"{nombre}_{version}.parquet"))
+
+# 🧾 HISTORIAL DE TIMECARD (modo anexar)
+# Un renglón ya guardado se reconoce por su Timesheet # con su Job # e Item/OP #
+LLAVE_TIMECARD = ["Timesheet #", "Job #", "Item/OP #"]
+
+
+def _llaves_timecard(df):
+    # Como texto: el historial pasa por parquet y los números pueden volver con otro tipo
+    return pd.MultiIndex.from_frame(df[LLAVE_TIMECARD].astype(str))
+
+
+def anexar_timecard(df_nuevo, archivo, hash_archivo, fecha=None):
+    """
+    Agrega al historial solo los renglones de Timecard que aún no estaban guardados
+    y recalcula los agregados diarios (kpis.agregados_diarios) solo de los días afectados.
+    Publica ambos como datasets compartidos "timecard" y "timecard_diario".
+    Devuelve (historial, diario, resumen) con resumen = {nuevos, repetidos, dias}.
+    """
+    from kpis import agregados_diarios
+
+    # El historial se lee y se vuelve a publicar completo: un anexo a la vez
+    with candado_archivo(CANDADO_DATASETS):
+        publicados = listar_datasets()
+        if "timecard" in publicados:
+            historial = _sin_cache(cargar_dataset)("timecard", publicados["timecard"]["Version"])
+        else:
+            historial = df_nuevo.iloc[0:0]
+
+        nuevos = df_nuevo[~_llaves_timecard(df_nuevo).isin(_llaves_timecard(historial))]
+        resumen = {"nuevos": len(nuevos), "repetidos": len(df_nuevo) - len(nuevos), "dias": 0}
+
+        if "timecard_diario" in publicados and "timecard" in publicados:
+            diario = _sin_cache(cargar_dataset)("timecard_diario", publicados["timecard_diario"]["Version"])
+        else:
+            diario = None
+
+        if nuevos.empty and diario is not None:
+            marcar_exporte_procesado(hash_archivo)
+            return historial, diario, resumen
+
+        historial = pd.concat([historial, nuevos], ignore_index=True)
+
+        if diario is None:
+            diario = agregados_diarios(historial)
+        else:
+            # Solo los días que recibieron renglones nuevos se vuelven a agregar
+            dias = nuevos["Completed On"].dt.normalize().unique()
+            resumen["dias"] = len(dias)
+            renglones_dias = historial[historial["Completed On"].dt.normalize().isin(dias)]
+            diario = pd.concat(
+                [diario[~diario["Día"].isin(dias)], agregados_diarios(renglones_dias)], ignore_index=True
+            ).sort_values("Día", kind="stable", ignore_index=True)
+
+        publicar_dataset("timecard", historial, archivo, hash_archivo, fecha)
+        publicar_dataset("timecard_diario", diario, archivo, hash_archivo, fecha)
+        return historial, diario, resumen
+
+# 🪜 CUBO ESCALERA (Item × Snapshot × Fecha)
+# Encabezado de fecha escrito como texto en un archivo escalera
+PATRON_FECHA_ESCALERA = re.compile(r"\d{1,2}/\d{1,2}/\d{4}")
+
+
+@st.cache_data(show_spinner=False, max_entries=200)
+@medir_lectura
+def leer_archivo_escalera(huella, _file):
+    """
+    Lee un archivo estilo escalera una sola vez por contenido (huella).
+    - Columna A = Item, columnas B en adelante = fechas con cantidades
+    Devuelve (items, fechas, valores) con items únicos, fechas ordenadas y una
+    matriz items × fechas, o None si el archivo no tiene el formato esperado.
+    """
+    df = pd.read_excel(_file)
+
+    if df.shape[1] < 2:
+        return None
+
+    # Solo fechas de Excel o texto dd/mm/yyyy: un encabezado numérico (1, 2024) no es fecha
+    fechas = pd.Series([
+        pd.Timestamp(e) if isinstance(e, datetime)
+        else pd.to_datetime(e.strip(), format="%d/%m/%Y", errors="coerce")
+        if isinstance(e, str) and PATRON_FECHA_ESCALERA.fullmatch(e.strip())
+        else pd.NaT
+        for e in df.columns[1:]
+    ], dtype="datetime64[ns]")
+    columnas_fecha = fechas.notna().to_numpy()
+    if not columnas_fecha.any():
+        return None
+
+    items = df.iloc[:, 0]
+    valores = df.iloc[:, 1:].loc[:, columnas_fecha].apply(pd.to_numeric, errors="coerce")
+    valores.columns = pd.DatetimeIndex(fechas[columnas_fecha])
+    valores = valores[items.notna().to_numpy()]
+    valores.index = items.dropna().astype(str).str.strip()
+
+    # Igual que el pivot anterior: primer valor no nulo por Item y Fecha
+    valores = valores.T.groupby(level=0).first().T
+    valores = valores.groupby(level=0).first()
+
+    return valores.index.to_numpy(), valores.columns, valores.to_numpy(dtype="float64")
+
+
+def agregar_snapshots_escalera(cubo, snapshots):
+    """
+    Agrega snapshots al cubo escalera sin reconstruir los anteriores.
+    - snapshots: lista de (nombre, huella, items, fechas, valores)
+    Los ejes de Item y Fecha se comparten: las uniones se arman una vez con todos los
+    snapshots nuevos y el cubo se reubica una sola vez, no una por archivo.
+    """
+    if cubo is None:
+        cubo = {
+            "items": pd.Index([], dtype=object),
+            "fechas": pd.DatetimeIndex([]),
+            "snapshots": [],
+            "huellas": [],
+            "valores": np.empty((0, 0, 0)),
+        }
+    if not snapshots:
+        return cubo
+
+    items_union = cubo["items"].append([pd.Index(items, dtype=object) for _, _, items, _, _ in snapshots]).unique().sort_values()
+    fechas_union = cubo["fechas"].append([pd.DatetimeIndex(fechas) for _, _, _, fechas, _ in snapshots]).unique().sort_values()
+    n_snapshots = len(cubo["snapshots"])
+
+    nuevo = np.full((len(items_union), n_snapshots + len(snapshots), len(fechas_union)), np.nan)
+    if n_snapshots:
+        if items_union.equals(cubo["items"]) and fechas_union.equals(cubo["fechas"]):
+            nuevo[:, :n_snapshots, :] = cubo["valores"]
+        else:
+            pos_items = items_union.get_indexer(cubo["items"])
+            pos_fechas = fechas_union.get_indexer(cubo["fechas"])
+            nuevo[np.ix_(pos_items, np.arange(n_snapshots), pos_fechas)] = cubo["valores"]
+
+    for i, (_, _, items, fechas, valores) in enumerate(snapshots, start=n_snapshots):
+        nuevo[np.ix_(items_union.get_indexer(items), [i], fechas_union.get_indexer(fechas))] = valores[:, None, :]
+
+    return {
+        "items": items_union,
+        "fechas": fechas_union,
+        "snapshots": cubo["snapshots"] + [nombre for nombre, _, _, _, _ in snapshots],
+        "huellas": cubo["huellas"] + [huella for _, huella, _, _, _ in snapshots],
+        "valores": nuevo,
+    }
+
+
+def actualizar_cubo_escalera(archivos):
+    """
+    Mantiene en session_state el cubo escalera de los archivos cargados.
+    Si sólo se agregaron archivos al final, se procesan únicamente los nuevos;
+    si cambió el orden o se quitó alguno, el cubo se reconstruye (cada archivo
+    ya leído sale de caché).
+    """
+    huellas = [hash_contenido(file) for file in archivos]
+    cubo = st.session_state.get("cubo_escalera")
+
+    if cubo is not None and huellas[:len(cubo["huellas"])] != cubo["huellas"]:
+        cubo = None
+
+    inicio = len(cubo["huellas"]) if cubo is not None else 0
+    nuevos = []
+    for idx in range(inicio, len(archivos)):
+        leido = leer_archivo_escalera(huellas[idx], archivos[idx])
+        if leido is None:
+            st.warning(f"⚠️ El archivo {archivos[idx].name} no tiene suficientes columnas de fecha.")
+            # Snapshot vacío para conservar la numeración de archivos
+            leido = (np.array([], dtype=object), pd.DatetimeIndex([]), np.empty((0, 0)))
+        nuevos.append((f"Archivo_{idx+1}", huellas[idx], *leido))
+    cubo = agregar_snapshots_escalera(cubo, nuevos)
+
+    st.session_state.cubo_escalera = cubo
+    return cubo
+
+
+def tabla_escalera(cubo):
+    """
+    Vista tabular del cubo: filas = Item + Snapshot, columnas = fechas ordenadas.
+    Omite las combinaciones Item/Snapshot sin datos, igual que el pivot original.
+    """
+    n_items, n_snapshots, n_fechas = cubo["valores"].shape
+    planos = cubo["valores"].reshape(n_items * n_snapshots, n_fechas)
+    con_datos = ~np.isnan(planos).all(axis=1)
+
+    indice = pd.MultiIndex.from_product([cubo["items"], cubo["snapshots"]], names=["Item", "Snapshot"])
+    df_tabla = pd.DataFrame(planos[con_datos], index=indice[con_datos], columns=cubo["fechas"])
+    df_tabla = df_tabla.loc[:, df_tabla.notna().any()].reset_index()
+
+    # Agregar columna opcional de Release Date vacía
+    df_tabla["Release Date"] = ""
+
+    return df_tabla
+
+
+@st.cache_data(show_spinner="Calculando volatilidad de releases...", max_entries=10)
+def _volatilidad_escalera_en_cache(huellas, dias_congelados, _cubo):
+    """
+    Diferencias entre snapshots consecutivos del cubo escalera, calculadas una
+    sola vez por conjunto de archivos (huellas) y ventana congelada.
+    """
+    valores = _cubo["valores"]
+    items = _cubo["items"].to_numpy()
+    fechas = _cubo["fechas"].to_numpy()
+    snapshots = np.asarray(_cubo["snapshots"], dtype=object)
+
+    sin_dato = np.isnan(valores)
+    presente = ~sin_dato.all(axis=2)                     # items × snapshots
+    ambos = presente[:, 1:] & presente[:, :-1]           # items × transiciones
+
+    llenos = np.nan_to_num(valores)
+    anterior = llenos[:, :-1, :]
+    actual = llenos[:, 1:, :]
+    delta = actual - anterior
+
+    # Fecha de release de cada snapshot: primera fecha con datos
+    inicio = fechas[(~sin_dato.all(axis=0)).argmax(axis=1)]
+    inicio_nuevo = inicio[1:, None]
+    horizonte = fechas[None, :] >= inicio_nuevo          # transiciones × fechas (sin fechas pasadas)
+    congelada = horizonte & (fechas[None, :] < inicio_nuevo + np.timedelta64(dias_congelados, "D"))
+
+    considerar = ambos[:, :, None] & horizonte[None, :, :]
+    mascara = considerar & (delta != 0)
+
+    # Detalle de cambios (sólo celdas que cambiaron)
+    i, t, f = np.nonzero(mascara)
+    cambios = pd.DataFrame({
+        "Item": pd.Categorical(items[i], categories=items),
+        "Snapshot Anterior": pd.Categorical(snapshots[t], categories=snapshots),
+        "Snapshot": pd.Categorical(snapshots[t + 1], categories=snapshots),
+        "Fecha": fechas[f],
+        "Cantidad Anterior": anterior[i, t, f],
+        "Cantidad": actual[i, t, f],
+        "Delta": delta[i, t, f],
+    })
+    cambios["% Cambio"] = cambios["Delta"] / cambios["Cantidad Anterior"].where(cambios["Cantidad Anterior"] > 0) * 100
+    cambios["Ventana Congelada"] = congelada[t, f]
+
+    # Resumen por ítem
+    delta_abs = np.where(considerar, np.abs(delta), 0)
+    base = np.where(considerar, np.maximum(anterior, actual), 0).sum(axis=(1, 2))
+    delta_abs_congelado = np.where(congelada[None, :, :], delta_abs, 0).sum(axis=(1, 2))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatilidad = np.where(base > 0, delta_abs.sum(axis=(1, 2)) / base, 0)
+        penalizacion = np.where(base > 0, delta_abs_congelado / base, 0)
+
+    resumen = pd.DataFrame({
+        "Item": items,
+        "Cambios": mascara.sum(axis=(1, 2)),
+        "Violaciones Ventana": (mascara & congelada[None, :, :]).sum(axis=(1, 2)),
+        "Delta Neto": np.where(considerar, delta, 0).sum(axis=(1, 2)),
+        "Delta Absoluto": delta_abs.sum(axis=(1, 2)),
+        "Volatilidad %": volatilidad * 100,
+        "Score": (volatilidad + penalizacion) * 100,
+    })
+
+    return cambios, resumen
+
+
+def volatilidad_escalera(cubo, dias_congelados=14, clientes=None):
+    """
+    Volatilidad de releases entre snapshots consecutivos del cubo escalera.
+    - dias_congelados: días desde la fecha de release en los que no deberían existir cambios
+    - clientes: Serie opcional Item -> Cliente (p. ej. del archivo escalera de ventas)
+    Devuelve:
+    - cambios: una fila por Item / Fecha / transición con Delta, % Cambio y Ventana Congelada
+    - resumen: una fila por Item con Cambios, Violaciones Ventana, Volatilidad % y Score,
+      ordenado de mayor a menor Score. Score = Volatilidad % + el % de cambio dentro de
+      la ventana congelada (esos cambios cuentan doble).
+    """
+    if len(cubo["snapshots"]) < 2:
+        return None, None
+
+    cambios, resumen = _volatilidad_escalera_en_cache(tuple(cubo["huellas"]), dias_congelados, cubo)
+    cambios = cambios.copy()
+    resumen = resumen.copy()
+
+    if clientes is not None:
+        clientes = pd.Series(clientes.astype(str).to_numpy(), index=clientes.index.astype(str).str.strip())
+        clientes = clientes[~clientes.index.duplicated()]
+        cambios.insert(1, "Cliente", cambios["Item"].astype(str).map(clientes).fillna("Sin Cliente").astype("category"))
+        resumen.insert(1, "Cliente", resumen["Item"].map(clientes).fillna("Sin Cliente").astype("category"))
+
+    resumen = resumen[resumen["Cambios"] > 0].sort_values("Score", ascending=False, ignore_index=True)
+
+    return cambios, resumen
+
+
 def cargar_archivos_estilo_escalera(archivos):
     """
     Carga múltiples archivos Excel con formato:
@@ -293,138 +946,582 @@ def cargar_archivos_estilo_escalera(archivos):
     - Columnas B en adelante = fechas con cantidades
 
     Devuelve:
-    - DataFrame pivoteado con filas = Item + Snapshot, columnas = fechas
+    - DataFrame con filas = Item + Snapshot, columnas = fechas
     - Lista de versiones / snapshots
     """
-    lista_df = []
+    cubo = actualizar_cubo_escalera(archivos)
+
+    if not np.isfinite(cubo["valores"]).any():
+        st.error("❌ No se pudieron procesar los archivos.")
+        return None, []
+
+    return tabla_escalera(cubo), cubo["snapshots"]
+
+
+# 🔎 ÍNDICE DE FACETAS PARA FILTROS EN CASCADA
+@st.cache_data(show_spinner=False, max_entries=20)
+def indice_facetas(llave, columnas, _df):
+    """
+    Índice para filtros en cascada, calculado una vez por archivo (llave; _df no se hashea).
+    Por cada columna guarda:
+    - valores: valores únicos ordenados (sin nulos)
+    - codigos: posición del valor de cada fila en 'valores' (-1 = nulo)
+    - filas: posiciones de las filas de cada valor
+    """
+    indice = {"n": len(_df), "valores": {}, "codigos": {}, "filas": {}}
+
+    for columna in columnas:
+        codigos, valores = pd.factorize(_df[columna], sort=True)
+        orden = np.argsort(codigos, kind="stable")
+        limites = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+
+        indice["valores"][columna] = pd.Index(valores)
+        indice["codigos"][columna] = codigos
+        indice["filas"][columna] = [orden[limites[k]:limites[k + 1]] for k in range(len(valores))]
 
-    for idx, file in enumerate(archivos):
-        nombre_snapshot = f"Archivo_{idx+1}"
-        df = pd.read_excel(file)
+    return indice
 
-        # Validación mínima
-        if df.shape[1] < 2:
-            st.warning(f"⚠️ El archivo {file.name} no tiene suficientes columnas.")
+
+def filas_facetas(indice, selecciones):
+    """
+    Posiciones de las filas que cumplen todas las selecciones {columna: [valores]}.
+    Una selección vacía o None no filtra esa columna.
+    """
+    mascara = None
+    for columna, seleccion in selecciones.items():
+        if seleccion is None or len(seleccion) == 0:
             continue
 
-        # Renombrar primera columna como 'Item'
-        df.rename(columns={df.columns[0]: "Item"}, inplace=True)
+        codigos = indice["valores"][columna].get_indexer(list(seleccion))
+        en_seleccion = np.zeros(indice["n"], dtype=bool)
+        for codigo in codigos[codigos >= 0]:
+            en_seleccion[indice["filas"][columna][codigo]] = True
 
-        # Transformar a formato largo
-        df_largo = df.melt(id_vars=["Item"], var_name="Fecha", value_name="Cantidad")
-        df_largo["Snapshot"] = nombre_snapshot
-        lista_df.append(df_largo)
+        mascara = en_seleccion if mascara is None else mascara & en_seleccion
 
-    if not lista_df:
-        st.error("❌ No se pudieron procesar los archivos.")
-        return None, []
+    return np.arange(indice["n"]) if mascara is None else np.flatnonzero(mascara)
+
+
+def opciones_faceta(indice, columna, filas):
+    """
+    Valores de la columna presentes en las filas dadas, en orden.
+    """
+    valores = indice["valores"][columna]
+    conteo = np.bincount(indice["codigos"][columna][filas] + 1, minlength=len(valores) + 1)
+    return valores[conteo[1:] > 0].tolist()
+
+
+# 🚚 ÓRDENES POR PLATAFORMA
+columnas_ordenes_plataforma = [
+    "Week Of", "Ship From", "Customer", "Ship To", "Item", "On Hand",
+    "Customer PO", "Order #", "Customer Item", "Wanted On", "Ship On",
+    "Quantity", "Unit Price", "Amount", "Firm/Planned", "Platform"
+]
+
+
+@st.cache_data(show_spinner="Procesando órdenes...", max_entries=5)
+@medir_lectura
+def cargar_ordenes_plataforma(huella, _file):
+    """
+    Lee y tipa el archivo de órdenes una sola vez por contenido (huella).
+    Devuelve (df, error) como cargar_datos_columnas_requeridas.
+    """
+    df, error = cargar_datos_columnas_requeridas(_file, columnas_ordenes_plataforma, skiprows=4)
+    if error:
+        return None, error
+
+    df = convertir_columnas_numericas(df, ["Quantity", "Amount"])
+    df = convertir_columnas_fecha(df, ["Wanted On"])
+    for col in ["Platform", "Ship To", "Customer", "Ship From", "Firm/Planned"]:
+        df[col] = df[col].astype("category")
+
+    return df, None
 
-    # Combinar todo
-    df_todo = pd.concat(lista_df)
 
-    # Pivotear para mostrar como escalera: filas = Item + Snapshot, columnas = fechas
-    df_pivot = df_todo.pivot_table(
-        index=["Item", "Snapshot"],
-        columns="Fecha",
-        values="Cantidad",
-        aggfunc="first"
+@st.cache_data(show_spinner=False, max_entries=5)
+def agregados_plataforma(huella, _df):
+    """
+    Piezas y monto por Platform × Ship To × día (Wanted On), con su semana.
+    Los filtros de la página sólo rebanan esta tabla.
+    """
+    agregados = _df.groupby(
+        ["Platform", "Ship To", _df["Wanted On"].dt.normalize()], observed=True
+    ).agg(
+        Piezas=("Quantity", "sum"),
+        Monto=("Amount", "sum"),
+        Lineas=("Quantity", "size")
     ).reset_index()
+    agregados["Semana"] = agregados["Wanted On"].dt.to_period("W").dt.start_time
 
-    # Ordenar columnas de fecha (ignorando errores si son string)
-    try:
-        fechas_ordenadas = sorted([col for col in df_pivot.columns if isinstance(col, pd.Timestamp) or "-" in str(col)],
-                                  key=lambda x: pd.to_datetime(x, errors='coerce'))
-        df_pivot = df_pivot[["Item", "Snapshot"] + fechas_ordenadas]
-    except:
-        pass
+    return agregados
 
-    # Agregar columna opcional de Release Date vacía
-    df_pivot["Release Date"] = ""
 
-    return df_pivot, [f"Archivo_{i+1}" for i in range(len(archivos))]
+# 📅 FORECAST DE COMPRAS POR MES
+@st.cache_data(show_spinner=False, max_entries=50)
+def forecast_mensual_por_tipo(llave_filtros, _df):
+    """
+    Cantidad del forecast de compras por Type y mes (inicio de mes).
+    - llave_filtros: tupla que identifica archivo y filtros aplicados (llave de caché; _df no se hashea)
+    Devuelve una Serie "Quantity" con índice (Type, MesAño) ordenado.
+    """
+    mes = _df["Wanted On"].dt.to_period("M").dt.to_timestamp().rename("MesAño")
+    return _df.groupby([_df["Type"], mes], observed=True)["Quantity"].sum().sort_index()
+
+
+# 📦 CUBO PRONÓSTICO VS VENTAS
+@st.cache_data
+def construir_cubo_ventas(df_orders, df_sales):
+    """
+    Construye el cubo Pronóstico vs Ventas a nivel (Semana, Mes, Customer, Item).
+    Se calcula una sola vez por par de archivos; gráficas y tablas de la comparativa lo consultan
+    en lugar de volver a recorrer las líneas de Orders y Ventas.
+    """
+    orders = pd.DataFrame({
+        "Fecha": pd.to_datetime(df_orders["Ship On"], errors="coerce"),
+        "Customer": df_orders["Customer"],
+        "Item": df_orders["Item"],
+        "Pronosticado": pd.to_numeric(df_orders["Amount"], errors="coerce"),
+        "Lineas Ventas": 0,
+    })
+    sales = pd.DataFrame({
+        "Fecha": pd.to_datetime(df_sales["Invoice Date"], errors="coerce"),
+        "Customer": df_sales["Customer"],
+        "Item": df_sales["Item"],
+        "Vendido": pd.to_numeric(df_sales["Amount"], errors="coerce"),
+        "Lineas Ventas": 1,
+    })
+
+    # El pronóstico "hasta la última venta real" se marca al construir el cubo
+    orders["Hasta Última Venta"] = orders["Fecha"] <= sales["Fecha"].max()
+    sales["Hasta Última Venta"] = True
+
+    lineas = pd.concat([orders, sales], ignore_index=True)
+    lineas["Semana"] = lineas["Fecha"].dt.to_period("W").dt.start_time
+    lineas["Mes"] = lineas["Fecha"].dt.to_period("M").dt.start_time
+    lineas[["Customer", "Item"]] = lineas[["Customer", "Item"]].astype("category")
+
+    cubo = lineas.groupby(
+        ["Semana", "Mes", "Customer", "Item", "Hasta Última Venta"], dropna=False, observed=True
+    )[["Pronosticado", "Vendido", "Lineas Ventas"]].sum().reset_index()
+
+    return cubo
+
+
+def consultar_cubo_ventas(cubo, dimensiones, filtros=None, hasta_ultima_venta=False):
+    """
+    Agrega el cubo de ventas por las dimensiones indicadas.
+    - filtros: diccionario {columna: valor} aplicado antes de agregar
+    - hasta_ultima_venta: limita el pronóstico a fechas hasta la última venta registrada
+    """
+    if filtros:
+        mascara = np.ones(len(cubo), dtype=bool)
+        for columna, valor in filtros.items():
+            mascara &= (cubo[columna] == valor).to_numpy()
+        cubo = cubo[mascara]
+
+    medidas = cubo[["Pronosticado", "Vendido", "Lineas Ventas"]]
+    if hasta_ultima_venta:
+        medidas = medidas.assign(Pronosticado=medidas["Pronosticado"].where(cubo["Hasta Última Venta"], 0))
+
+    return medidas.groupby([cubo[d] for d in dimensiones], observed=True).sum().reset_index()
+
+
+# Formatos de descarga: extensión y tipo MIME
+FORMATOS_DESCARGA = {
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+}
+
+
+def _preparar_tabla_exportacion(df):
+    """
+    Deja el DataFrame con encabezados planos (texto) y el índice como columnas
+    cuando éste trae información (MultiIndex o índice con nombre).
+    """
+    if isinstance(df.index, pd.MultiIndex) or df.index.name is not None:
+        df = df.reset_index()
+    else:
+        # Copia superficial: abajo solo se reemplazan columnas completas, no se escribe en ellas
+        df = df.copy(deep=False)
+
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [
+            " ".join(str(nivel) for nivel in columna if str(nivel) != "").strip()
+            for columna in df.columns
+        ]
+    else:
+        df.columns = [str(columna) for columna in df.columns]
+
+    # Tipos que XlsxWriter no escribe directamente
+    for i in range(df.shape[1]):
+        serie = df.iloc[:, i]
+        if isinstance(serie.dtype, pd.PeriodDtype):
+            df.isetitem(i, serie.dt.to_timestamp())
+        elif isinstance(serie.dtype, pd.DatetimeTZDtype):
+            df.isetitem(i, serie.dt.tz_localize(None))
+        elif pd.api.types.is_timedelta64_dtype(serie.dtype):
+            df.isetitem(i, serie.astype(str))
+
+    return df
+
+
+# Caracteres que Excel no acepta en el nombre de una hoja (máximo 31 caracteres)
+CARACTERES_INVALIDOS_HOJA = re.compile(r"[\[\]:*?/\\]")
+# Filas que se pasan a objetos de Python a la vez al escribir una hoja
+FILAS_POR_BLOQUE_EXCEL = 10_000
+
+
+def _nombre_hoja_excel(nombre, usados):
+    """Nombre válido y único (Excel no distingue mayúsculas) para una hoja; lo agrega a usados."""
+    base = CARACTERES_INVALIDOS_HOJA.sub("_", str(nombre)).strip("'").strip() or "Hoja"
+    candidato, n = base[:31], 1
+    while candidato.lower() in usados:
+        n += 1
+        sufijo = f" ({n})"
+        candidato = base[:31 - len(sufijo)] + sufijo
+    usados.add(candidato.lower())
+    return candidato
+
+
+def _escribir_hoja_excel(workbook, nombre, df, formato_encabezado, formatos_fecha):
+    """
+    Escribe una hoja fila por fila (requisito del modo constant_memory de XlsxWriter).
+    Los valores pasan a objetos de Python por bloques de filas, no la tabla completa de una vez.
+    """
+    df = _preparar_tabla_exportacion(df)
+    hoja = workbook.add_worksheet(nombre)
+
+    # Ancho de columnas aproximado con el encabezado y una muestra de valores
+    muestra = df.head(200).astype(str)
+    for i, columna in enumerate(df.columns):
+        largo = max([len(columna)] + muestra.iloc[:, i].str.len().tolist())
+        hoja.set_column(i, i, min(max(largo, 8), 50) + 2)
+
+    hoja.write_row(0, 0, df.columns, formato_encabezado)
+    hoja.freeze_panes(1, 0)
+
+    # Fechas como número de serie de Excel (mucho más rápido que escribir datetime celda por celda)
+    formatos = [None] * df.shape[1]
+    for i in range(df.shape[1]):
+        serie = df.iloc[:, i]
+        if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            con_hora = (serie.dropna() != serie.dropna().dt.normalize()).any()
+            formatos[i] = formatos_fecha[1] if con_hora else formatos_fecha[0]
+            df.isetitem(i, (serie - pd.Timestamp("1899-12-30")) / pd.Timedelta(days=1))
+
+    # Objetos nativos de Python; NaN/NaT como celdas vacías
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE_EXCEL):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE_EXCEL]
+        valores = bloque.astype(object).where(bloque.notna(), None)
+        for fila, registro in enumerate(valores.itertuples(index=False, name=None), start=inicio + 1):
+            for columna, valor in enumerate(registro):
+                if valor is not None:
+                    hoja.write(fila, columna, valor.item() if isinstance(valor, np.generic) else valor, formatos[columna])
+
+
+def exportar_reporte_excel(hojas):
+    """
+    Genera un libro de Excel con varias hojas en una sola pasada.
+    - hojas: diccionario {nombre_hoja: DataFrame}, en el orden en que deben aparecer; los
+      nombres se recortan a 31 caracteres, sin los que Excel rechaza y sin repetirse
+    Usa XlsxWriter en modo constant_memory: cada fila se escribe a disco y se libera.
+    """
+    import xlsxwriter
+
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "nan_inf_to_errors": True,
+        "strings_to_urls": False,
+    })
+    formato_encabezado = workbook.add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+    formatos_fecha = (
+        workbook.add_format({"num_format": "dd/mm/yyyy"}),
+        workbook.add_format({"num_format": "dd/mm/yyyy hh:mm"}),
+    )
+
+    usados = set()
+    for nombre, df in hojas.items():
+        _escribir_hoja_excel(workbook, _nombre_hoja_excel(nombre, usados), df, formato_encabezado, formatos_fecha)
+
+    workbook.close()
+    return output.getvalue()
 
 
 def exportar_excel(df):
     """
-    Genera archivo Excel descargable en memoria.
-    Si las columnas son MultiIndex, escribe también el índice para evitar error.
+    Genera archivo Excel descargable en memoria con una sola hoja "Resumen".
+    """
+    return exportar_reporte_excel({"Resumen": df})
+
+
+def huella_dataframe(df):
+    """
+    Hash del contenido de un DataFrame (valores, índice y columnas).
     """
+    try:
+        valores = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    except TypeError:
+        valores = pd.util.hash_pandas_object(df.astype(str), index=True).to_numpy()
+    huella = hashlib.sha256(valores.tobytes())
+    huella.update(repr(list(df.columns)).encode("utf-8"))
+    return huella.hexdigest()
+
+
+def exportar_parquet(df):
+    """
+    Genera un archivo Parquet (columnar, comprimido) en memoria.
+    """
+    df = _preparar_tabla_exportacion(df)
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        if isinstance(df.columns, pd.MultiIndex):
-            df.to_excel(writer, index=True, sheet_name="Resumen")
-        else:
-            df.to_excel(writer, index=False, sheet_name="Resumen")
-    output.seek(0)
-    return output
+    try:
+        df.to_parquet(output, index=False)
+    except (TypeError, ValueError):
+        # Columnas object con tipos mezclados: se exportan como texto
+        columnas_texto = df.select_dtypes(include="object").columns
+        df[columnas_texto] = df[columnas_texto].astype(str).where(df[columnas_texto].notna(), None)
+        output = BytesIO()
+        df.to_parquet(output, index=False)
+    return output.getvalue()
+
+
+def exportar_csv_gz(df):
+    """
+    Genera un CSV comprimido con gzip en memoria.
+    """
+    df = _preparar_tabla_exportacion(df)
+    output = BytesIO()
+    df.to_csv(output, index=False, compression={"method": "gzip", "mtime": 0})
+    return output.getvalue()
+
+
+@st.cache_data(show_spinner="Generando archivo de descarga...", max_entries=20)
+def _archivo_descarga_en_cache(key, formato, firma, _hojas):
+    """
+    Bytes del archivo cacheados por botón, formato y firma de los datos (_hojas no se hashea;
+    si es una función se llama aquí, solo cuando no está en caché).
+    Parquet y CSV llevan sólo la primera hoja (la tabla principal).
+    """
+    hojas = _hojas() if callable(_hojas) else _hojas
+    if isinstance(hojas, pd.DataFrame):
+        hojas = {"Resumen": hojas}
+
+    if formato == "Excel":
+        return exportar_reporte_excel(hojas)
 
+    tabla_principal = next(iter(hojas.values()))
+    if formato == "Parquet":
+        return exportar_parquet(tabla_principal)
+    return exportar_csv_gz(tabla_principal)
 
 
-def graficar_evolucion_item(df, item):
+def boton_descarga_reporte(hojas, nombre_base, key, label="📥 Descargar archivo", firma=None):
     """
-    Gráfica clara por ítem mostrando evolución por fecha en cada snapshot
+    Botón de descarga diferido: el archivo se genera sólo cuando el usuario lo
+    solicita y se cachea por la firma de los datos y el formato; si cualquiera de
+    los dos cambia hay que volver a pedirlo.
+    - hojas: DataFrame, diccionario {nombre_hoja: DataFrame} o función sin argumentos que
+      lo devuelve (las hojas se arman sólo al generar el archivo); la primera es la tabla principal
+    - nombre_base: nombre del archivo sin extensión
+    - firma: identifica los datos (huellas y filtros); sin ella se usa la huella de las hojas
+    Excel incluye todas las hojas; Parquet y CSV (gzip) sólo la tabla principal.
     """
-    import plotly.graph_objects as go
+    formato = st.radio("Formato", list(FORMATOS_DESCARGA), horizontal=True, key=f"{key}_formato")
+
+    preparado = st.session_state.get(f"{key}_preparado")
+    if firma is None and callable(hojas):
+        # Sin firma no hay cómo saber si los datos cambiaron sin armar las hojas
+        hojas = hojas()
+    if firma is None and preparado is not None:
+        firma = _huella_hojas(hojas)
+
+    if preparado != (firma, formato):
+        if not st.button("⚙️ Preparar descarga", key=f"{key}_preparar"):
+            return
+        if firma is None:
+            firma = _huella_hojas(hojas)
+        st.session_state[f"{key}_preparado"] = (firma, formato)
+
+    extension, mime = FORMATOS_DESCARGA[formato]
+    st.download_button(
+        label=label,
+        data=_archivo_descarga_en_cache(key, formato, firma, hojas),
+        file_name=nombre_base + extension,
+        mime=mime,
+        key=key
+    )
+
 
-    df_largo = df.melt(id_vars=["Item", "Snapshot"], var_name="Fecha", value_name="Cantidad")
-    df_largo = df_largo[df_largo["Item"] == item].dropna()
+def _huella_hojas(hojas):
+    if isinstance(hojas, pd.DataFrame):
+        return huella_dataframe(hojas)
+    return tuple((nombre, huella_dataframe(df)) for nombre, df in hojas.items())
 
-    if df_largo.empty:
+
+
+def graficar_evolucion_item(cubo, item):
+    """
+    Gráfica clara por ítem mostrando evolución por fecha en cada snapshot.
+    Toma directamente la rebanada del ítem en el cubo escalera (sin melt de toda la tabla).
+    """
+    if item not in cubo["items"]:
         st.warning("No hay datos para graficar este ítem.")
         return
 
-    # Asegurar formato de fechas
-    df_largo["Fecha"] = pd.to_datetime(df_largo["Fecha"], errors="coerce")
-    df_largo = df_largo.dropna(subset=["Fecha"]).sort_values("Fecha")
+    rebanada = cubo["valores"][cubo["items"].get_loc(item)]  # snapshots × fechas
+    snapshots, fechas = np.nonzero(~np.isnan(rebanada))
 
-    fig = go.Figure()
-
-    for snapshot in df_largo["Snapshot"].unique():
-        df_snapshot = df_largo[df_largo["Snapshot"] == snapshot]
-        fig.add_trace(go.Scatter(
-            x=df_snapshot["Fecha"],
-            y=df_snapshot["Cantidad"],
-            mode="lines+markers",
-            name=snapshot,
-            line=dict(width=2),
-            marker=dict(size=6)
-        ))
+    if snapshots.size == 0:
+        st.warning("No hay datos para graficar este ítem.")
+        return
 
-    fig.update_layout(
+    df_item = pd.DataFrame({
+        "Fecha": cubo["fechas"][fechas],
+        "Cantidad": rebanada[snapshots, fechas],
+        "Snapshot": np.asarray(cubo["snapshots"], dtype=object)[snapshots],
+    })
+
+    fig = px.line(
+        df_item,
+        x="Fecha",
+        y="Cantidad",
+        color="Snapshot",
+        markers=True,
         title=f"Evolución de cantidades para '{item}' por fecha",
-        xaxis_title="Fecha",
-        yaxis_title="Cantidad",
-        legend_title="Versión",
-        hovermode="x unified"
+        labels={"Snapshot": "Versión"}
     )
+    fig.update_traces(line=dict(width=2), marker=dict(size=6))
+    fig.update_layout(hovermode="x unified")
 
     st.plotly_chart(fig, use_container_width=True)
 
 def procesar_montos_escalera(df):
     """
-    Procesa columnas de montos (AF a AQ) en formato datetime con sufijo ".1".
-    Devuelve un DataFrame en formato largo con columnas: Item, LMX, Cliente, Unit Price, Mes, Monto.
+    Procesa el archivo escalera de ventas por posición de columnas:
+    - Columnas fijas: Item, LMX, Cliente, Unit Price
+    - Primer bloque de meses = cantidades, segundo bloque (mismos meses, sufijo ".1") = montos
+    Devuelve un DataFrame en formato largo con columnas: Item, LMX, Cliente, Unit Price, Mes, Cantidad, Monto
+    con Cliente e Item categóricos.
     """
     columnas_fijas = ["Item", "LMX", "Cliente", "Unit Price"]
 
-    # Detectar columnas de montos (fechas con sufijo ".1")
-    columnas_montos = [
-        col for col in df.columns
-        if (isinstance(col, pd.Timestamp) or isinstance(col, str))
-        and ".1" in str(col)
-        and "-" in str(col)
-    ]
+    # Encabezados de mes convertidos en bloque; pandas agrega ".1" al repetido
+    encabezados = pd.Series([str(col) for col in df.columns])
+    meses = pd.to_datetime(encabezados.str.replace(r"\.1$", "", regex=True), errors="coerce", format="mixed")
+    es_mes = (meses.notna() & encabezados.str.contains("-", regex=False)).to_numpy()
+    es_monto = es_mes & meses.duplicated().to_numpy()
+    es_cantidad = es_mes & ~es_monto
 
-    # Formato largo
-    df_montos = df.melt(
-        id_vars=columnas_fijas,
-        value_vars=columnas_montos,
-        var_name="Mes",
-        value_name="Monto"
-    )
+    meses_monto = pd.DatetimeIndex(meses[es_monto])
+    montos = df.iloc[:, es_monto].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+
+    # Cantidad del mismo mes (primer bloque), alineada a las columnas de monto
+    cantidades = df.iloc[:, es_cantidad].apply(pd.to_numeric, errors="coerce")
+    cantidades.columns = pd.DatetimeIndex(meses[es_cantidad])
+    cantidades = cantidades.reindex(columns=meses_monto).to_numpy(dtype="float64")
+
+    n_filas, n_meses = montos.shape
+    filas = np.repeat(np.arange(n_filas), n_meses)
+
+    df_montos = pd.DataFrame({
+        "Item": pd.Categorical(df["Item"].where(df["Item"].isna(), df["Item"].astype(str).str.strip()).to_numpy()[filas]),
+        "LMX": df["LMX"].to_numpy()[filas],
+        "Cliente": pd.Categorical(df["Cliente"].to_numpy()[filas]),
+        "Unit Price": pd.to_numeric(df["Unit Price"], errors="coerce").to_numpy()[filas],
+        "Mes": np.tile(meses_monto.to_numpy(), n_filas),
+        "Cantidad": cantidades.ravel(),
+        "Monto": montos.ravel(),
+    }, columns=columnas_fijas + ["Mes", "Cantidad", "Monto"])
+
+    return df_montos[df_montos["Monto"].notna().to_numpy()].reset_index(drop=True)
+
+
+@st.cache_data(show_spinner="Procesando escalera de ventas...", max_entries=10)
+@medir_lectura
+def leer_escalera_ventas(huella, _file):
+    """
+    Lee y procesa el archivo escalera de ventas una sola vez por contenido (huella).
+    """
+    return procesar_montos_escalera(pd.read_excel(_file))
+
+
+# 🏷️ CLASIFICACIÓN DE REPORTES POR FIRMA DE ENCABEZADO
+# Renglones que se revisan al inicio de cada archivo para reconocer el reporte
+FILAS_FIRMA = 30
+
+# Reportes con fila de encabezado: columnas que deben aparecer en ella.
+# Orders/Sales/forecast se leen solo con las columnas que usan las páginas de ventas.
+FIRMAS_REPORTES = {
+    "timecard": required_columns,
+    "programacion": required_columns_plan,
+    "orders": ["Ship On", "Customer", "Item", "Amount"],
+    "sales": ["Invoice Date", "Customer", "Item", "Amount"],
+    "forecast": ["Item", "Type", "Wanted On", "Quantity", "Datos", "Vendor", "PO", "Unit Price (MXN)", "Total"],
+}
+
+
+def _sin_cache(funcion):
+    """Función original detrás de @st.cache_data (los lectores por ruta no deben cachear por nombre de archivo)."""
+    return getattr(funcion, "__wrapped__", funcion)
+
+
+def clasificar_reporte(file):
+    """
+    Reconoce el tipo de reporte por su encabezado, sin depender del nombre del archivo.
+    - file: ruta o archivo tipo file-like (se regresa al inicio al terminar)
+    Devuelve (tipo, skiprows); tipo es None si no coincide con ninguna firma.
+    Tipos: timecard, programacion, orders, sales, forecast, downtime, mrp.
+    """
+    muestra = pd.read_excel(file, header=None, nrows=FILAS_FIRMA)
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+    texto = muestra.astype(str).apply(lambda col: col.str.replace(r"\s+", " ", regex=True).str.strip())
+
+    for fila, valores in enumerate(texto.itertuples(index=False, name=None)):
+        celdas = set(valores)
+        for tipo, columnas in FIRMAS_REPORTES.items():
+            if celdas.issuperset(columnas):
+                return tipo, fila
 
-    # Limpiar el nombre de la columna y convertir a datetime
-    df_montos["Mes"] = pd.to_datetime(df_montos["Mes"].apply(lambda x: str(x).replace(".1", "")), errors="coerce")
-    df_montos.dropna(subset=["Mes", "Monto"], inplace=True)
+    # Sin encabezado reconocible: MRP por sus renglones de Purchase Order en la columna B,
+    # Downtime por sus encabezados de grupo "Dxxx - Dxxx" en la columna A
+    if muestra.shape[1] > 5 and texto.iloc[:, 1].str.contains("Purchase Order", regex=False).any():
+        return "mrp", 0
+    if muestra.shape[1] >= 2 and texto.iloc[:, 0].str.match(r"^D\d+ - ").any():
+        return "downtime", 0
 
-    return df_montos
+    return None, None
+
+
+def leer_reporte(file, tipo=None, skiprows=None, llaves=True):
+    """
+    Lee un reporte del ERP con su lector de este módulo, sin pasar por la caché de Streamlit.
+    - tipo/skiprows: si no se indican se obtienen con clasificar_reporte()
+    - llaves: agrega las columnas id_* de las dimensiones compartidas (dimensiones.con_llaves)
+    Devuelve (tipo, datos, error). datos es un DataFrame, salvo MRP: (df_po, df_sin_requerimiento).
+    """
+    if tipo is None:
+        tipo, skiprows = clasificar_reporte(file)
+        if tipo is None:
+            return None, None, "El encabezado no coincide con ningún reporte conocido"
+
+    if tipo == "mrp":
+        datos = leer_mrp_excel(file)
+        return tipo, tuple(con_llaves(df) for df in datos) if llaves else datos, None
+
+    if tipo == "downtime":
+        df_downtime = _sin_cache(cargar_downtime)(file)
+        if df_downtime is None:
+            return tipo, None, "No se pudo leer el archivo de Downtime"
+        df = extraer_downtime(df_downtime)
+        return tipo, con_llaves(df) if llaves else df, None
+
+    df, error = _sin_cache(cargar_datos_columnas_requeridas)(file, FIRMAS_REPORTES[tipo], skiprows=skiprows or 0)
+    if df is not None and tipo == "forecast":
+        df = convertir_columnas_fecha(df, ["Wanted On"])
+        df = convertir_columnas_numericas(df, ["Quantity", "Unit Price (MXN)", "Total"])
+    if df is not None and llaves:
+        df = con_llaves(df)
+    return tipo, df, error
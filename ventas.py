@@ -3,12 +3,16 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import locale
-from utils import cargar_datos_columnas_requeridas, convertir_columnas_fecha, convertir_columnas_numericas, filter_by_columns, exportar_excel, procesar_montos_escalera
+from utils import cargar_datos_columnas_requeridas, convertir_columnas_fecha, convertir_columnas_numericas, filter_by_columns, boton_descarga_reporte, cargar_ordenes_plataforma, agregados_plataforma, leer_escalera_ventas, hash_contenido, forecast_mensual_por_tipo, indice_facetas, filas_facetas, opciones_faceta, construir_cubo_ventas, consultar_cubo_ventas
+from kpis import pronostico_vs_ventas, pronostico_vs_ventas_mensual
+from dimensiones import con_llaves
+from perfilador import seccion, anotar_accion
 
 
 def ventas_app():
     menuventas = ["Importar Reportes", "Comparativa", "Órdenes por Plataforma", "Forecast de Compras"]
     option = st.sidebar.selectbox("Acciones:", menuventas)
+    anotar_accion(option)
 
     if option == "Importar Reportes":
         importar_ventas()
@@ -36,8 +40,8 @@ def importar_ventas():
 
     if uploaded_escalera:
         try:
-            df_escalera_raw = pd.read_excel(uploaded_escalera)
-            df_montos_escalera = procesar_montos_escalera(df_escalera_raw)
+            with seccion("Lectura escalera de ventas", "carga") as s:
+                df_montos_escalera = s.carga(leer_escalera_ventas(hash_contenido(uploaded_escalera), uploaded_escalera))
 
             st.session_state["df_escalera"] = df_montos_escalera
             st.success("✅ Archivo escalera procesado correctamente")
@@ -49,8 +53,9 @@ def importar_ventas():
             st.error(f"❌ Error procesando archivo escalera: {e}")
 
     if uploaded_orders and uploaded_sales:
-        df_orders, error_orders = cargar_datos_columnas_requeridas(uploaded_orders, columnas_orders, skiprows=4)
-        df_sales, error_sales = cargar_datos_columnas_requeridas(uploaded_sales, columnas_sales, skiprows=8)
+        with seccion("Lectura Orders y Ventas", "carga") as s:
+            df_orders, error_orders = s.carga(cargar_datos_columnas_requeridas(uploaded_orders, columnas_orders, skiprows=4))
+            df_sales, error_sales = s.carga(cargar_datos_columnas_requeridas(uploaded_sales, columnas_sales, skiprows=8))
 
         if error_orders:
             st.error(f"Error en Orders: {error_orders}")
@@ -59,10 +64,15 @@ def importar_ventas():
             st.error(f"Error en Ventas: {error_sales}")
             return
 
-        # 📌 Guardar en session_state
+        # 📌 Guardar en session_state, con llaves de Customer e Item
+        df_orders, df_sales = con_llaves(df_orders), con_llaves(df_sales)
         st.session_state.df_orders = df_orders
         st.session_state.df_sales = df_sales
 
+        # 📦 Cubo Pronóstico vs Ventas, una vez por par de archivos
+        with seccion("Cubo Pronóstico vs Ventas", "agregación") as s:
+            st.session_state.cubo_ventas = s.carga(construir_cubo_ventas(df_orders, df_sales))
+
         st.success("✅ Archivos cargados correctamente. Dirígete a la pestaña de Comparativa.")
 
         # Si quieres mostrar los datos cargados opcionalmente
@@ -77,8 +87,6 @@ def comparativa_grafica():
     st.title("📊 Comparativa Pronóstico vs Ventas")
 
     # 📌 Obtener los dataframes de sesión
-    df_orders = st.session_state.get("df_orders", pd.DataFrame())
-    df_sales = st.session_state.get("df_sales", pd.DataFrame())
     df_escalera = st.session_state.get("df_escalera", None)
 
     if df_escalera is not None and (
@@ -97,7 +105,7 @@ def comparativa_grafica():
         df_escalera = df_escalera[df_escalera["Cliente"].isin(clientes_filtrados)]
 
         # 📊 Gráfico por Cliente
-        resumen_cliente = df_escalera.groupby("Cliente")["Monto"].sum().reset_index()
+        resumen_cliente = df_escalera.groupby("Cliente", observed=True)["Monto"].sum().reset_index()
         fig_cliente = px.bar(resumen_cliente, x="Cliente", y="Monto", text="Monto",
                             title="Ventas Totales por Cliente")
         fig_cliente.update_traces(texttemplate="%{text:$,.0f}", textposition="outside")
@@ -131,32 +139,22 @@ def comparativa_grafica():
             st.stop()
 
     # 📌 Validar si NO hay orders ni sales ni escalera
-    if df_orders.empty and df_sales.empty and df_escalera is None:
-        st.warning("⚠️ No hay datos cargados. Ve a 'Importar Reportes' para cargar al menos un archivo.")
-    st.stop()
-
-    # 📌 Procesamiento de columnas
-    df_orders = convertir_columnas_fecha(df_orders, ["Ship On"])
-    df_sales = convertir_columnas_fecha(df_sales, ["Invoice Date"])
-    df_orders["Amount"] = pd.to_numeric(df_orders["Amount"], errors='coerce')
-    df_sales["Amount"] = pd.to_numeric(df_sales["Amount"], errors='coerce')
+    cubo = st.session_state.get("cubo_ventas")
+    if cubo is None:
+        if df_escalera is None:
+            st.warning("⚠️ No hay datos cargados. Ve a 'Importar Reportes' para cargar al menos un archivo.")
+        st.stop()
 
     # 📌 Filtro de cliente único o todos
-    clientes_unicos = sorted(df_orders["Customer"].dropna().unique().tolist())
+    clientes_unicos = sorted(cubo["Customer"].cat.categories.tolist())
     cliente_seleccionado = st.sidebar.selectbox("📌 Filtrar por Cliente", ["Todos"] + clientes_unicos)
 
-    # 📌 Agrupación temporal
+    # 📌 Agrupación temporal (columna del cubo)
     agrupacion = st.sidebar.radio("📊 Agrupar por:", ["Semana", "Mes"])
+    col_periodo = "Semana" if agrupacion == "Semana" else "Mes"
 
-    if agrupacion == "Semana":
-        df_orders["Periodo"] = df_orders["Ship On"].dt.to_period("W").dt.start_time
-        df_sales["Periodo"] = df_sales["Invoice Date"].dt.to_period("W").dt.start_time
-    else:
-        df_orders["Periodo"] = df_orders["Ship On"].dt.to_period("M").dt.start_time
-        df_sales["Periodo"] = df_sales["Invoice Date"].dt.to_period("M").dt.start_time
-
-    # 📌 Obtener periodos disponibles después de crear 'Periodo'
-    periodos_disponibles = sorted(df_sales["Periodo"].dropna().unique())
+    # 📌 Obtener periodos disponibles (periodos con ventas)
+    periodos_disponibles = sorted(cubo.loc[cubo["Lineas Ventas"] > 0, col_periodo].dropna().unique())
 
     # 📌 Formato de nombre según agrupación
     if agrupacion == "Semana":
@@ -176,40 +174,29 @@ def comparativa_grafica():
     else:
         periodo_dt = None
 
-    # 📌 Filtrar por periodo seleccionado
-    if periodo_dt:
-        df_orders_periodo = df_orders[df_orders["Periodo"] == periodo_dt]
-        df_sales_periodo = df_sales[df_sales["Periodo"] == periodo_dt]
-    else:
-        df_orders_periodo = df_orders.copy()
-        df_sales_periodo = df_sales.copy()
+    filtro_periodo = {col_periodo: periodo_dt} if periodo_dt else None
 
     # 📊 Resumen completo sin filtro de periodo (para gráfica general)
-    periodos_totales_completo = sorted(set(df_orders["Periodo"]).union(set(df_sales["Periodo"])))
-    clientes_totales_completo = sorted(
-        set(df_orders["Customer"].dropna()).union(set(df_sales["Customer"].dropna())))
-
-    base_completa = pd.MultiIndex.from_product([periodos_totales_completo, clientes_totales_completo],
-                                               names=["Periodo", "Customer"]).to_frame(index=False)
-
-    resumen_orders_completo = df_orders.groupby(["Periodo", "Customer"])["Amount"].sum().reset_index(
-        name="Pronosticado")
-    resumen_sales_completo = df_sales.groupby(["Periodo", "Customer"])["Amount"].sum().reset_index(name="Vendido")
-
-    resumen_completo = base_completa.merge(resumen_orders_completo, on=["Periodo", "Customer"], how="left")
-    resumen_completo = resumen_completo.merge(resumen_sales_completo, on=["Periodo", "Customer"], how="left")
-    resumen_completo.fillna(0, inplace=True)
-    resumen_completo["Diferencia"] = resumen_completo["Vendido"] - resumen_completo["Pronosticado"]
+    with seccion("Resumen por periodo y cliente", "agregación"):
+        resumen_completo = pronostico_vs_ventas(cubo, col_periodo)
 
     col3, col4 = st.columns(2)
     with col3:
-        st.metric("Órdenes Pronosticadas", f"${df_orders['Amount'].sum():,.2f}")
+        st.metric("Órdenes Pronosticadas", f"${cubo['Pronosticado'].sum():,.2f}")
     with col4:
-        st.metric("Ventas Totales", f"${df_sales['Amount'].sum():,.2f}")
+        st.metric("Ventas Totales", f"${cubo['Vendido'].sum():,.2f}")
 
+    # 📌 Ventas y pronóstico por cliente en el periodo seleccionado
+    # (sin periodo se limita el pronóstico hasta la última venta real)
+    with seccion("Resumen por cliente", "agregación"):
+        resumen_cliente_periodo = consultar_cubo_ventas(
+            cubo, ["Customer"], filtros=filtro_periodo, hasta_ultima_venta=periodo_dt is None
+        )
 
     # 📊 Top 5 Clientes con Más Ventas en el periodo seleccionado
-    resumen_ventas_periodo = df_sales_periodo.groupby("Customer")["Amount"].sum().reset_index(name="Vendido")
+    resumen_ventas_periodo = resumen_cliente_periodo.loc[
+        resumen_cliente_periodo["Lineas Ventas"] > 0, ["Customer", "Vendido"]
+    ]
 
     # Si no hay ventas, evitar error
     if resumen_ventas_periodo.empty:
@@ -234,29 +221,19 @@ def comparativa_grafica():
     st.subheader("📊 Ventas por Cliente")
 
     # 📌 Obtener lista de clientes únicos
-    clientes_unicos = sorted(set(df_orders["Customer"].dropna()).union(set(df_sales["Customer"].dropna())))
+    clientes_unicos = sorted(resumen_completo["Customer"].unique())
 
     # 📌 Expander con multiselect
     with st.expander("🔎 Filtro opcional por Cliente"):
         clientes_seleccionados = st.multiselect("Selecciona uno o más clientes", clientes_unicos)
 
-    # 📌 Filtrar por periodo
+    # 📌 Títulos según periodo
     if periodo_dt:
-        ventas_mes = df_sales_periodo.groupby("Customer")["Amount"].sum().reset_index(name="Vendido")
-        pron_mes = df_orders_periodo.groupby("Customer")["Amount"].sum().reset_index(name="Pronosticado")
         titulo_mes = f" en {periodo_seleccionado}"
     else:
-        # ✅ NUEVO: limitar pronóstico hasta la última venta real
-        fecha_max_ventas = df_sales["Invoice Date"].max()
-        df_orders_filtrado = df_orders[df_orders["Ship On"] <= fecha_max_ventas]
-
-        ventas_mes = df_sales.groupby("Customer")["Amount"].sum().reset_index(name="Vendido")
-        pron_mes = df_orders_filtrado.groupby("Customer")["Amount"].sum().reset_index(name="Pronosticado")
         titulo_mes = " (Todos los periodos)"
 
-
-    # 📌 Unir ambos DataFrames
-    df_ventas_completo = pd.merge(ventas_mes, pron_mes, on="Customer", how="outer").fillna(0)
+    df_ventas_completo = resumen_cliente_periodo[["Customer", "Vendido", "Pronosticado"]]
 
     # 📌 Filtrar si se seleccionaron clientes específicos
     if clientes_seleccionados:
@@ -304,33 +281,9 @@ def comparativa_grafica():
 
     st.subheader("📈 Ventas vs Pronóstico por Mes")
 
-    # 📌 Copia y conversión de fechas
-    df_orders_mes = df_orders.copy()
-    df_sales_mes = df_sales.copy()
-
-    df_orders_mes = convertir_columnas_fecha(df_orders_mes, ["Ship On"])
-    df_sales_mes = convertir_columnas_fecha(df_sales_mes, ["Invoice Date"])
-
-    # 📌 Crear columna de periodo mensual (primer día del mes)
-    df_orders_mes["Periodo"] = df_orders_mes["Ship On"].dt.to_period("M").dt.to_timestamp()
-    df_sales_mes["Periodo"] = df_sales_mes["Invoice Date"].dt.to_period("M").dt.to_timestamp()
-
-    # 📌 Agrupar por mes
-    ventas_por_mes = df_sales_mes.groupby("Periodo")["Amount"].sum().reset_index(name="Vendido")
-    pronostico_por_mes = df_orders_mes.groupby("Periodo")["Amount"].sum().reset_index(name="Pronosticado")
-
-    # 📌 Generar rango completo de meses
-    min_fecha = min(ventas_por_mes["Periodo"].min(), pronostico_por_mes["Periodo"].min())
-    max_fecha = max(ventas_por_mes["Periodo"].max(), pronostico_por_mes["Periodo"].max())
-    rango_meses = pd.date_range(start=min_fecha, end=max_fecha, freq="MS")
-
-    df_base = pd.DataFrame({"Periodo": rango_meses})
-
-    # 📌 Unir datos con la base completa de meses
-    df_mes = df_base.merge(ventas_por_mes, on="Periodo", how="left")
-    df_mes = df_mes.merge(pronostico_por_mes, on="Periodo", how="left")
-    df_mes.fillna(0, inplace=True)
-    df_mes = df_mes.sort_values("Periodo")
+    # 📌 Agrupar por mes y generar rango completo de meses
+    with seccion("Resumen por mes", "agregación"):
+        df_mes = pronostico_vs_ventas_mensual(cubo)
 
     # 📊 Gráfica combinada
     fig_mes_tendencia = go.Figure()
@@ -381,10 +334,7 @@ def comparativa_grafica():
         tipo_grafica = st.sidebar.radio("📈 Tipo de gráfica:", ["Barras", "Líneas", "Dispersión", "Área"])
 
         # 📌 Filtrar resumen_completo según cliente
-        resumen_filtrado = resumen_completo.copy()
-
-        if cliente_seleccionado != "Todos":
-            resumen_filtrado = resumen_filtrado[resumen_filtrado["Customer"] == cliente_seleccionado]
+        resumen_filtrado = resumen_completo[resumen_completo["Customer"] == cliente_seleccionado]
 
         # 📌 Quitar periodos sin datos (ambos en 0)
         resumen_filtrado = resumen_filtrado[
@@ -437,15 +387,10 @@ def comparativa_grafica():
         # 📊 Gráfica detalle por Item de un cliente en ese mes
         st.subheader(f"📊 Detalle por Item de {cliente_seleccionado} en {periodo_seleccionado}")
 
-        pron_item = df_orders[
-            (df_orders["Periodo"] == periodo_dt) & (df_orders["Customer"] == cliente_seleccionado)
-            ].groupby("Item")["Amount"].sum().reset_index(name="Pronosticado")
-
-        vent_item = df_sales[
-            (df_sales["Periodo"] == periodo_dt) & (df_sales["Customer"] == cliente_seleccionado)
-            ].groupby("Item")["Amount"].sum().reset_index(name="Vendido")
-
-        detalle_item = pd.merge(pron_item, vent_item, on="Item", how="outer").fillna(0)
+        with seccion("Detalle por Item", "agregación"):
+            detalle_item = consultar_cubo_ventas(
+                cubo, ["Item"], filtros={col_periodo: periodo_dt, "Customer": cliente_seleccionado}
+            )[["Item", "Pronosticado", "Vendido"]]
         detalle_item["Diferencia"] = detalle_item["Vendido"] - detalle_item["Pronosticado"]
 
         # Derretir para gráfica
@@ -479,136 +424,157 @@ def analizar_ordenes_por_plataforma():
     uploaded_orders = st.file_uploader("📄 Cargar archivo de órdenes", type=["xlsx"], key="orders_platform")
 
     if uploaded_orders:
-        columnas_requeridas = [
-            "Week Of", "Ship From", "Customer", "Ship To", "Item", "On Hand",
-            "Customer PO", "Order #", "Customer Item", "Wanted On", "Ship On",
-            "Quantity", "Unit Price", "Amount", "Firm/Planned", "Platform"
-        ]
-
-        df_orders, error = cargar_datos_columnas_requeridas(uploaded_orders, columnas_requeridas, skiprows=4)
+        huella = hash_contenido(uploaded_orders)
+        with seccion("Lectura órdenes por plataforma", "carga") as s:
+            df_orders, error = s.carga(cargar_ordenes_plataforma(huella, uploaded_orders))
 
         if error:
             st.error(f"❌ Error en columnas: {error}")
             return
 
-        df_orders = convertir_columnas_numericas(df_orders, ["Quantity", "Amount"])
-        df_orders = convertir_columnas_fecha(df_orders, ["Wanted On"])
+        # 📌 Guardar en session_state para conservarlo al cambiar de página
+        st.session_state.df_ordenes_plataforma = df_orders
+        st.session_state.huella_ordenes_plataforma = huella
 
-        # ==== FILTROS ====
-        col1, col2, col3 = st.columns(3)
+    elif "df_ordenes_plataforma" in st.session_state:
+        df_orders = st.session_state.df_ordenes_plataforma
+        huella = st.session_state.huella_ordenes_plataforma
+        st.caption("Mostrando el último archivo de órdenes cargado.")
 
-        with col1:
-            plataformas = sorted(df_orders["Platform"].dropna().unique())
-            plataformas_seleccionadas = st.multiselect("🎯 Plataforma(s)", plataformas, default=plataformas)
+    else:
+        return
 
-        # Actualizar ship_to dinámicamente según plataformas seleccionadas
-        df_temp = df_orders[df_orders["Platform"].isin(plataformas_seleccionadas)] if plataformas_seleccionadas else df_orders
-        destinos_disponibles = sorted(df_temp["Ship To"].dropna().unique())
+    with seccion("Agregados por plataforma", "agregación") as s:
+        agregados = s.carga(agregados_plataforma(huella, df_orders))
 
-        with col2:
-            destinos_seleccionados = st.multiselect("🚚 Ship To", destinos_disponibles, default=destinos_disponibles)
+    # ==== FILTROS ====
+    col1, col2, col3 = st.columns(3)
 
-        with col3:
-            fechas_disponibles = df_temp["Wanted On"].dropna()
+    with col1:
+        plataformas = sorted(agregados["Platform"].unique())
+        plataformas_seleccionadas = st.multiselect("🎯 Plataforma(s)", plataformas, default=plataformas)
 
-            if not fechas_disponibles.empty:
-                min_date = fechas_disponibles.min().date()
-                max_date = fechas_disponibles.max().date()
+    # Actualizar ship_to dinámicamente según plataformas seleccionadas
+    agregados_temp = agregados[agregados["Platform"].isin(plataformas_seleccionadas)] if plataformas_seleccionadas else agregados
+    destinos_disponibles = sorted(agregados_temp["Ship To"].unique())
 
-                fechas_seleccionadas = st.date_input(
-                    "📆 Rango de fechas (Wanted On)",
-                    value=(min_date, max_date),
-                    min_value=min_date,
-                    max_value=max_date
-                )
+    with col2:
+        destinos_seleccionados = st.multiselect("🚚 Ship To", destinos_disponibles, default=destinos_disponibles)
 
-                # 🔐 Forzamos validación
-                if isinstance(fechas_seleccionadas, tuple) and len(fechas_seleccionadas) == 2:
-                    fecha_inicio, fecha_fin = fechas_seleccionadas
-                else:
-                    st.warning("⚠️ Selecciona una fecha de inicio y una fecha final para mostrar los resultados.")
-                    return
+    with col3:
+        if not agregados_temp.empty:
+            min_date = agregados_temp["Wanted On"].min().date()
+            max_date = agregados_temp["Wanted On"].max().date()
+
+            fechas_seleccionadas = st.date_input(
+                "📆 Rango de fechas (Wanted On)",
+                value=(min_date, max_date),
+                min_value=min_date,
+                max_value=max_date
+            )
+
+            # 🔐 Forzamos validación
+            if isinstance(fechas_seleccionadas, tuple) and len(fechas_seleccionadas) == 2:
+                fecha_inicio, fecha_fin = fechas_seleccionadas
             else:
-                st.warning("⚠️ No hay fechas disponibles en los datos para aplicar filtro.")
+                st.warning("⚠️ Selecciona una fecha de inicio y una fecha final para mostrar los resultados.")
                 return
-    
-        # ==== VALIDACIÓN DE FECHAS ====
-        if not fecha_inicio or not fecha_fin:
-            st.warning("⚠️ Por favor selecciona un rango de fechas válido para continuar.")
+        else:
+            st.warning("⚠️ No hay fechas disponibles en los datos para aplicar filtro.")
             return
 
-        # ==== APLICAR FILTROS ====
-        df_filtrado = df_orders.copy()
-        if plataformas_seleccionadas:
-            df_filtrado = df_filtrado[df_filtrado["Platform"].isin(plataformas_seleccionadas)]
-        if destinos_seleccionados:
-            df_filtrado = df_filtrado[df_filtrado["Ship To"].isin(destinos_seleccionados)]
-
+    # ==== APLICAR FILTROS (sobre los agregados) ====
+    agregados_filtrados = agregados_temp
+    if destinos_seleccionados:
+        agregados_filtrados = agregados_filtrados[agregados_filtrados["Ship To"].isin(destinos_seleccionados)]
+
+    agregados_filtrados = agregados_filtrados[
+        (agregados_filtrados["Wanted On"] >= pd.to_datetime(fecha_inicio)) &
+        (agregados_filtrados["Wanted On"] <= pd.to_datetime(fecha_fin))
+    ]
+
+    if agregados_filtrados.empty:
+        st.warning("⚠️ No hay datos para los filtros seleccionados.")
+        return
+
+    # ==== RESUMEN POR PLATAFORMA ====
+    resumen_chart = agregados_filtrados.groupby("Platform", observed=True).agg(
+        Total_Piezas=("Piezas", "sum"),
+        Total_Monto=("Monto", "sum")
+    ).reset_index()
+
+    # Aplicar formatos
+    resumen = resumen_chart.copy()
+    resumen["Total_Piezas"] = resumen["Total_Piezas"].map("{:,.0f}".format)
+    resumen["Total_Monto"] = resumen["Total_Monto"].map("${:,.2f}".format)
+
+    st.markdown("### 📊 Resumen por Plataforma")
+    st.dataframe(resumen)
+
+    # ==== GRÁFICAS ====
+    col_pie1, col_pie2 = st.columns(2)
+    with col_pie1:
+        fig_piezas = px.pie(resumen_chart, values="Total_Piezas", names="Platform", title="Distribución de Piezas")
+        st.plotly_chart(fig_piezas, use_container_width=True)
+
+    with col_pie2:
+        fig_monto = px.pie(resumen_chart, values="Total_Monto", names="Platform", title="Distribución de Monto")
+        st.plotly_chart(fig_monto, use_container_width=True)
+
+    # ==== TENDENCIA SEMANAL ====
+    resumen_semana = agregados_filtrados.groupby(["Semana", "Platform"], observed=True)["Piezas"].sum().reset_index()
+    fig_semana = px.bar(resumen_semana, x="Semana", y="Piezas", color="Platform",
+                        title="Piezas por Semana (Wanted On)")
+    fig_semana.update_layout(hovermode="x unified", yaxis_tickformat=",.0f")
+    st.plotly_chart(fig_semana, use_container_width=True)
+
+    # ==== RESUMEN POR DESTINO ====
+    st.markdown("### 📦 Destino de Órdenes")
+    destino_chart = agregados_filtrados.groupby("Ship To", observed=True).agg(
+        Piezas=("Piezas", "sum"),
+        Monto=("Monto", "sum")
+    ).reset_index()
+
+    destino_resumen = destino_chart.copy()
+    destino_resumen["Piezas"] = destino_resumen["Piezas"].map("{:,.0f}".format)
+    destino_resumen["Monto"] = destino_resumen["Monto"].map("${:,.2f}".format)
+
+    st.dataframe(destino_resumen)
+
+    # ==== EXPORTACIÓN ====
+    def hojas_exportacion():
+        # Filas originales tomadas del índice de facetas (sin recorrer todo el archivo por columna)
+        with seccion("Filtro exportación", "filtro"):
+            indice = indice_facetas(huella, ("Platform", "Ship To"), df_orders)
+            df_filtrado = df_orders.iloc[filas_facetas(indice, {
+                "Platform": plataformas_seleccionadas,
+                "Ship To": destinos_seleccionados
+            })]
         df_filtrado = df_filtrado[
-            (df_filtrado["Wanted On"] >= pd.to_datetime(fecha_inicio)) &
-            (df_filtrado["Wanted On"] <= pd.to_datetime(fecha_fin))
+            (df_filtrado["Wanted On"].dt.normalize() >= pd.to_datetime(fecha_inicio)) &
+            (df_filtrado["Wanted On"].dt.normalize() <= pd.to_datetime(fecha_fin))
         ]
-
-        if df_filtrado.empty:
-            st.warning("⚠️ No hay datos para los filtros seleccionados.")
-            return
-
-        # ==== RESUMEN POR PLATAFORMA ====
-        resumen = df_filtrado.groupby("Platform").agg(
-            Total_Piezas=("Quantity", "sum"),
-            Total_Monto=("Amount", "sum")
-        ).reset_index()
-
-        # Aplicar formatos
-        resumen["Total_Piezas"] = resumen["Total_Piezas"].map("{:,.0f}".format)
-        resumen["Total_Monto"] = resumen["Total_Monto"].map("${:,.2f}".format)
-
-        st.markdown("### 📊 Resumen por Plataforma")
-        st.dataframe(resumen)
-
-        # ==== GRÁFICAS ====
-        resumen_chart = df_filtrado.groupby("Platform").agg(
-            Total_Piezas=("Quantity", "sum"),
-            Total_Monto=("Amount", "sum")
-        ).reset_index()
-
-        col_pie1, col_pie2 = st.columns(2)
-        with col_pie1:
-            fig_piezas = px.pie(resumen_chart, values="Total_Piezas", names="Platform", title="Distribución de Piezas")
-            st.plotly_chart(fig_piezas, use_container_width=True)
-
-        with col_pie2:
-            fig_monto = px.pie(resumen_chart, values="Total_Monto", names="Platform", title="Distribución de Monto")
-            st.plotly_chart(fig_monto, use_container_width=True)
-
-        # ==== RESUMEN POR DESTINO ====
-        st.markdown("### 📦 Destino de Órdenes")
-        destino_resumen = df_filtrado.groupby("Ship To").agg(
-            Piezas=("Quantity", "sum"),
-            Monto=("Amount", "sum")
-        ).reset_index()
-
-        destino_resumen["Piezas"] = destino_resumen["Piezas"].map("{:,.0f}".format)
-        destino_resumen["Monto"] = destino_resumen["Monto"].map("${:,.2f}".format)
-
-        st.dataframe(destino_resumen)
-
-        # ==== EXPORTACIÓN ====
-        st.download_button(
-            label="⬇️ Descargar resumen en Excel",
-            data=exportar_excel(resumen_chart),
-            file_name="resumen_por_plataforma.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        return {"Órdenes": df_filtrado, "Resumen": resumen_chart, "Destinos": destino_chart,
+                "Plataforma Destino Día": agregados_filtrados}
+
+    boton_descarga_reporte(
+        hojas_exportacion,
+        "resumen_por_plataforma",
+        key="descarga_plataforma",
+        label="⬇️ Descargar órdenes y resumen",
+        firma=(huella, tuple(plataformas_seleccionadas), tuple(destinos_seleccionados), fecha_inicio, fecha_fin)
+    )
 
 def analizar_forecast_compras():
     st.subheader("📦 Análisis de Forecast de Compras")
 
     uploaded_file = st.file_uploader("📄 Cargar archivo de forecast de compras", type=["xlsx"], key="forecast_compras")
 
+    df = None
     if uploaded_file:
         columnas_requeridas = ["Item", "Type", "Wanted On", "Quantity", "Datos", "Vendor", "PO", "Unit Price (MXN)", "Total"]
-        df, error = cargar_datos_columnas_requeridas(uploaded_file, columnas_requeridas)
+        with seccion("Lectura forecast de compras", "carga") as s:
+            df, error = s.carga(cargar_datos_columnas_requeridas(uploaded_file, columnas_requeridas))
 
         if error:
             st.error(f"❌ Error en archivo: {error}")
@@ -617,28 +583,39 @@ def analizar_forecast_compras():
         # Procesar columnas
         df = convertir_columnas_fecha(df, ["Wanted On"])
         df = convertir_columnas_numericas(df, ["Quantity", "Unit Price (MXN)", "Total"])
+        df = con_llaves(df)
+        huella = hash_contenido(uploaded_file)
 
+    elif st.session_state.get("df_forecast_compras") is not None:
+        df = st.session_state.df_forecast_compras
+        huella = st.session_state.huella_forecast_compras
+        st.caption("Mostrando el último forecast publicado desde la carpeta del ERP.")
+
+    if df is not None:
         # ==== FILTROS DINÁMICOS EN LA SIDEBAR ====
         with st.sidebar:
             st.markdown("### 🎯 Filtros de Forecast de Compras")
 
+            # Índice de facetas (filas por valor), una vez por archivo
+            with seccion("Índice de facetas", "filtro"):
+                indice = indice_facetas(huella, ("Type", "Vendor", "PO"), df)
+
             # ==== FILTRO 1: Type ====
-            types_disponibles = sorted(df["Type"].dropna().unique())
+            types_disponibles = indice["valores"]["Type"].tolist()
             type_seleccionado = st.multiselect("🏷️ Tipo(s)", types_disponibles, default=types_disponibles)
 
-            df_temp = df[df["Type"].isin(type_seleccionado)] if type_seleccionado else df.copy()
-
             # ==== FILTRO 2: Vendor ====
-            vendors_disponibles = sorted(df_temp["Vendor"].dropna().unique())
+            filas = filas_facetas(indice, {"Type": type_seleccionado})
+            vendors_disponibles = opciones_faceta(indice, "Vendor", filas)
             proveedores_seleccionados = st.multiselect("🏢 Proveedor(es)", vendors_disponibles, default=vendors_disponibles)
 
-            df_temp = df_temp[df_temp["Vendor"].isin(proveedores_seleccionados)] if proveedores_seleccionados else df_temp
-
             # ==== FILTRO 3: PO ====
-            pos_disponibles = sorted(df_temp["PO"].dropna().unique())
+            filas = filas_facetas(indice, {"Type": type_seleccionado, "Vendor": proveedores_seleccionados})
+            pos_disponibles = opciones_faceta(indice, "PO", filas)
             pos_seleccionadas = st.multiselect("📄 Orden(es) de Compra (PO)", pos_disponibles, default=pos_disponibles)
 
-            df_temp = df_temp[df_temp["PO"].isin(pos_seleccionadas)] if pos_seleccionadas else df_temp
+            filas = filas_facetas(indice, {"Type": type_seleccionado, "Vendor": proveedores_seleccionados, "PO": pos_seleccionadas})
+            df_temp = df.iloc[filas]
 
             # ==== FILTRO 4: Fecha ====
             fechas_disponibles = df_temp["Wanted On"].dropna()
@@ -666,17 +643,6 @@ def analizar_forecast_compras():
                 st.warning("⚠️ No hay fechas disponibles.")
                 st.stop()
 
-        # ==== APLICAR FILTROS ====
-        df_filtrado = df[
-            (df["Wanted On"] >= pd.to_datetime(fecha_inicio)) &
-            (df["Wanted On"] <= pd.to_datetime(fecha_fin)) &
-            (df["Vendor"].isin(proveedores_seleccionados)) &
-            (df["PO"].isin(pos_seleccionadas))
-        ]
-
-        if type_seleccionado != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["Type"].isin(type_seleccionado)]
-
         if df_filtrado.empty:
             st.warning("⚠️ No hay datos para los filtros seleccionados.")
             return
@@ -738,13 +704,24 @@ def analizar_forecast_compras():
             )
             st.plotly_chart(fig_fecha, use_container_width=True)
             
+        # Estado de filtros: identifica la descarga y la agregación mensual
+        llave_filtros = (
+            huella, tuple(type_seleccionado), tuple(proveedores_seleccionados),
+            tuple(pos_seleccionadas), fecha_inicio, fecha_fin
+        )
+
         # ==== DESCARGA ====
         st.markdown("### 📤 Descargar Análisis")
-        st.download_button(
-            label="⬇️ Descargar en Excel",
-            data=exportar_excel(df_filtrado),
-            file_name="analisis_forecast_compras.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        boton_descarga_reporte(
+            lambda: {
+                "Forecast": df_filtrado,
+                "Por Proveedor": df_filtrado.groupby("Vendor").agg(Total_Compra=("Total", "sum"), Piezas=("Quantity", "sum")).reset_index(),
+                "Por Fecha": df_filtrado.groupby("Wanted On").agg(Total=("Total", "sum"), Piezas=("Quantity", "sum")).reset_index(),
+            },
+            "analisis_forecast_compras",
+            key="descarga_forecast",
+            label="⬇️ Descargar análisis",
+            firma=llave_filtros
         )
 
 
@@ -753,47 +730,37 @@ def analizar_forecast_compras():
         # =========================
         st.markdown("## 📅 Cantidades por Tipo, Mes y Año")
 
-        # Preparar datos
-        df_calendario = df_filtrado.copy()
-        df_calendario["Mes"] = df_calendario["Wanted On"].dt.month_name()
-        df_calendario["Mes_Num"] = df_calendario["Wanted On"].dt.month
-        df_calendario["Año"] = df_calendario["Wanted On"].dt.year
-
-        # Ordenar meses correctamente
-        orden_meses_en = [
-            "January", "February", "March", "April", "May", "June",
-            "July", "August", "September", "October", "November", "December"
-        ]
-
-        df_calendario["Mes"] = pd.Categorical(df_calendario["Mes"], categories=orden_meses_en, ordered=True)
+        # Una sola agregación mensual por estado de filtros; años y tipos sólo la rebanan
+        with seccion("Forecast mensual por tipo", "agregación"):
+            mensual = forecast_mensual_por_tipo(llave_filtros, df_filtrado)
+        meses_mensual = mensual.index.get_level_values("MesAño")
 
         # Filtro de años
-        años_disponibles = sorted(df_calendario["Año"].dropna().unique())
+        años_disponibles = sorted(meses_mensual.year.unique())
         años_seleccionados = st.multiselect("📆 Selecciona año(s) a mostrar:", años_disponibles, default=años_disponibles)
-        df_calendario = df_calendario[df_calendario["Año"].isin(años_seleccionados)]
 
         # Filtro de tipos
-        tipos_disponibles = sorted(df_calendario["Type"].dropna().unique())
+        tipos_disponibles = sorted(mensual.index.get_level_values("Type").unique())
         tipos_seleccionados = st.multiselect("🏷️ Selecciona Tipo(s):", tipos_disponibles, default=tipos_disponibles)
-        df_calendario = df_calendario[df_calendario["Type"].isin(tipos_seleccionados)]
 
-        if df_calendario.empty:
+        mensual = mensual[
+            meses_mensual.year.isin(años_seleccionados) &
+            mensual.index.get_level_values("Type").isin(tipos_seleccionados)
+        ]
+
+        if mensual.empty:
             st.warning("⚠️ No hay datos para los filtros seleccionados.")
             return
 
-        # Agrupar y pivotear
-        tabla_pivot = df_calendario.groupby(["Type", "Año", "Mes"]).agg({"Quantity": "sum"}).reset_index()
-        tabla_pivot = tabla_pivot.pivot_table(index="Type", columns=["Año", "Mes"], values="Quantity", fill_value=0)
-
-        # Ordenar columnas
-        tabla_pivot = tabla_pivot.sort_index(axis=1, level=[0, 1])
-
-        # Calcular fila Total
-        fila_total = tabla_pivot.sum(axis=0).to_frame().T
-        fila_total.index = ["TOTAL"]
+        # Tabla Type × (Año, Mes), columnas ya en orden cronológico
+        tabla_pivot = mensual.unstack("MesAño", fill_value=0)
+        tabla_pivot.columns = pd.MultiIndex.from_arrays(
+            [tabla_pivot.columns.year, tabla_pivot.columns.month_name()], names=["Año", "Mes"]
+        )
 
-        # Combinar tabla con fila total
-        tabla_final = pd.concat([tabla_pivot, fila_total])
+        # Fila Total
+        tabla_final = tabla_pivot.copy()
+        tabla_final.loc["TOTAL"] = tabla_pivot.sum(axis=0)
 
         # Mostrar tabla
         st.dataframe(tabla_final.style.format("${:,.2f}"), use_container_width=True)
@@ -803,31 +770,13 @@ def analizar_forecast_compras():
         # =========================
         st.markdown("### 📈 Gráfica de Cantidades por Tipo, Mes y Año")
 
-        # Usamos el mismo df_calendario filtrado
-        df_grafica = df_calendario.copy()
-
-        # Crear columna MesAño como etiqueta tipo Timestamp (inicio de mes)
-        df_grafica["MesAño"] = df_grafica["Wanted On"].dt.to_period("M").dt.to_timestamp()
-        df_grafica = df_grafica.sort_values("MesAño")
-
-        # Crear rango completo de meses desde el primer al último mes disponible
-        rango_meses = pd.date_range(
-            start=df_grafica["MesAño"].min(),
-            end=df_grafica["MesAño"].max(),
-            freq="MS"  # Month Start
-        )
-
-        # Obtener todos los tipos seleccionados
-        tipos = df_grafica["Type"].unique()
-
-        # Crear combinaciones de todos los meses con todos los tipos
+        # Rango completo de meses con todos los tipos, rellenando con 0
+        meses_presentes = mensual.index.get_level_values("MesAño")
+        rango_meses = pd.date_range(start=meses_presentes.min(), end=meses_presentes.max(), freq="MS")
+        tipos = mensual.index.get_level_values("Type").unique()
         index_completo = pd.MultiIndex.from_product([rango_meses, tipos], names=["MesAño", "Type"])
 
-        # Agrupar datos originales
-        df_grouped = df_grafica.groupby(["MesAño", "Type"])["Quantity"].sum()
-
-        # Reindexar para asegurar que todos los puntos estén presentes (incluso con 0)
-        df_grouped = df_grouped.reindex(index_completo, fill_value=0).reset_index()
+        df_grouped = mensual.swaplevel().reindex(index_completo, fill_value=0).reset_index()
 
         # Crear gráfica
         fig = px.line(
@@ -855,11 +804,12 @@ def analizar_forecast_compras():
         st.plotly_chart(fig, use_container_width=True)
 
         # Descargar
-        st.download_button(
-            label="⬇️ Descargar tabla por mes en Excel",
-            data=exportar_excel(tabla_final.reset_index()),
-            file_name="resumen_tipo_mes.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        boton_descarga_reporte(
+            {"Tipo por Mes": tabla_final.rename_axis("Type"), "Mensual por Tipo": df_grouped},
+            "resumen_tipo_mes",
+            key="descarga_tipo_mes",
+            label="⬇️ Descargar tabla por mes",
+            firma=(llave_filtros, tuple(años_seleccionados), tuple(tipos_seleccionados))
         )
     else:
         st.info("📥 Por favor, carga un archivo Excel para comenzar el análisis.")
@@ -0,0 +1,292 @@
+# vigilante.py
+"""
+Vigilante de la carpeta donde el ERP deja sus exportes programados.
+
+Cada .xlsx nuevo o modificado se reconoce por su encabezado (utils.clasificar_reporte),
+se lee en segundo plano con los lectores de utils.py y se publica en los datasets
+compartidos (datos/datasets); los MRP van al historial de snapshots. Al abrir la app,
+cada sesión toma la versión publicada (cargar_datasets_publicados) sin pasar por
+st.file_uploader.
+
+La carpeta se indica con LAMTEC_CARPETA_ERP y app.py levanta el vigilante en un hilo
+daemon la primera vez. También puede correr como servicio aparte (en ese caso deja
+LAMTEC_CARPETA_ERP vacío en la app para que no haya dos escritores):
+
+    python vigilante.py /ruta/exportes_erp
+    python vigilante.py /ruta/exportes_erp --una-vez
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+if __name__ == "__main__":
+    # Como servicio aparte: sin los avisos de @st.cache_data fuera del Runtime de Streamlit
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")
+    import warnings
+    warnings.simplefilter("ignore", pd.errors.SettingWithCopyWarning)
+
+import utils
+from metricas import exportes_procesados
+
+CARPETA_ERP = os.environ.get("LAMTEC_CARPETA_ERP", "")
+
+# El ERP escribe el archivo por partes: se procesa cuando deja de cambiar este tiempo
+ESPERA_ESTABLE_SEGUNDOS = 2.0
+
+# Dataset publicado → llave de session_state que usan las páginas
+DATASETS_SESION = {
+    "timecard": "df_clean",
+    "timecard_diario": "diario_timecard",
+    "programacion": "df_plan",
+    "downtime": "df_downtime_procesado",
+    "orders": "df_orders",
+    "sales": "df_sales",
+    "forecast": "df_forecast_compras",
+}
+
+_logger = logging.getLogger("lamtec.vigilante")
+_candado = threading.Lock()
+_vigilante = None
+
+
+def es_exporte(ruta):
+    nombre = os.path.basename(ruta)
+    return nombre.lower().endswith(".xlsx") and not nombre.startswith("~$")
+
+
+# 📥 PROCESAMIENTO DE UN EXPORTE
+
+def procesar_exporte(ruta):
+    """
+    Clasifica, lee y publica un exporte. Los archivos con contenido ya procesado se saltan.
+    Devuelve el estado: publicado, repetido, no reconocido o error.
+    """
+    try:
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+    except OSError as e:
+        _logger.warning("No se pudo abrir %s: %s", ruta, e)
+        exportes_procesados.incrementar("?", "error")
+        return "error"
+
+    huella = hashlib.sha256(contenido).hexdigest()
+    if utils.exporte_procesado(huella):
+        return "repetido"
+
+    archivo = BytesIO(contenido)
+    archivo.name = os.path.basename(ruta)
+    fecha = datetime.fromtimestamp(os.path.getmtime(ruta))
+
+    tipo = "?"
+    try:
+        tipo, skiprows = utils.clasificar_reporte(archivo)
+        if tipo is None:
+            _logger.info("%s: el encabezado no coincide con ningún reporte conocido", ruta)
+            utils.marcar_exporte_procesado(huella)
+            exportes_procesados.incrementar("?", "no reconocido")
+            return "no reconocido"
+
+        if tipo == "mrp":
+            clave, _ = utils.guardar_snapshot_mrp(archivo, fecha)
+            utils.marcar_exporte_procesado(huella)
+            _logger.info("%s: snapshot MRP %s", ruta, clave)
+        else:
+            _, datos, error = utils.leer_reporte(archivo, tipo, skiprows)
+            if datos is None:
+                raise ValueError(error)
+            if tipo == "timecard":
+                # Los exportes de Timecard se traslapan: solo se anexan los renglones nuevos
+                _, _, resumen = utils.anexar_timecard(datos, archivo.name, huella, fecha)
+                _logger.info("%s: timecard anexado (%d nuevos, %d repetidos, %d días recalculados)",
+                             ruta, resumen["nuevos"], resumen["repetidos"], resumen["dias"])
+            else:
+                version = utils.publicar_dataset(tipo, datos, archivo.name, huella, fecha)
+                _logger.info("%s: %s publicado (%s, %d filas)", ruta, tipo, version, len(datos))
+    except Exception as e:
+        _logger.error("%s: error procesando como %s: %s", ruta, tipo, e)
+        exportes_procesados.incrementar(tipo, "error")
+        return "error"
+
+    exportes_procesados.incrementar(tipo, "publicado")
+    return "publicado"
+
+
+# 👀 VIGILANCIA DE LA CARPETA
+
+class _Pendientes:
+    """Rutas con eventos recientes; cada una se entrega cuando lleva ESPERA_ESTABLE_SEGUNDOS sin cambios."""
+
+    def __init__(self, espera=ESPERA_ESTABLE_SEGUNDOS):
+        self.espera = espera
+        self.rutas = {}
+        self.candado = threading.Lock()
+
+    def anotar(self, ruta, momento=None):
+        with self.candado:
+            self.rutas[ruta] = time.monotonic() if momento is None else momento
+
+    def listas(self):
+        limite = time.monotonic() - self.espera
+        with self.candado:
+            listas = [ruta for ruta, momento in self.rutas.items() if momento <= limite]
+            for ruta in listas:
+                del self.rutas[ruta]
+        return listas
+
+
+class _ManejadorExportes(FileSystemEventHandler):
+    def __init__(self, pendientes):
+        self.pendientes = pendientes
+
+    def on_created(self, event):
+        self._anotar(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        self._anotar(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        # Exportes que el ERP escribe con otro nombre y renombra al terminar
+        self._anotar(event.dest_path, event.is_directory)
+
+    def _anotar(self, ruta, es_carpeta):
+        if not es_carpeta and es_exporte(ruta):
+            self.pendientes.anotar(ruta)
+
+
+def exportes_en_carpeta(carpeta):
+    """Exportes ya presentes en la carpeta, del más antiguo al más reciente (el último gana)."""
+    rutas = []
+    for raiz, _, nombres in os.walk(carpeta):
+        rutas.extend(os.path.join(raiz, n) for n in nombres if es_exporte(n))
+    return sorted(rutas, key=os.path.getmtime)
+
+
+def _procesar_pendientes(pendientes, detener):
+    while not detener.wait(0.5):
+        for ruta in pendientes.listas():
+            if os.path.exists(ruta):
+                procesar_exporte(ruta)
+
+
+class Vigilante:
+    """Observer de watchdog más el hilo que procesa los exportes una vez estables."""
+
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+        self.pendientes = _Pendientes()
+        self.detener = threading.Event()
+        self.observer = Observer()
+        self.observer.schedule(_ManejadorExportes(self.pendientes), carpeta, recursive=True)
+        self.hilo = threading.Thread(
+            target=_procesar_pendientes, args=(self.pendientes, self.detener),
+            name="lamtec-vigilante", daemon=True
+        )
+
+    def iniciar(self):
+        # Lo que llegó mientras la app estaba abajo se procesa primero, en orden de llegada
+        for ruta in exportes_en_carpeta(self.carpeta):
+            self.pendientes.anotar(ruta, momento=0)
+        self.observer.daemon = True
+        self.observer.start()
+        self.hilo.start()
+        return self
+
+    def detener_vigilancia(self):
+        self.detener.set()
+        self.observer.stop()
+        self.observer.join()
+        self.hilo.join()
+
+
+def iniciar_vigilante(carpeta=CARPETA_ERP):
+    """
+    Levanta el vigilante la primera vez que se llama en el proceso.
+    Sin carpeta configurada (o si no existe) la app sigue solo con carga manual.
+    """
+    global _vigilante
+    with _candado:
+        if _vigilante is not None:
+            return _vigilante or None
+        if not carpeta or not os.path.isdir(carpeta):
+            if carpeta:
+                print(f"La carpeta del ERP {carpeta} no existe; el vigilante no se inició.")
+            _vigilante = False
+            return None
+        _vigilante = Vigilante(carpeta).iniciar()
+    return _vigilante
+
+
+# 🔄 DATASETS EN LA SESIÓN
+
+def cargar_datasets_publicados():
+    """
+    Pone en session_state la versión publicada de cada dataset cuando cambió desde la
+    última vez que esta sesión la tomó (al abrir la app o tras un exporte nuevo).
+    Una carga manual posterior manda hasta que llegue otra versión.
+    Devuelve los nombres de los datasets actualizados.
+    """
+    tomadas = st.session_state.setdefault("_datasets_tomados", {})
+    actualizados = []
+    for nombre, registro in utils.listar_datasets().items():
+        llave = DATASETS_SESION.get(nombre)
+        if llave is None or tomadas.get(nombre) == registro["Version"]:
+            continue
+        st.session_state[llave] = utils.cargar_dataset(nombre, registro["Version"])
+        tomadas[nombre] = registro["Version"]
+        actualizados.append(nombre)
+
+    if "forecast" in actualizados:
+        st.session_state["huella_forecast_compras"] = tomadas["forecast"]
+
+    # El cubo Pronóstico vs Ventas se arma como en la importación manual
+    if {"orders", "sales"} & set(actualizados) and st.session_state.get("df_orders") is not None \
+            and st.session_state.get("df_sales") is not None:
+        st.session_state.cubo_ventas = utils.construir_cubo_ventas(
+            st.session_state.df_orders, st.session_state.df_sales
+        )
+
+    if actualizados:
+        st.toast(f"📥 Datos del ERP actualizados: {', '.join(actualizados)}")
+    return actualizados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesa los exportes que el ERP deja en una carpeta")
+    parser.add_argument("carpeta", nargs="?", default=CARPETA_ERP, help="Carpeta de exportes (o LAMTEC_CARPETA_ERP)")
+    parser.add_argument("--una-vez", action="store_true", help="Procesa lo que ya está en la carpeta y termina")
+    args = parser.parse_args(argv)
+
+    if not args.carpeta or not os.path.isdir(args.carpeta):
+        print(f"La carpeta {args.carpeta!r} no existe.", file=sys.stderr)
+        return 1
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.una_vez:
+        for ruta in exportes_en_carpeta(args.carpeta):
+            print(f"{procesar_exporte(ruta):<14} {ruta}")
+        return 0
+
+    vigilante = Vigilante(args.carpeta).iniciar()
+    print(f"Vigilando {args.carpeta} (Ctrl+C para terminar)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        vigilante.detener_vigilancia()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())